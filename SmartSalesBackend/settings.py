@@ -161,6 +161,39 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# --- Reportes en segundo plano (apps/reporting/jobs.py) ---
+REPORTING_WORKERS = config('REPORTING_WORKERS', default=2, cast=int)          # hilos por proceso
+REPORTING_MAX_QUEUE = config('REPORTING_MAX_QUEUE', default=20, cast=int)     # trabajos pendientes/en proceso
+REPORTING_JOB_TIMEOUT = config('REPORTING_JOB_TIMEOUT', default=900, cast=int)  # segundos antes de darlo por fallido
+# Cada cuántos segundos un proceso retoma trabajos 'pendiente' huérfanos (0 lo apaga), y cuánto esperar antes
+REPORTING_RECLAMO_INTERVALO = config('REPORTING_RECLAMO_INTERVALO', default=30, cast=int)
+REPORTING_RECLAMO_GRACIA = config('REPORTING_RECLAMO_GRACIA', default=10, cast=int)
+REPORTING_CACHE_MAX_ENTRIES = config('REPORTING_CACHE_MAX_ENTRIES', default=200, cast=int)  # LRU
+REPORTING_CACHE_MAX_BYTES = config('REPORTING_CACHE_MAX_BYTES', default=2 * 1024 ** 3, cast=int)  # 2 GB en disco
+# Leer los reportes de ventas desde el resumen VentaDiaria (se llena al migrar; rehacer con `manage.py rebuild_ventas_diarias`)
+REPORTING_USAR_RESUMEN = config('REPORTING_USAR_RESUMEN', default=True, cast=bool)
+# Reutilizar agregados de días cerrados entre ejecuciones del reporte de ventas (ParticionReporte)
+REPORTING_PARTICIONES = config('REPORTING_PARTICIONES', default=True, cast=bool)
+REPORTING_PARTICIONES_RETENCION = config('REPORTING_PARTICIONES_RETENCION', default=60, cast=int)  # días sin uso
+# Descarga de reportes: '' (Django hace streaming), 'x-accel' (nginx) o 'x-sendfile' (apache)
+REPORTING_SENDFILE = config('REPORTING_SENDFILE', default='')
+REPORTING_SENDFILE_PREFIX = config('REPORTING_SENDFILE_PREFIX', default='/protected-media/')  # location interna de nginx
+# Dashboard: segundos antes de recalcular los KPIs en segundo plano, y umbral de stock bajo
+REPORTING_DASHBOARD_TTL = config('REPORTING_DASHBOARD_TTL', default=60, cast=int)
+REPORTING_STOCK_BAJO = config('REPORTING_STOCK_BAJO', default=5, cast=int)
+# Registro de modelos de predicción en memoria (por proceso): LRU por cantidad y bytes en disco
+REPORTING_MODELOS_MAX = config('REPORTING_MODELOS_MAX', default=3, cast=int)
+REPORTING_MODELOS_MAX_BYTES = config('REPORTING_MODELOS_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)  # 1 GB
+REPORTING_MODELOS_MMAP = config('REPORTING_MODELOS_MMAP', default=False, cast=bool)  # joblib mmap_mode='r'
+# Productos por bloque en predicciones en segundo plano (cada bloque actualiza el progreso)
+REPORTING_PREDICCION_BLOQUE = config('REPORTING_PREDICCION_BLOQUE', default=2000, cast=int)
+# Segundos en caché de predicciones/matriz (la clave cambia sola si cambian las predicciones)
+REPORTING_MATRIZ_TTL = config('REPORTING_MATRIZ_TTL', default=3600, cast=int)
+# Cargar modelos (predicción, recomendador) en un hilo al arrancar cada worker
+PRECARGAR_MODELOS = config('PRECARGAR_MODELOS', default=False, cast=bool)
+# Carpeta de los .joblib generados por `manage.py train_model`
+REPORTING_MODELOS_DIR = config('REPORTING_MODELOS_DIR', default=str(BASE_DIR / 'ml_models'))
+
 # --- CORS para el front ---
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', cast=Csv(), default='http://localhost:3000')
 CORS_ALLOW_CREDENTIALS = config('CORS_ALLOW_CREDENTIALS', default=False, cast=bool)
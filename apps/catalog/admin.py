@@ -1,3 +1,10 @@
 from django.contrib import admin
 
+from .models import ProductoSimilar
+
 # Register your models here.
+
+@admin.register(ProductoSimilar)
+class ProductoSimilarAdmin(admin.ModelAdmin):
+    list_display = ('producto','rank','similar','score')
+    raw_id_fields = ('producto','similar')
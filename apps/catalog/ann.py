@@ -0,0 +1,262 @@
+"""
+Índice aproximado de vecinos (IVF) en NumPy para el recomendador.
+
+NearestNeighbors(algorithm='brute') compara cada consulta con todo el
+catálogo. IndiceIVF agrupa los productos con k-means esférico
+(`n_listas` centroides) y en cada consulta sólo recorre las `nprobe`
+listas de centroides más parecidos:
+
+- `nprobe` es el control recall/latencia: más listas, más recall y más
+  tiempo (nprobe = n_listas equivale a fuerza bruta).
+- Con más columnas que `dim` (p. ej. la matriz dispersa productos x
+  clientes) los vectores se reducen a `dim` dimensiones con SVD truncada
+  (randomized_svd de sklearn) de las filas normalizadas. Con `dim=None` se
+  usan tal cual.
+- Con entrada dispersa la reducción sólo elige las listas. A esos
+  candidatos se suman los productos que comparten clientes con la
+  consulta (índice invertido cliente -> productos, hasta `coocurrencias`
+  por consulta, empezando por los clientes con menos compras) y todos se
+  ordenan con el coseno exacto sobre las filas originales. En datos de
+  compras, muy dispersos, los vecinos de un producto poco vendido son los
+  otros productos de sus pocos compradores, que ninguna reducción a
+  `dim` dimensiones conserva.
+- Los vectores quedan normalizados y ordenados por lista (float32), así
+  cada lista es un bloque contiguo y la similitud es un producto punto.
+
+kneighbors() devuelve (distancias coseno, índices) como sklearn, así el
+índice reemplaza al modelo en model_data['model'] sin cambiar a quien lo
+usa. Se guarda dentro del pickle del recomendador o aparte con guardar()
+/ cargar() (.npz).
+"""
+import time
+
+import numpy as np
+
+CAMPOS = ("centroides", "vectores", "ids", "inicios", "proyeccion")
+CAMPOS_DISPERSA = ("data", "indices", "indptr", "shape")
+
+
+def _normalizar(x):
+    normas = np.linalg.norm(x, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return (x / normas).astype(np.float32, copy=False)
+
+
+def _normalizar_dispersa(x):
+    """Filas de una matriz dispersa con norma 1 (CSR float32); las vacías quedan en cero."""
+    from scipy import sparse
+
+    x = sparse.csr_matrix(x, dtype=np.float32)
+    normas = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    normas[normas == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / normas).dot(x), dtype=np.float32)
+
+
+class IndiceIVF:
+    # Índices serializados antes de que existiera el reordenamiento exacto
+    dispersa = por_cliente = None
+    coocurrencias = 0
+
+    def __init__(self, n_listas=None, nprobe=8, dim=64, iteraciones=10, muestra=None, semilla=42,
+                 coocurrencias=4096):
+        self.n_listas = n_listas  # None: ~4 * sqrt(productos)
+        self.muestra = muestra  # vectores para k-means; None: 32 por lista
+        self.nprobe = nprobe
+        self.dim = dim
+        self.iteraciones = iteraciones
+        self.semilla = semilla
+        self.coocurrencias = coocurrencias  # candidatos por clientes en común (sólo entrada dispersa)
+        self.proyeccion = None
+        self.dispersa = None  # filas originales normalizadas, en el orden de `vectores`
+        self.por_cliente = None  # la misma matriz en CSC: clientes -> filas
+        self.info = {}
+
+    # --- construcción ---
+
+    def _embeber(self, x):
+        """Filas (ndarray o matriz dispersa) -> vectores normalizados float32."""
+        if self.proyeccion is not None:
+            x = x @ self.proyeccion  # disperso @ denso -> denso
+        elif hasattr(x, "toarray"):
+            x = x.toarray()
+        return _normalizar(np.asarray(x, dtype=np.float32))
+
+    def _asignar(self, vectores, centroides, bloque=65536):
+        asignacion = np.empty(len(vectores), dtype=np.int32)
+        for desde in range(0, len(vectores), bloque):
+            asignacion[desde:desde + bloque] = np.argmax(vectores[desde:desde + bloque] @ centroides.T, axis=1)
+        return asignacion
+
+    def _ajustar_proyeccion(self, x):
+        """
+        Base de la SVD truncada (columnas x dim) de las filas normalizadas:
+        x @ proyeccion da las coordenadas de cada fila en los `dim` ejes de
+        mayor varianza compartida, en vez de ejes al azar.
+        """
+        from sklearn.utils.extmath import randomized_svd
+
+        dim = min(self.dim, min(x.shape) - 1)
+        if dim < 1:
+            return None
+        _, _, vt = randomized_svd(x, dim, n_iter=5, random_state=self.semilla)
+        return np.ascontiguousarray(vt.T, dtype=np.float32)
+
+    def fit(self, x):
+        inicio = time.perf_counter()
+        rnd = np.random.default_rng(self.semilla)
+        dispersa = None
+        if self.dim and x.shape[1] > self.dim:
+            if hasattr(x, "tocsr"):
+                x = dispersa = _normalizar_dispersa(x)
+            else:
+                x = _normalizar(np.asarray(x, dtype=np.float32))
+            self.proyeccion = self._ajustar_proyeccion(x)
+        vectores = self._embeber(x)
+        n = len(vectores)
+        n_listas = min(self.n_listas or max(1, int(4 * np.sqrt(n))), n)
+
+        # k-means esférico sobre una muestra; los centroides vacíos se vuelven a sembrar
+        muestra = vectores[rnd.choice(n, min(n, max(self.muestra or 32 * n_listas, n_listas)), replace=False)]
+        centroides = muestra[rnd.choice(len(muestra), n_listas, replace=False)].copy()
+        for _ in range(self.iteraciones):
+            asignacion = self._asignar(muestra, centroides)
+            # Suma por lista con reduceat sobre la muestra ordenada (np.add.at es mucho más lento)
+            conteos = np.bincount(asignacion, minlength=n_listas)
+            llenas = conteos > 0
+            sumas = np.empty_like(centroides)
+            sumas[llenas] = np.add.reduceat(
+                muestra[np.argsort(asignacion, kind="stable")], (np.cumsum(conteos) - conteos)[llenas]
+            )
+            sumas[~llenas] = muestra[rnd.choice(len(muestra), int((~llenas).sum()))]
+            centroides = _normalizar(sumas)
+
+        asignacion = self._asignar(vectores, centroides)
+        orden = np.argsort(asignacion, kind="stable")
+        self.centroides = centroides
+        self.vectores = np.ascontiguousarray(vectores[orden])
+        self.dispersa = dispersa[orden] if dispersa is not None and self.proyeccion is not None else None
+        self.por_cliente = self.dispersa.tocsc() if self.dispersa is not None else None
+        self.ids = orden.astype(np.int64)
+        self.inicios = np.searchsorted(asignacion[orden], np.arange(n_listas + 1)).astype(np.int64)
+        tamanos = np.diff(self.inicios)
+        self.info = {
+            "productos": n,
+            "listas": n_listas,
+            "dim": self.vectores.shape[1],
+            "lista_max": int(tamanos.max()),
+            "lista_media": round(float(tamanos.mean()), 1),
+            "reordenamiento": self.dispersa is not None,
+            "construccion_s": round(time.perf_counter() - inicio, 3),
+        }
+        return self
+
+    # --- consulta ---
+
+    def kneighbors(self, x, n_neighbors=5, nprobe=None):
+        """(distancias coseno, índices de fila) de los `n_neighbors` más cercanos de cada fila de `x`."""
+        consultas = self._embeber(x)
+        exactas = _normalizar_dispersa(x) if self.dispersa is not None else None
+        nprobe = min(nprobe or self.nprobe, len(self.centroides))
+        k = min(n_neighbors, len(self.ids))
+        distancias = np.empty((len(consultas), k), dtype=np.float32)
+        indices = np.empty((len(consultas), k), dtype=np.int64)
+        sim_centroides = consultas @ self.centroides.T
+        if nprobe < len(self.centroides):
+            listas = np.argpartition(-sim_centroides, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            listas = np.broadcast_to(np.arange(len(self.centroides)), sim_centroides.shape)
+        if exactas is not None:
+            densa = np.zeros(self.dispersa.shape[1], dtype=np.float32)  # fila de la consulta, se limpia en cada vuelta
+        for i, q in enumerate(consultas):
+            candidatos = np.concatenate([np.arange(self.inicios[l], self.inicios[l + 1]) for l in listas[i]])
+            if exactas is not None:
+                columnas = exactas.indices[exactas.indptr[i]:exactas.indptr[i + 1]]
+                if self.coocurrencias and self.por_cliente is not None:
+                    candidatos = np.union1d(candidatos, self._coocurrentes(columnas))
+            if len(candidatos) < k:
+                candidatos = np.arange(len(self.ids))  # listas demasiado chicas: se recorre todo
+            if exactas is not None:
+                densa[columnas] = exactas.data[exactas.indptr[i]:exactas.indptr[i + 1]]
+                sim = self._coseno_exacto(candidatos, densa)
+                densa[columnas] = 0
+            else:
+                sim = self.vectores[candidatos] @ q
+            mejores = np.argpartition(-sim, k - 1)[:k] if k < len(candidatos) else np.arange(k)
+            mejores = mejores[np.argsort(-sim[mejores], kind="stable")]
+            distancias[i] = 1 - sim[mejores]
+            indices[i] = self.ids[candidatos[mejores]]
+        return distancias, indices
+
+    def _coocurrentes(self, columnas):
+        """
+        Filas que comparten algún cliente (`columnas`) con la consulta. Los
+        clientes se toman de menos a más compras hasta juntar
+        `coocurrencias` filas: los que compran poco son los que definen a
+        los vecinos de los productos poco vendidos.
+        """
+        indptr = self.por_cliente.indptr
+        largos = indptr[columnas + 1] - indptr[columnas]
+        orden = np.argsort(largos, kind="stable")
+        usados = max(1, int(np.searchsorted(np.cumsum(largos[orden]), self.coocurrencias, side="right")))
+        inicios, largos = indptr[columnas[orden[:usados]]], largos[orden[:usados]]
+        posiciones = np.repeat(inicios - (np.cumsum(largos) - largos), largos) + np.arange(largos.sum())
+        return self.por_cliente.indices[posiciones]
+
+    def _coseno_exacto(self, candidatos, densa):
+        """
+        Coseno exacto entre las filas `candidatos` de self.dispersa y la
+        consulta (`densa`, normalizada): se recorren sólo los no nulos de
+        los candidatos, sin armar submatrices.
+        """
+        indptr = self.dispersa.indptr
+        inicios, largos = indptr[candidatos], indptr[candidatos + 1] - indptr[candidatos]
+        posiciones = np.repeat(inicios - (np.cumsum(largos) - largos), largos) + np.arange(largos.sum())
+        productos = self.dispersa.data[posiciones] * densa[self.dispersa.indices[posiciones]]
+        return np.bincount(np.repeat(np.arange(len(candidatos)), largos), productos, len(candidatos))
+
+    # --- persistencia ---
+
+    def guardar(self, ruta):
+        arreglos = {c: getattr(self, c) for c in CAMPOS if getattr(self, c) is not None}
+        if self.dispersa is not None:
+            arreglos.update({f"dispersa_{c}": np.asarray(getattr(self.dispersa, c)) for c in CAMPOS_DISPERSA})
+        parametros = np.array([
+            self.nprobe, self.iteraciones, self.muestra or 0, self.semilla, self.dim or 0, self.coocurrencias,
+        ])
+        np.savez(ruta, parametros=parametros, **arreglos)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            # Los .npz anteriores a `coocurrencias` tienen 5 parámetros
+            nprobe, iteraciones, muestra, semilla, dim, coocurrencias = (datos["parametros"].tolist() + [0])[:6]
+            indice = cls(
+                len(datos["centroides"]), nprobe, dim or None, iteraciones, muestra or None, semilla, coocurrencias
+            )
+            for campo in CAMPOS:
+                setattr(indice, campo, datos[campo] if campo in datos else None)
+            if "dispersa_data" in datos:
+                from scipy import sparse
+
+                data, indices, indptr, shape = (datos[f"dispersa_{c}"] for c in CAMPOS_DISPERSA)
+                indice.dispersa = sparse.csr_matrix((data, indices, indptr), shape=tuple(shape))
+                indice.por_cliente = indice.dispersa.tocsc()
+        tamanos = np.diff(indice.inicios)
+        indice.info = {
+            "productos": len(indice.ids), "listas": len(indice.centroides), "dim": indice.vectores.shape[1],
+            "lista_max": int(tamanos.max()), "lista_media": round(float(tamanos.mean()), 1),
+            "reordenamiento": indice.dispersa is not None,
+        }
+        return indice
+
+
+def fuerza_bruta(vectores, consultas, k, bloque=None):
+    """Top-k exacto por producto punto (vectores normalizados), de referencia para el recall."""
+    bloque = bloque or max(1, 2 ** 26 // len(vectores))  # ~256 MB de similitudes por bloque
+    indices = np.empty((len(consultas), k), dtype=np.int64)
+    for desde in range(0, len(consultas), bloque):
+        sim = consultas[desde:desde + bloque] @ vectores.T
+        mejores = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        orden = np.argsort(-np.take_along_axis(sim, mejores, axis=1), axis=1, kind="stable")
+        indices[desde:desde + bloque] = np.take_along_axis(mejores, orden, axis=1)
+    return indices
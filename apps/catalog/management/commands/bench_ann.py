@@ -0,0 +1,198 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.catalog.ann import IndiceIVF, _normalizar, _normalizar_dispersa, fuerza_bruta
+
+
+def _enteros(texto):
+    return [int(x) for x in texto.split(',') if x.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark del índice aproximado IndiceIVF contra la fuerza bruta de sklearn "
+        "(NearestNeighbors cosine/brute, la que usa hoy el recomendador): recall@K y "
+        "consultas/seg para varios tamaños de catálogo y valores de nprobe. Los datos "
+        "son sintéticos, no se toca la BD: vectores densos agrupados o, con --disperso, "
+        "una matriz CSR productos x clientes de compras que pasa por el mismo "
+        "IndiceIVF(n_listas, dim).fit() que train_recommender."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=_enteros, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--nprobe', type=_enteros, default=[1, 4, 16, 64])
+        parser.add_argument('--dim', type=int, default=64)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--consultas', type=int, default=500)
+        parser.add_argument('--listas', type=int, default=None, help="Centroides (por defecto ~4*sqrt(N))")
+        parser.add_argument(
+            '--disperso', action='store_true',
+            help="Matriz de compras productos x clientes (CSR) en lugar de vectores densos; "
+                 "--dim es la dimensión de la SVD truncada, como en train_recommender",
+        )
+        parser.add_argument('--clientes', type=int, default=None, help="Disperso: clientes (por defecto 2*N)")
+        parser.add_argument('--compras', type=float, default=8, help="Disperso: compras promedio por cliente")
+        parser.add_argument(
+            '--coocurrencias', type=int, default=4096,
+            help="Disperso: candidatos por clientes en común (0: sólo las listas de la SVD)",
+        )
+
+    def _datos(self, n, dim, consultas, rnd):
+        """Mezcla de gaussianas normalizada: ~sqrt(N) grupos, como familias de productos."""
+        grupos = max(1, int(np.sqrt(n)))
+        centros = rnd.standard_normal((grupos, dim)).astype(np.float32)
+        vectores = np.empty((n, dim), dtype=np.float32)
+        for desde in range(0, n, 100_000):
+            hasta = min(desde + 100_000, n)
+            vectores[desde:hasta] = centros[rnd.integers(0, grupos, hasta - desde)]
+            vectores[desde:hasta] += 0.7 * rnd.standard_normal((hasta - desde, dim), dtype=np.float32)
+        vectores = _normalizar(vectores)
+        # Consultas: productos existentes con una perturbación leve (no son filas del índice)
+        q = vectores[rnd.integers(0, n, consultas)] + 0.05 * rnd.standard_normal((consultas, dim), dtype=np.float32)
+        return vectores, _normalizar(q)
+
+    def _compras(self, n, clientes, compras, rnd, ruido=0.1):
+        """
+        Matriz CSR productos x clientes (cantidad comprada, float32) como la de
+        train_recommender: cada cliente compra sobre todo en 1 a 3 familias de
+        ~sqrt(N) productos, con popularidad tipo Zipf, y un 10% al azar. Las
+        filas sin compras se descartan (el recomendador sólo ve productos vendidos).
+        """
+        from scipy import sparse
+
+        familias = max(1, int(np.sqrt(n)))
+        familia = rnd.integers(0, familias, n)
+        orden = np.argsort(familia, kind='stable')  # productos agrupados por familia
+        inicios = np.searchsorted(familia[orden], np.arange(familias + 1))
+        popularidad = (1.0 / np.arange(1, n + 1) ** 0.8)[rnd.permutation(n)][orden]
+        acumulada = np.r_[0, np.cumsum(popularidad)]
+
+        por_cliente = rnd.poisson(compras, clientes) + 1
+        cliente = np.repeat(np.arange(clientes), por_cliente)
+        favoritas = rnd.integers(0, familias, (clientes, 3))
+        cuantas = rnd.integers(1, 4, clientes)
+        elegida = favoritas[cliente, (rnd.random(len(cliente)) * cuantas[cliente]).astype(np.int64)]
+        # Popularidad dentro de la familia elegida; las compras al azar usan todo el catálogo
+        desde, hasta = acumulada[inicios[elegida]], acumulada[inicios[elegida + 1]]
+        al_azar = (rnd.random(len(cliente)) < ruido) | (hasta == desde)
+        desde[al_azar], hasta[al_azar] = 0, acumulada[-1]
+        posicion = np.searchsorted(acumulada, desde + rnd.random(len(cliente)) * (hasta - desde), side='right') - 1
+        producto = orden[np.clip(posicion, 0, n - 1)]
+
+        matriz = sparse.coo_matrix(
+            (np.ones(len(cliente), dtype=np.float32), (producto, cliente)), shape=(n, clientes)
+        ).tocsr()
+        return matriz[np.diff(matriz.indptr) > 0]
+
+    def _umbrales(self, unitaria, filas, k, bloque=256):
+        """Coseno exacto de la k-ésima vecina de cada fila de `filas` (fuerza bruta por bloques)."""
+        transpuesta = unitaria.T.tocsc()
+        umbrales = np.empty(len(filas), dtype=np.float32)
+        for desde in range(0, len(filas), bloque):
+            sim = (unitaria[filas[desde:desde + bloque]] @ transpuesta).toarray()
+            umbrales[desde:desde + bloque] = -np.partition(-sim, k - 1, axis=1)[:, k - 1]
+        return umbrales
+
+    def handle(self, *args, **opts):
+        rnd = np.random.default_rng(42)
+        k = opts['k']
+        self.stdout.write(f"{'productos':>10} {'método':<18} {'recall@' + str(k):>10} {'QPS':>10} {'construcción s':>15}")
+        for n in opts['tamanos']:
+            if opts['disperso']:
+                self._disperso(n, opts, rnd)
+            else:
+                self._denso(n, opts, rnd)
+
+    def _denso(self, n, opts, rnd):
+        k = opts['k']
+        vectores, consultas = self._datos(n, opts['dim'], opts['consultas'], rnd)
+        exactos = fuerza_bruta(vectores, consultas, k)
+
+        from sklearn.neighbors import NearestNeighbors
+
+        inicio = time.perf_counter()
+        knn = NearestNeighbors(metric='cosine', algorithm='brute').fit(vectores)
+        construccion = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        knn.kneighbors(consultas, n_neighbors=k)
+        qps = len(consultas) / (time.perf_counter() - inicio)
+        self.stdout.write(f"{n:>10} {'sklearn brute':<18} {1:>10.3f} {qps:>10.0f} {construccion:>15.2f}")
+
+        indice = IndiceIVF(n_listas=opts['listas'], dim=None).fit(vectores)
+        indice.kneighbors(consultas[:10], n_neighbors=k)  # calentamiento (páginas, caches)
+        for nprobe in opts['nprobe']:
+            inicio = time.perf_counter()
+            _, aproximados = indice.kneighbors(consultas, n_neighbors=k, nprobe=nprobe)
+            qps = len(consultas) / (time.perf_counter() - inicio)
+            aciertos = sum(len(np.intersect1d(a, e)) for a, e in zip(aproximados, exactos))
+            self._fila(n, indice, nprobe, aciertos / exactos.size, qps)
+        self._persistencia(indice, consultas, k)
+
+    def _disperso(self, n, opts, rnd):
+        """
+        Consultas: filas del catálogo, como calcular_similares. Con datos de
+        compras hay muchos empates de similitud, así que una vecina cuenta
+        como acierto si su coseno exacto alcanza al de la k-ésima exacta.
+        """
+        k = opts['k']
+        inicio = time.perf_counter()
+        matriz = self._compras(n, opts['clientes'] or 2 * n, opts['compras'], rnd)
+        self.stdout.write(
+            f"{'':>10} CSR {matriz.shape[0]} productos x {matriz.shape[1]} clientes, {matriz.nnz} no nulos, "
+            f"generada en {time.perf_counter() - inicio:.1f}s"
+        )
+        filas = rnd.choice(matriz.shape[0], min(opts['consultas'], matriz.shape[0]), replace=False)
+        consultas = matriz[filas]
+        unitaria = _normalizar_dispersa(matriz)
+        umbrales = self._umbrales(unitaria, filas, k)
+
+        def recall(aproximados):
+            # Coseno exacto de cada vecina devuelta contra la k-ésima exacta de su consulta
+            obtenida = unitaria[aproximados.ravel()].multiply(unitaria[np.repeat(filas, aproximados.shape[1])])
+            obtenida = np.asarray(obtenida.sum(axis=1)).reshape(aproximados.shape)
+            return float((obtenida >= umbrales[:, None] - 1e-5).mean())
+
+        from sklearn.neighbors import NearestNeighbors
+
+        inicio = time.perf_counter()
+        knn = NearestNeighbors(metric='cosine', algorithm='brute').fit(matriz)
+        construccion = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        _, brute = knn.kneighbors(consultas, n_neighbors=k)
+        qps = len(filas) / (time.perf_counter() - inicio)
+        self.stdout.write(f"{n:>10} {'sklearn brute':<18} {recall(brute):>10.3f} {qps:>10.0f} {construccion:>15.2f}")
+
+        indice = IndiceIVF(n_listas=opts['listas'], dim=opts['dim'], coocurrencias=opts['coocurrencias']).fit(matriz)
+        indice.kneighbors(consultas[:10], n_neighbors=k)
+        for nprobe in opts['nprobe']:
+            inicio = time.perf_counter()
+            _, aproximados = indice.kneighbors(consultas, n_neighbors=k, nprobe=nprobe)
+            qps = len(filas) / (time.perf_counter() - inicio)
+            self._fila(n, indice, nprobe, recall(aproximados), qps)
+        self._persistencia(indice, consultas, k)
+
+    def _fila(self, n, indice, nprobe, recall, qps):
+        nombre = f"ivf L={indice.info['listas']} p={nprobe}"
+        self.stdout.write(f"{n:>10} {nombre:<18} {recall:>10.3f} {qps:>10.0f} {indice.info['construccion_s']:>15.2f}")
+
+    def _persistencia(self, indice, consultas, k):
+        """Guardar, volver a cargar y comparar resultados."""
+        fd, ruta = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            indice.guardar(ruta)
+            tamano = os.path.getsize(ruta)
+            inicio = time.perf_counter()
+            cargado = IndiceIVF.cargar(ruta)
+            carga = time.perf_counter() - inicio
+            iguales = np.array_equal(cargado.kneighbors(consultas[:50], k)[1], indice.kneighbors(consultas[:50], k)[1])
+        finally:
+            os.remove(ruta)
+        self.stdout.write(
+            f"{'':>10} índice en disco {tamano / 1024 ** 2:.1f} MB, carga {carga:.2f}s, "
+            f"resultados {'idénticos' if iguales else 'DISTINTOS'} tras recargar"
+        )
@@ -0,0 +1,80 @@
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog import recommendation
+from apps.catalog.recommendation import ProductRecommender, obtener_recomendador
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara get_similar en frío (ProductRecommender() por llamada: lee y "
+        "deserializa el pickle, como antes en cada petición) contra el recomendador "
+        "compartido del proceso (obtener_recomendador())."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--llamadas', type=int, default=200)
+        parser.add_argument('--n', type=int, default=5, help="Similares por llamada")
+        parser.add_argument(
+            '--sintetico', type=int, metavar='PRODUCTOS',
+            help="Usar un modelo aleatorio de N productos en un archivo temporal en lugar del pickle real",
+        )
+
+    def _medir(self, nombre, funcion, ids, llamadas):
+        tiempos = []
+        for i in range(llamadas):
+            inicio = time.perf_counter()
+            funcion(ids[i % len(ids)])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        self.stdout.write(
+            f"{nombre:<10} media {statistics.fmean(tiempos):9.3f} ms  "
+            f"p50 {tiempos[len(tiempos) // 2]:9.3f} ms  p95 {tiempos[int(len(tiempos) * 0.95)]:9.3f} ms"
+        )
+        return statistics.fmean(tiempos)
+
+    def _modelo_sintetico(self, productos, usuarios=500):
+        from sklearn.neighbors import NearestNeighbors
+
+        rnd = np.random.default_rng(42)
+        matriz = (rnd.random((productos, usuarios)) < 0.02) * rnd.integers(1, 6, (productos, usuarios))
+        id_list = list(range(1, productos + 1))
+        return {
+            'matrix': matriz,
+            'id_list': id_list,
+            'product_idx_map': {pid: i for i, pid in enumerate(id_list)},
+            'model': NearestNeighbors(metric='cosine', algorithm='brute').fit(matriz),
+        }
+
+    def handle(self, *args, **opts):
+        if opts['sintetico']:
+            original = recommendation.MODEL_PATH
+            fd, recommendation.MODEL_PATH = tempfile.mkstemp(suffix='.pkl')
+            os.close(fd)
+            try:
+                recommendation.guardar_modelo(self._modelo_sintetico(opts['sintetico']))
+                self._comparar(opts)
+            finally:
+                os.remove(recommendation.MODEL_PATH)
+                recommendation.MODEL_PATH = original
+        else:
+            self._comparar(opts)
+
+    def _comparar(self, opts):
+        compartido = obtener_recomendador()
+        if compartido.model_data is None:
+            raise CommandError(f"No existe el modelo {recommendation.MODEL_PATH}")
+        ids = list(compartido.model_data['id_list'])
+        llamadas, n = max(1, opts['llamadas']), opts['n']
+
+        frio = self._medir("frío", lambda pid: ProductRecommender().get_similar(pid, n=n), ids, llamadas)
+        tibio = self._medir("caliente", lambda pid: obtener_recomendador().get_similar(pid, n=n), ids, llamadas)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(ids)} productos en el modelo; compartido {frio / tibio:.1f}x más rápido"
+        ))
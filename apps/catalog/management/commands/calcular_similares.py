@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.recommendation import calcular_similares
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la tabla ProductoSimilar (top-K vecinos de cada producto) con el "
+        "modelo de recomendación actual. La tabla se reemplaza en una transacción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--bloque', type=int, default=None, help="Productos por bloque de similitud")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        try:
+            m = calcular_similares(k=opts['k'], bloque=opts['bloque'], batch_size=opts['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"ProductoSimilar: {m['filas']} filas para {m['productos']} productos "
+            f"(k={m['k']}, bloque={m['bloque']}) en {m['segundos']:.2f}s"
+        ))
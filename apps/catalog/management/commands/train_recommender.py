@@ -0,0 +1,62 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.catalog.recommendation import CHUNK_SIZE, MODEL_PATH, calcular_similares, train_recommender
+
+
+class Command(BaseCommand):
+    help = (
+        "Entrena el recomendador de productos con ventas (DetalleVenta) y carritos "
+        "(DetalleCarrito) como matriz dispersa CSR, y reemplaza recommender_model.pkl. "
+        "Los procesos que ya lo tienen cargado lo recargan solos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help="YYYY-MM-DD (por defecto todo el historial)")
+        parser.add_argument('--peso-venta', type=float, default=1.0)
+        parser.add_argument('--peso-carrito', type=float, default=0.5)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--backend', choices=['brute', 'ivf'], default='brute',
+            help="Vecinos exactos (sklearn) o índice aproximado IVF (catálogos grandes)",
+        )
+        parser.add_argument('--listas', type=int, default=None, help="IVF: centroides (por defecto ~4*sqrt(N))")
+        parser.add_argument('--nprobe', type=int, default=8, help="IVF: listas recorridas por consulta (recall/latencia)")
+        parser.add_argument('--dim', type=int, default=64, help="IVF: dimensiones de la SVD truncada")
+        parser.add_argument(
+            '--coocurrencias', type=int, default=4096,
+            help="IVF: candidatos por consulta tomados de clientes en común (0: sólo las listas)",
+        )
+        parser.add_argument('--k', type=int, default=10, help="Similares por producto en ProductoSimilar")
+        parser.add_argument('--sin-similares', action='store_true', help="No recalcular ProductoSimilar")
+
+    def handle(self, *args, **opts):
+        try:
+            info = train_recommender(
+                peso_venta=opts['peso_venta'], peso_carrito=opts['peso_carrito'],
+                desde=opts['desde'], chunk_size=opts['chunk_size'], backend=opts['backend'],
+                ann={
+                    'n_listas': opts['listas'], 'nprobe': opts['nprobe'], 'dim': opts['dim'],
+                    'coocurrencias': opts['coocurrencias'],
+                },
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomendador entrenado en {info['total_s']:.2f}s "
+            f"(extracción {info['extraccion_s']:.2f}s, matriz {info['matriz_s']:.3f}s, "
+            f"ajuste {info['entrenamiento_s']:.3f}s) -> {MODEL_PATH}"
+        ))
+        self.stdout.write(
+            f"  {info['productos']} productos x {info['clientes']} clientes, "
+            f"{info['interacciones']} interacciones, densidad {info['densidad']:.4%}"
+        )
+        self.stdout.write(
+            f"  CSR {info['bytes_csr'] / 1024 ** 2:.1f} MB (densa serían {info['bytes_densa'] / 1024 ** 2:.1f} MB)"
+        )
+        if info['indice']:
+            self.stdout.write(f"  Índice IVF: {info['indice']}")
+        if not opts['sin_similares']:
+            m = calcular_similares(k=opts['k'])
+            self.stdout.write(f"  ProductoSimilar: {m['filas']} filas en {m['segundos']:.2f}s")
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_remove_producto_imagen_url_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='catalog.producto')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_de', to='catalog.producto')),
+            ],
+            options={
+                'ordering': ['producto', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'rank'), include=('similar', 'score'), name='uniq_producto_similar_rank')],
+            },
+        ),
+    ]
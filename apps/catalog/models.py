@@ -33,3 +33,21 @@ class Garantia(models.Model):
     fecha_inicio = models.DateField(null=True, blank=True)
     fecha_fin = models.DateField(null=True, blank=True)
     estado = models.CharField(max_length=20, default='activa')
+
+class ProductoSimilar(models.Model):
+    # Top-K vecinos de cada producto, precalculados por `manage.py calcular_similares`
+    # (rank 1 = el más parecido). Se lee por (producto, rank) sin tocar la tabla en PostgreSQL.
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='similar_de')
+    score = models.FloatField()  # similitud coseno (0..1)
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['producto', 'rank']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['producto', 'rank'], include=['similar', 'score'], name='uniq_producto_similar_rank'
+            ),
+        ]
+
+    def __str__(self): return f"{self.producto_id} -> {self.similar_id} (#{self.rank})"
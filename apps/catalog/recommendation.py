@@ -1,16 +1,46 @@
 # catalog/recommendation.py
-import pandas as pd
-from sklearn.neighbors import NearestNeighbors
+# pandas y sklearn se importan dentro de las funciones que los usan: importarlos
+# aquí los cargaba en cada comando de manage.py y en el arranque de cada worker.
+#
+# obtener_recomendador() devuelve un ProductRecommender compartido por todo el
+# proceso. En cada llamada compara (mtime, tamaño) del pickle; si cambió y el
+# sha256 del contenido también, carga el modelo nuevo en un objeto aparte y
+# recién entonces reemplaza la referencia compartida. Una petición que ya tomó
+# el recomendador sigue usando el anterior hasta terminar, nunca uno a medio
+# cargar. train_recommender() escribe en un temporal y lo renombra
+# (os.replace), así tampoco se lee un pickle a medio escribir.
+import hashlib
+import logging
 import os
 import pickle
-from .models import Producto
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Producto, ProductoSimilar
+
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'recommender_model.pkl')
+CHUNK_SIZE = 20000  # filas agregadas por lectura al entrenar
+SEMILLAS_MAX = 50  # productos del historial del cliente usados como semilla
+POPULARES_TTL = 600  # segundos en caché de los más vendidos (relleno de recomendaciones)
+
+_lock = threading.Lock()
+_actual = None  # (firma del archivo, sha256, ProductRecommender)
+_latencias = deque(maxlen=1000)  # segundos de las últimas llamadas a get_similar
+_metricas = {'llamadas': 0, 'recargas': 0, 'segundos_carga': None, 'cargado_en': None, 'sha256': None}
+
 
 class ProductRecommender:
-    def __init__(self):
-        # Intentamos cargar modelo entrenado
-        if os.path.exists(MODEL_PATH):
+    def __init__(self, model_data=None):
+        # Sin model_data se lee el pickle (comportamiento anterior, una carga por instancia)
+        if model_data is not None:
+            self.model_data = model_data
+        elif os.path.exists(MODEL_PATH):
             with open(MODEL_PATH, 'rb') as f:
                 self.model_data = pickle.load(f)
         else:
@@ -18,8 +48,54 @@ class ProductRecommender:
 
     def get_similar(self, product_id, n=5):
         """
-        Devuelve los IDs de productos similares
+        Devuelve los IDs de productos similares: primero desde ProductoSimilar
+        (una consulta por el índice producto+rank) y, si el producto aún no
+        tiene vecinos precalculados, con kneighbors sobre el modelo.
+        """
+        inicio = time.perf_counter()
+        try:
+            ids = list(
+                ProductoSimilar.objects.filter(producto_id=product_id, rank__lte=n)
+                .order_by('rank').values_list('similar_id', flat=True)
+            )
+            return ids or self._similares(product_id, n)
+        finally:
+            _latencias.append(time.perf_counter() - inicio)
+            _metricas['llamadas'] += 1
+
+    def similares_ponderados(self, semillas, k=10):
+        """
+        {producto_id: peso} -> {similar_id: puntaje}, sumando peso * similitud
+        de los k vecinos de cada semilla. Una consulta a ProductoSimilar para
+        todas las semillas y, para las que no tienen vecinos precalculados,
+        una sola llamada a kneighbors con todas sus filas.
         """
+        inicio = time.perf_counter()
+        puntajes = defaultdict(float)
+        con_tabla = set()
+        vecinos = ProductoSimilar.objects.filter(producto_id__in=list(semillas), rank__lte=k)
+        for producto_id, similar_id, score in vecinos.values_list('producto_id', 'similar_id', 'score'):
+            con_tabla.add(producto_id)
+            puntajes[similar_id] += semillas[producto_id] * score
+
+        if self.model_data is not None:
+            idx_map = self.model_data['product_idx_map']
+            faltan = [p for p in semillas if p not in con_tabla and p in idx_map]
+            if faltan:
+                matrix = self.model_data['matrix']
+                id_list = self.model_data['id_list']
+                distancias, indices = self.model_data['model'].kneighbors(
+                    matrix[[idx_map[p] for p in faltan]], n_neighbors=min(k + 1, matrix.shape[0])
+                )
+                for p, fila_d, fila_i in zip(faltan, distancias.tolist(), indices.tolist()):
+                    for d, i in zip(fila_d, fila_i):
+                        if id_list[i] != p and d < 1:  # distancia coseno 1 = nada en común
+                            puntajes[id_list[i]] += semillas[p] * (1 - d)
+        _latencias.append(time.perf_counter() - inicio)
+        _metricas['llamadas'] += 1
+        return puntajes
+
+    def _similares(self, product_id, n):
         if self.model_data is None:
             return []
 
@@ -31,40 +107,384 @@ class ProductRecommender:
             return []
 
         idx = product_idx_map[product_id]
-        distances, indices = knn.kneighbors([matrix[idx]], n_neighbors=n+1)
+        distances, indices = knn.kneighbors(matrix[idx:idx + 1], n_neighbors=min(n + 1, matrix.shape[0]))  # ndarray o CSR
         neighbors = [self.model_data['id_list'][i] for i in indices[0] if self.model_data['id_list'][i] != product_id]
         return neighbors[:n]
 
-# Función para entrenar y guardar el modelo
-def train_recommender():
-    # Simular ratings desde la base de datos
-    # Debes tener un modelo Rating o usar ventas/visitas como proxy
-    # Por simplicidad: usuario_id, producto_id, rating
-    data = [
-        # user_id, product_id, rating
-        [1, 1, 5],
-        [1, 2, 3],
-        [2, 1, 4],
-        [2, 3, 5],
-        [3, 2, 4],
-        [3, 3, 2],
-        # Agrega más datos reales de tu DB
+
+def _firma():
+    try:
+        st = os.stat(MODEL_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def obtener_recomendador():
+    """
+    Recomendador compartido del proceso; se carga la primera vez y se
+    recarga si el pickle cambió. Sin pickle devuelve uno vacío (get_similar -> []).
+    """
+    global _actual
+    firma = _firma()
+    actual = _actual
+    if actual is not None and actual[0] == firma:
+        return actual[2]
+
+    with _lock:
+        actual = _actual
+        if actual is not None and actual[0] == firma:
+            return actual[2]  # otro hilo ya lo recargó
+        inicio = time.perf_counter()
+        if firma is None:
+            # Sin pickle: recomendador vacío, o se conserva el último cargado
+            nuevo = (None, None, actual[2] if actual is not None else ProductRecommender())
+        else:
+            with open(MODEL_PATH, 'rb') as f:
+                contenido = f.read()
+            sha = hashlib.sha256(contenido).hexdigest()
+            if actual is not None and actual[1] == sha:
+                # Sólo cambió el mtime (p. ej. touch o copia idéntica): se conserva el modelo
+                nuevo = (firma, sha, actual[2])
+            else:
+                nuevo = (firma, sha, ProductRecommender(model_data=pickle.loads(contenido)))
+                _metricas['recargas'] += 1
+                _metricas['segundos_carga'] = round(time.perf_counter() - inicio, 4)
+                _metricas['cargado_en'] = time.time()
+                _metricas['sha256'] = sha
+                logger.info("Recomendador cargado (%s) en %.3fs", sha[:12], _metricas['segundos_carga'])
+        _actual = nuevo  # una sola asignación: los lectores ven el modelo anterior o el nuevo completo
+        return nuevo[2]
+
+
+def semillas_cliente(cliente_id, maximo=SEMILLAS_MAX):
+    """
+    {producto_id: peso} del historial del cliente: 1 por cada venta no
+    cancelada que lo incluye y 0.5 por estar en el carrito activo. Se toman
+    los `maximo` productos comprados más recientemente.
+    """
+    from django.db.models import Count, Max
+
+    from apps.cart.models import DetalleCarrito
+    from apps.sales.models import DetalleVenta
+
+    compras = (
+        DetalleVenta.objects.filter(venta__cliente_id=cliente_id)
+        .exclude(venta__estado_venta='cancelada')
+        .values('producto_id')
+        .annotate(n=Count('id'), ultima=Max('venta__fecha_venta'))
+        .order_by('-ultima')[:maximo]
+    )
+    semillas = {c['producto_id']: float(c['n']) for c in compras}
+    carrito = DetalleCarrito.objects.filter(carrito__cliente_id=cliente_id, carrito__estado='activo')
+    for producto_id in carrito.values_list('producto_id', flat=True):
+        semillas[producto_id] = semillas.get(producto_id, 0.0) + 0.5
+    return semillas
+
+
+def populares(dias=30, limite=100):
+    """Ids de los productos activos más vendidos en los últimos `dias` (en caché)."""
+    clave = f"catalog:populares:{dias}:{limite}"
+    ids = cache.get(clave)
+    if ids is None:
+        from datetime import timedelta
+
+        from django.db.models import Sum
+        from django.utils import timezone
+
+        from apps.sales.models import DetalleVenta
+
+        desde = timezone.now() - timedelta(days=dias)
+        ids = list(
+            DetalleVenta.objects.filter(venta__fecha_venta__gte=desde, producto__estado='activo')
+            .exclude(venta__estado_venta='cancelada')
+            .values('producto_id').annotate(unidades=Sum('cantidad'))
+            .order_by('-unidades', 'producto_id').values_list('producto_id', flat=True)[:limite]
+        )
+        cache.set(clave, ids, POPULARES_TTL)
+    return ids
+
+
+def recomendar_para_cliente(cliente_id, limite=48, k=10):
+    """
+    Ranking [(producto_id, puntaje)] de productos activos para el cliente,
+    sin los que ya compró o tiene en el carrito. Si el historial no alcanza
+    (o no hay cliente) se completa con los más vendidos, con puntaje 0.
+    """
+    semillas = semillas_cliente(cliente_id) if cliente_id else {}
+    puntajes = obtener_recomendador().similares_ponderados(semillas, k=k) if semillas else {}
+    for producto_id in semillas:
+        puntajes.pop(producto_id, None)
+    activos = set(
+        Producto.objects.filter(id__in=list(puntajes), estado='activo').values_list('id', flat=True)
+    ) if puntajes else set()
+    ranking = sorted(
+        ((p, round(sc, 6)) for p, sc in puntajes.items() if p in activos), key=lambda x: (-x[1], x[0])
+    )[:limite]
+    if len(ranking) < limite:
+        vistos = set(semillas) | {p for p, _ in ranking}
+        ranking += [(p, 0.0) for p in populares() if p not in vistos][:limite - len(ranking)]
+    return ranking
+
+
+def estadisticas():
+    latencias = sorted(_latencias)
+
+    def percentil(p):
+        if not latencias:
+            return None
+        return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 3)
+
+    actual = _actual
+    return {
+        **_metricas,
+        'cargado': actual is not None and actual[2].model_data is not None,
+        'productos': len(actual[2].model_data['id_list']) if actual and actual[2].model_data else 0,
+        'entrenamiento': actual[2].model_data.get('info') if actual and actual[2].model_data else None,
+        'muestras': len(latencias),
+        'p50_ms': percentil(0.5),
+        'p95_ms': percentil(0.95),
+        'max_ms': round(latencias[-1] * 1000, 3) if latencias else None,
+        'pid': os.getpid(),
+    }
+
+
+def precargar():
+    """Calentamiento en segundo plano (ver CatalogConfig.ready)."""
+    obtener_recomendador()
+
+
+def _interacciones(qs, peso, chunk_size):
+    """(cliente_id, producto_id, valor) de `qs` leído por bloques a arreglos NumPy."""
+    import numpy as np
+
+    clientes, productos, valores = [], [], []
+    bloque = []
+
+    def volcar():
+        c, p, n = zip(*bloque)
+        clientes.append(np.fromiter(c, dtype=np.int64, count=len(bloque)))
+        productos.append(np.fromiter(p, dtype=np.int64, count=len(bloque)))
+        valores.append(np.fromiter(n, dtype=np.float32, count=len(bloque)) * peso)
+
+    for fila in qs.iterator(chunk_size=chunk_size):
+        bloque.append(fila)
+        if len(bloque) >= chunk_size:
+            volcar()
+            bloque = []
+    if bloque:
+        volcar()
+    if not clientes:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, vacio, np.empty(0, dtype=np.float32)
+    return np.concatenate(clientes), np.concatenate(productos), np.concatenate(valores)
+
+
+def train_recommender(peso_venta=1.0, peso_carrito=0.5, desde=None, chunk_size=CHUNK_SIZE,
+                      backend='brute', ann=None):
+    """
+    Entrena el recomendador ítem-ítem con feedback implícito: cuántas veces
+    cada cliente compró cada producto (ventas no canceladas) más, con menor
+    peso, los productos que dejó en carritos no cerrados (los cerrados ya
+    son ventas). La BD agrupa por (cliente, producto) y el resultado se lee
+    por bloques a una matriz dispersa CSR productos x clientes; nunca se
+    arma la matriz densa. Devuelve métricas (tiempos, forma, densidad).
+
+    backend='ivf' usa el índice aproximado de ann.IndiceIVF (parámetros en
+    `ann`: n_listas, nprobe, dim, coocurrencias) en lugar de la fuerza
+    bruta de sklearn.
+    """
+    import numpy as np
+    from scipy import sparse
+    from sklearn.neighbors import NearestNeighbors
+    from django.db.models import Count
+
+    from apps.cart.models import DetalleCarrito
+    from apps.sales.models import DetalleVenta
+
+    if backend not in ('brute', 'ivf'):
+        raise ValueError(f"Backend de vecinos desconocido: {backend}")
+    inicio = time.perf_counter()
+    ventas = DetalleVenta.objects.exclude(venta__estado_venta='cancelada')
+    carritos = DetalleCarrito.objects.exclude(carrito__estado='cerrado')
+    if desde:
+        ventas = ventas.filter(venta__fecha_venta__date__gte=desde)
+        carritos = carritos.filter(carrito__actualizado_en__date__gte=desde)
+    partes = [
+        _interacciones(
+            ventas.values_list('venta__cliente_id', 'producto_id').annotate(n=Count('id')).order_by(),
+            peso_venta, chunk_size,
+        ),
+        _interacciones(
+            carritos.values_list('carrito__cliente_id', 'producto_id').annotate(n=Count('id')).order_by(),
+            peso_carrito, chunk_size,
+        ),
     ]
-    df = pd.DataFrame(data, columns=['user_id', 'product_id', 'rating'])
+    clientes, productos, valores = (np.concatenate(col) for col in zip(*partes))
+    if not len(valores):
+        raise ValueError("No hay ventas ni carritos para entrenar el recomendador")
+    t_extraccion = time.perf_counter() - inicio
+
+    id_list, fila = np.unique(productos, return_inverse=True)
+    _, columna = np.unique(clientes, return_inverse=True)
+    # coo -> csr suma los pares repetidos (mismo cliente y producto en ventas y carritos)
+    matrix = sparse.coo_matrix(
+        (valores, (fila, columna)), shape=(len(id_list), int(columna.max()) + 1)
+    ).tocsr()
+    t_matriz = time.perf_counter() - inicio - t_extraccion
 
-    matrix = df.pivot(index='user_id', columns='product_id', values='rating').fillna(0).values
-    id_list = list(df['product_id'].unique())
-    product_idx_map = {pid: idx for idx, pid in enumerate(id_list)}
+    if backend == 'ivf':
+        from .ann import IndiceIVF
 
-    knn = NearestNeighbors(metric='cosine', algorithm='brute')
-    knn.fit(matrix.T)  # Transponer: product-product similarity
+        knn = IndiceIVF(**(ann or {})).fit(matrix)
+    else:
+        knn = NearestNeighbors(metric='cosine', algorithm='brute')
+        knn.fit(matrix)  # similitud producto-producto sobre los clientes que los compraron
+    t_ajuste = time.perf_counter() - inicio - t_extraccion - t_matriz
 
-    model_data = {
-        'matrix': matrix.T,
+    id_list = id_list.tolist()
+    info = {
+        'productos': matrix.shape[0],
+        'clientes': matrix.shape[1],
+        'interacciones': int(matrix.nnz),
+        'densidad': round(matrix.nnz / (matrix.shape[0] * matrix.shape[1]), 6),
+        'bytes_csr': int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes),
+        'bytes_densa': int(matrix.shape[0] * matrix.shape[1] * matrix.dtype.itemsize),
+        'extraccion_s': round(t_extraccion, 3),
+        'matriz_s': round(t_matriz, 3),
+        'entrenamiento_s': round(t_ajuste, 3),
+        'backend': backend,
+        'indice': getattr(knn, 'info', None),
+        'total_s': round(time.perf_counter() - inicio, 3),
+        'entrenado_en': time.time(),
+    }
+    guardar_modelo({
+        'matrix': matrix,
         'id_list': id_list,
-        'product_idx_map': product_idx_map,
-        'model': knn
+        'product_idx_map': {pid: idx for idx, pid in enumerate(id_list)},
+        'model': knn,
+        'backend': backend,
+        'info': info,
+    })
+    logger.info("Recomendador entrenado: %s", info)
+    return info
+
+
+def _top_k(matrix, k, bloque):
+    """
+    Vecinos por similitud coseno de cada fila de `matrix` (ndarray o CSR),
+    de a `bloque` filas: filas normalizadas @ transpuesta y argpartition.
+    Genera (filas, vecinos, scores) por bloque, ordenados por fila y score.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    normas = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    normas[normas == 0] = 1
+    unitaria = sparse.diags(1 / normas).dot(matrix).tocsr()
+    transpuesta = unitaria.T.tocsc()
+    n = unitaria.shape[0]
+    k = min(k, n - 1)
+    if k < 1:
+        return
+    for desde in range(0, n, bloque):
+        hasta = min(desde + bloque, n)
+        sim = unitaria[desde:hasta].dot(transpuesta).toarray()
+        sim[np.arange(hasta - desde), np.arange(desde, hasta)] = -np.inf  # sin sí mismo
+        vecinos = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(sim, vecinos, axis=1)
+        orden = np.argsort(-scores, axis=1, kind='stable')
+        vecinos = np.take_along_axis(vecinos, orden, axis=1)
+        scores = np.take_along_axis(scores, orden, axis=1)
+        yield np.repeat(np.arange(desde, hasta), k), vecinos.ravel(), scores.ravel()
+
+
+def _top_k_indice(indice, matrix, k, bloque):
+    """Como _top_k, pero con las consultas aproximadas del índice (ann.IndiceIVF)."""
+    import numpy as np
+
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k < 1:
+        return
+    for desde in range(0, n, bloque):
+        hasta = min(desde + bloque, n)
+        distancias, vecinos = indice.kneighbors(matrix[desde:hasta], n_neighbors=k + 1)
+        filas = np.repeat(np.arange(desde, hasta), k + 1).reshape(-1, k + 1)
+        # Fuera el propio producto; si no apareció entre los k+1 se descarta el último
+        propio = vecinos == filas[:, :1]
+        propio[~propio.any(axis=1), -1] = True
+        yield filas[~propio], vecinos[~propio], 1 - distancias[~propio]
+
+
+def _rank(filas):
+    """1, 2, 3... dentro de cada grupo consecutivo de `filas` iguales."""
+    import numpy as np
+
+    if not len(filas):
+        return filas
+    inicios = np.r_[0, np.flatnonzero(np.diff(filas)) + 1]
+    largos = np.diff(np.r_[inicios, len(filas)])
+    return np.arange(len(filas)) - np.repeat(inicios, largos) + 1
+
+
+@transaction.atomic
+def calcular_similares(k=10, bloque=None, batch_size=5000):
+    """
+    Recalcula ProductoSimilar para todo el catálogo del modelo cargado.
+    Borrar e insertar dentro de una transacción: los lectores siguen viendo
+    la tabla anterior completa hasta el commit, nunca una a medio llenar.
+    Devuelve métricas.
+    """
+    import numpy as np
+
+    inicio = time.perf_counter()
+    recomendador = obtener_recomendador()
+    if recomendador.model_data is None:
+        raise ValueError("No hay modelo de recomendación entrenado")
+    matrix = recomendador.model_data['matrix']
+    id_list = np.asarray(recomendador.model_data['id_list'], dtype=np.int64)
+    # Bloques de ~32M celdas de similitud (128 MB en float32)
+    bloque = bloque or max(1, min(4096, 2 ** 25 // max(len(id_list), 1)))
+    existentes = np.isin(id_list, list(Producto.objects.values_list('id', flat=True)))
+
+    ProductoSimilar.objects.all().delete()
+    filas = 0
+    lote = []
+    if recomendador.model_data.get('backend') == 'ivf':
+        bloques = _top_k_indice(recomendador.model_data['model'], matrix, k, bloque)
+    else:
+        bloques = _top_k(matrix, k, bloque)
+    for fila, vecino, score in bloques:
+        # Sin clientes en común no hay similitud; y fuera los productos borrados desde el entrenamiento
+        validos = (score > 0) & existentes[fila] & existentes[vecino]
+        fila, vecino, score = fila[validos], vecino[validos], score[validos]
+        for producto, similar, sc, r in zip(
+            id_list[fila].tolist(), id_list[vecino].tolist(), score.tolist(), _rank(fila).tolist()
+        ):
+            lote.append(ProductoSimilar(producto_id=producto, similar_id=similar, score=round(sc, 6), rank=r))
+        if len(lote) >= batch_size:
+            ProductoSimilar.objects.bulk_create(lote, batch_size=batch_size)
+            filas += len(lote)
+            lote = []
+    if lote:
+        ProductoSimilar.objects.bulk_create(lote, batch_size=batch_size)
+        filas += len(lote)
+    metricas = {
+        'productos': int(existentes.sum()),
+        'filas': filas,
+        'k': k,
+        'bloque': bloque,
+        'segundos': round(time.perf_counter() - inicio, 3),
     }
+    logger.info("ProductoSimilar recalculado: %s", metricas)
+    return metricas
+
 
-    with open(MODEL_PATH, 'wb') as f:
+def guardar_modelo(model_data):
+    """Escribe el pickle de forma atómica (temporal + os.replace)."""
+    temporal = f"{MODEL_PATH}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
         pickle.dump(model_data, f)
+    os.replace(temporal, MODEL_PATH)
@@ -50,4 +50,14 @@ class ProductoSerializer(serializers.ModelSerializer):
             # build_absolute_uri crea la URL completa 
             # (ej: http://127.0.0.1:8000/media/productos/mi-foto.jpg)
             return request.build_absolute_uri(obj.imagen.url)
-        return None # Devuelve null si no hay imagen
\ No newline at end of file
+        return None # Devuelve null si no hay imagen
+
+class ProductoResumenSerializer(ProductoSerializer):
+    """
+    Producto sin garantías, para listados de recomendaciones: se serializa
+    con una sola consulta (producto + categoría), sin el prefetch de garantías.
+    """
+    garantias = None
+
+    class Meta(ProductoSerializer.Meta):
+        fields = [f for f in ProductoSerializer.Meta.fields if f != 'garantias']
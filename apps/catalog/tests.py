@@ -1,3 +1,181 @@
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+from scipy import sparse
+
+from apps.accounts.models import User
+from apps.customers.models import Cliente
+from apps.sales.models import DetalleVenta, Venta
+from . import recommendation
+from .ann import IndiceIVF
+from .models import Producto, ProductoSimilar
+from .views import ProductoViewSet
+
+
+def _crear_productos(n, **campos):
+    return [
+        Producto.objects.create(nombre=f"P{i}", precio=Decimal("10.00"), stock=10, **campos) for i in range(n)
+    ]
+
+
+class CalcularSimilaresTests(TestCase):
+    K = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.productos = _crear_productos(30)
+
+    def setUp(self):
+        rnd = np.random.default_rng(7)
+        # productos x clientes con valores distintos: sin empates de similitud
+        self.matrix = sparse.random(30, 40, density=0.3, format="csr", random_state=rnd, dtype=np.float32)
+        self.id_list = [p.pk for p in self.productos]
+
+    def _calcular(self, modelo, backend, bloque=7):
+        model_data = {
+            "model": modelo, "matrix": self.matrix, "id_list": self.id_list, "backend": backend,
+            "product_idx_map": {p: i for i, p in enumerate(self.id_list)},
+        }
+        recomendador = recommendation.ProductRecommender(model_data=model_data)
+        with mock.patch.object(recommendation, "obtener_recomendador", return_value=recomendador):
+            recommendation.calcular_similares(k=self.K, bloque=bloque)
+        calculados = {}
+        for producto, similar, score in ProductoSimilar.objects.order_by("producto", "rank").values_list(
+            "producto_id", "similar_id", "score"
+        ):
+            calculados.setdefault(producto, []).append((similar, score))
+        return calculados
+
+    def _exactos(self):
+        from sklearn.neighbors import NearestNeighbors
+
+        distancias, indices = NearestNeighbors(metric="cosine", algorithm="brute").fit(self.matrix).kneighbors(
+            self.matrix, n_neighbors=self.K + 1
+        )
+        exactos = {}
+        for fila, (fila_d, fila_i) in enumerate(zip(distancias, indices)):
+            vecinos = [(self.id_list[i], 1 - d) for d, i in zip(fila_d, fila_i) if i != fila and d < 1 - 1e-6]
+            exactos[self.id_list[fila]] = vecinos[:self.K]
+        return exactos
+
+    def assertIgualesAExactos(self, calculados):
+        exactos = self._exactos()
+        self.assertEqual(set(calculados), {p for p, v in exactos.items() if v})
+        for producto, vecinos in calculados.items():
+            with self.subTest(producto=producto):
+                self.assertEqual([s for s, _ in vecinos], [s for s, _ in exactos[producto]])
+                np.testing.assert_allclose([sc for _, sc in vecinos], [sc for _, sc in exactos[producto]], atol=1e-5)
+
+    def test_brute_igual_a_kneighbors_exacto(self):
+        from sklearn.neighbors import NearestNeighbors
+
+        modelo = NearestNeighbors(metric="cosine", algorithm="brute").fit(self.matrix)
+        self.assertIgualesAExactos(self._calcular(modelo, "brute"))
+
+    def test_ivf_recorriendo_todas_las_listas_igual_a_exacto(self):
+        modelo = IndiceIVF(n_listas=4, nprobe=4, dim=None).fit(self.matrix)
+        self.assertIgualesAExactos(self._calcular(modelo, "ivf"))
+
+    def test_ivf_disperso_listas_con_svd_y_coseno_exacto(self):
+        # dim < clientes: la SVD elige las listas y se ordena con el coseno de la CSR original
+        modelo = IndiceIVF(n_listas=4, nprobe=4, dim=8, coocurrencias=0).fit(self.matrix)
+        self.assertTrue(modelo.info["reordenamiento"])
+        self.assertIgualesAExactos(self._calcular(modelo, "ivf"))
+
+    def test_ivf_disperso_clientes_en_comun(self):
+        # Una sola lista: los vecinos salen de los clientes en común
+        modelo = IndiceIVF(n_listas=4, nprobe=1, dim=8).fit(self.matrix)
+        self.assertIgualesAExactos(self._calcular(modelo, "ivf"))
+
+    def test_ivf_disperso_guardar_y_cargar(self):
+        modelo = IndiceIVF(n_listas=4, nprobe=2, dim=8).fit(self.matrix)
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = os.path.join(directorio, "indice.npz")
+            modelo.guardar(ruta)
+            cargado = IndiceIVF.cargar(ruta)
+        esperado, obtenido = modelo.kneighbors(self.matrix, 6), cargado.kneighbors(self.matrix, 6)
+        np.testing.assert_array_equal(obtenido[1], esperado[1])
+        np.testing.assert_allclose(obtenido[0], esperado[0])
+
+    def test_productos_borrados_no_aparecen(self):
+        from sklearn.neighbors import NearestNeighbors
+
+        borrado = self.productos[0].pk
+        Producto.objects.filter(pk=borrado).delete()
+        modelo = NearestNeighbors(metric="cosine", algorithm="brute").fit(self.matrix)
+        calculados = self._calcular(modelo, "brute")
+        self.assertNotIn(borrado, calculados)
+        self.assertFalse(ProductoSimilar.objects.filter(similar_id=borrado).exists())
+
+
+class DetalleSimilaresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = _crear_productos(1)[0]
+        cls.similares = _crear_productos(12)
+        cls.inactivo = cls.similares[2]
+        Producto.objects.filter(pk=cls.inactivo.pk).update(estado="inactivo")
+        ProductoSimilar.objects.bulk_create([
+            ProductoSimilar(producto=cls.producto, similar=s, score=1 - r / 100, rank=r)
+            for r, s in enumerate(cls.similares, start=1)
+        ])
+        cls.staff = User.objects.create_user("admin", password="x", is_staff=True)
+        cls.cliente = User.objects.create_user("cliente", password="x")
+
+    def _similares(self, usuario):
+        api = APIClient()
+        api.force_authenticate(usuario)
+        respuesta = api.get(f"/api/catalog/productos/{self.producto.pk}/")
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.data["similares"]
+
+    def test_cliente_no_ve_inactivos(self):
+        tope = self.similares[:ProductoViewSet.SIMILARES_DETALLE]
+        esperados = [s.pk for s in tope if s.pk != self.inactivo.pk]
+        self.assertEqual(self._similares(self.cliente), esperados)
+
+    def test_staff_ve_todos_hasta_el_tope(self):
+        tope = self.similares[:ProductoViewSet.SIMILARES_DETALLE]
+        self.assertEqual(self._similares(self.staff), [s.pk for s in tope])
+
+
+class RecomendadosUsuarioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.productos = _crear_productos(6)
+        a, b, c, d, e, _ = cls.productos
+        Producto.objects.filter(pk=e.pk).update(estado="inactivo")
+        # a y b comprados; sus vecinos: b (comprado), c, d y e (inactivo)
+        ProductoSimilar.objects.bulk_create([
+            ProductoSimilar(producto=a, similar=b, score=0.9, rank=1),
+            ProductoSimilar(producto=a, similar=c, score=0.5, rank=2),
+            ProductoSimilar(producto=a, similar=e, score=0.4, rank=3),
+            ProductoSimilar(producto=b, similar=a, score=0.9, rank=1),
+            ProductoSimilar(producto=b, similar=d, score=0.3, rank=2),
+        ])
+        cls.usuario = User.objects.create_user("cliente", password="x")
+        venta = Venta.objects.create(cliente=Cliente.objects.get(user=cls.usuario), total=Decimal("20.00"),
+                                     estado_venta="completada")
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(venta=venta, producto=p, cantidad=1, precio_unitario=Decimal("10.00"), total=Decimal("10.00"))
+            for p in (a, b)
+        ])
+
+    def setUp(self):
+        cache.clear()  # populares() queda en caché entre pruebas
 
-# Create your tests here.
+    def test_excluye_comprados_e_inactivos(self):
+        a, b, c, d, e, f = self.productos
+        api = APIClient()
+        api.force_authenticate(self.usuario)
+        respuesta = api.get("/api/catalog/productos/recomendados-usuario/")
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        filas = respuesta.data["results"]
+        self.assertEqual([(p["id"], p["score"]) for p in filas], [(c.pk, 0.5), (d.pk, 0.3)])
+        self.assertNotIn("garantias", filas[0])
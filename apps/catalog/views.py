@@ -5,9 +5,10 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
-from .models import Categoria, Producto, Garantia
-from .serializers import CategoriaSerializer, ProductoSerializer, GarantiaSerializer
-from .recommendation import ProductRecommender
+from apps.customers.models import Cliente
+from .models import Categoria, Producto, Garantia, ProductoSimilar
+from .serializers import CategoriaSerializer, ProductoSerializer, ProductoResumenSerializer, GarantiaSerializer
+from .recommendation import estadisticas as estadisticas_recomendador, obtener_recomendador, recomendar_para_cliente
 
 # -----------------------------
 # VISTAS DE CATEGORÍAS
@@ -32,7 +33,7 @@ class ProductoViewSet(ModelViewSet):
 
     # --- Permisos según acción ---
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'recomendados', 'recomendados_usuario']:
+        if self.action in ['list', 'retrieve', 'similares', 'recomendados', 'recomendados_usuario']:
             # Usuarios logueados pueden ver lista, detalle y recomendaciones
             self.permission_classes = [IsAuthenticated]
         else:
@@ -40,40 +41,80 @@ class ProductoViewSet(ModelViewSet):
             self.permission_classes = [IsAdminUser]
         return super().get_permissions()
 
+    # Ids de similares que se agregan al detalle (los primeros por rank)
+    SIMILARES_DETALLE = 10
+
     # --- Filtrado de queryset ---
-    def get_queryset(self):
+    def _ve_inactivos(self):
         user = self.request.user
-        if user.is_authenticated and user.is_staff:
+        return user.is_authenticated and user.is_staff
+
+    def get_queryset(self):
+        if self._ve_inactivos():
             return super().get_queryset()
         return super().get_queryset().filter(estado='activo')
 
-# --- ENDPOINT PERSONALIZADO: productos recomendados globales para usuario ---
-@action(detail=False, methods=['get'], url_path='recomendados-usuario')
-def recomendados_usuario(self, request):
-    recommender = ProductRecommender()
-    
-    recommended_ids = set()
-    
-    # Tomamos algunos productos para calcular recomendaciones
-    productos = Producto.objects.filter(estado='activo')[:20]
-    
-    for producto in productos:
-        similar_ids = recommender.get_similar(producto.id, n=3)
-        recommended_ids.update(similar_ids)
-        if len(recommended_ids) >= 12:
-            break
-    
-    # fallback: si no hay suficientes, completamos con productos activos
-    if len(recommended_ids) < 12:
-        active_ids = Producto.objects.filter(estado='activo').values_list('id', flat=True)
-        recommended_ids.update(active_ids)
-    
-    # Solo los primeros 12
-    recommended_ids = list(recommended_ids)[:12]
-    similares = Producto.objects.filter(id__in=recommended_ids)
-    
-    serializer = self.get_serializer(similares, many=True, context={'request': request})
-    return Response(serializer.data)
+    def retrieve(self, request, *args, **kwargs):
+        # Detalle + ids de los productos similares precalculados (ProductoSimilar),
+        # con el mismo filtro de estado que el resto de la vista
+        response = super().retrieve(request, *args, **kwargs)
+        similares = ProductoSimilar.objects.filter(
+            producto_id=response.data['id'], rank__lte=self.SIMILARES_DETALLE
+        )
+        if not self._ve_inactivos():
+            similares = similares.filter(similar__estado='activo')
+        response.data['similares'] = list(similares.order_by('rank').values_list('similar_id', flat=True))
+        return response
+
+    @action(detail=True, methods=['get'], url_path='similares')
+    def similares(self, request, pk=None):
+        """
+        Productos similares ya serializados, en orden de similitud (?n=, por defecto 5).
+        Una sola consulta: ProductoSimilar por (producto, rank) unido a Producto.
+        """
+        try:
+            n = min(max(int(request.query_params.get('n', 5)), 1), 50)
+        except ValueError:
+            return Response({'detail': 'n debe ser un entero.'}, status=400)
+        productos = (
+            self.get_queryset()
+            .filter(similar_de__producto_id=pk, similar_de__rank__lte=n)
+            .order_by('similar_de__rank')
+        )
+        serializer = self.get_serializer(productos, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='recomendados-usuario')
+    def recomendados_usuario(self, request):
+        """
+        Recomendaciones para el usuario a partir de sus compras y su carrito
+        activo, ordenadas por puntaje y paginadas. Sin historial (o sin perfil
+        de cliente) devuelve los más vendidos. Los productos van sin garantías
+        (ProductoResumenSerializer): la página sale de una sola consulta.
+        """
+        try:
+            cliente_id = request.user.cliente.id
+        except Cliente.DoesNotExist:
+            cliente_id = None
+        ranking = recomendar_para_cliente(cliente_id)
+        pagina = self.paginate_queryset(ranking)
+        filas = pagina if pagina is not None else ranking
+        productos = self.get_queryset().prefetch_related(None).in_bulk([p for p, _ in filas])
+        filas = [(productos[p], score) for p, score in filas if p in productos]
+        data = ProductoResumenSerializer(
+            [p for p, _ in filas], many=True, context=self.get_serializer_context()
+        ).data
+        for fila, (_, score) in zip(data, filas):
+            fila['score'] = score
+        if pagina is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='recomendador')
+    def recomendador(self, request):
+        """Estado del recomendador de este proceso: versión cargada y latencia de get_similar (p50/p95)."""
+        obtener_recomendador()  # carga o recarga si el pickle cambió
+        return Response(estadisticas_recomendador())
 
 
 # -----------------------------
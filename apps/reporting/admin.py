@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Reporte, ConsultaReporte
+from .models import Reporte, ConsultaReporte, TrabajoReporte, ReporteCache, VentaDiaria, ParticionReporte, SegmentoCliente, EjecucionPrediccion, EvaluacionModelo
 
 @admin.register(Reporte)
 class ReporteAdmin(admin.ModelAdmin):
@@ -11,3 +11,39 @@ class ReporteAdmin(admin.ModelAdmin):
 class ConsultaReporteAdmin(admin.ModelAdmin):
     list_display = ('id','reporte','fecha_solicitud')
     search_fields = ('prompt_texto',)
+
+@admin.register(TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    list_display = ('id','tipo_reporte','formato','estado','creado_en','duracion_segundos','reporte')
+    list_filter = ('estado','tipo_reporte')
+
+@admin.register(ReporteCache)
+class ReporteCacheAdmin(admin.ModelAdmin):
+    list_display = ('clave','reporte','tamano_bytes','hits','ultimo_uso')
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('fecha','producto','categoria','metodo_pago','unidades','ingresos','pedidos')
+    list_filter = ('metodo_pago',)
+    date_hierarchy = 'fecha'
+
+@admin.register(ParticionReporte)
+class ParticionReporteAdmin(admin.ModelAdmin):
+    list_display = ('clave','fecha','marca','generado_en','usado_en')
+    list_filter = ('clave',)
+    date_hierarchy = 'fecha'
+
+@admin.register(SegmentoCliente)
+class SegmentoClienteAdmin(admin.ModelAdmin):
+    list_display = ('cliente','segmento','r_score','f_score','m_score','recencia_dias','frecuencia','monto')
+    list_filter = ('segmento',)
+
+@admin.register(EjecucionPrediccion)
+class EjecucionPrediccionAdmin(admin.ModelAdmin):
+    list_display = ('id','modelo','estado','productos_procesados','productos_total','filas','duracion_segundos','creado_en')
+    list_filter = ('estado',)
+
+@admin.register(EvaluacionModelo)
+class EvaluacionModeloAdmin(admin.ModelAdmin):
+    list_display = ('id','modelo','tipo','mae','mape','filas','segundos_entrenamiento','segundos_inferencia','evaluado_en')
+    list_filter = ('tipo',)
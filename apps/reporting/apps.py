@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class ReportingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.reporting'
+
+    def ready(self):
+        import os
+
+        from . import jobs, precarga, signals  # noqa: F401
+
+        precarga.registrar(precarga.precargar_prediccion)
+        if precarga._proceso_servidor():
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=jobs.iniciar_reclamo)
+            jobs.iniciar_reclamo()
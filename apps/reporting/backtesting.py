@@ -0,0 +1,230 @@
+"""
+Evaluación de los modelos de predicción de ventas.
+
+- backtest(): origen móvil. Para cada uno de los últimos `origenes` meses
+  se entrena una copia del modelo (mismos hiperparámetros, sklearn.clone)
+  con los meses anteriores y se predicen los `horizonte` meses siguientes.
+  Como el entrenamiento, usa sólo meses cerrados. Mide MAE/MAPE y el
+  tiempo de entrenamiento e inferencia.
+- seguimiento(): compara las PrediccionVenta guardadas de meses ya
+  cerrados con las ventas reales, y mide la inferencia del modelo sobre el
+  catálogo activo.
+
+Las ventas reales salen de la misma agregación mensual que el
+entrenamiento (entrenamiento._agregar_meses), con 0 en los meses sin
+ventas. Los errores por producto y categoría se agrupan con np.bincount.
+El resultado se guarda como EvaluacionModelo.
+"""
+import logging
+import time
+
+import numpy as np
+from django.utils import timezone
+
+from apps.catalog.models import Categoria, Producto
+from . import registro_modelos
+from .entrenamiento import FEATURES, _agregar_meses, _completar_ceros, inicio_mes_actual
+from .models import EvaluacionModelo, PrediccionVenta
+from .predicciones import matriz_features, productos_a_predecir
+
+logger = logging.getLogger(__name__)
+
+PEORES_PRODUCTOS = 20
+
+
+def _por_grupo(grupo, error_abs, reales):
+    """(ids, filas, mae, mape %) por valor de `grupo`; mape es NaN si el grupo no tuvo ventas."""
+    ids, inverso = np.unique(grupo, return_inverse=True)
+    filas = np.bincount(inverso)
+    mae = np.bincount(inverso, weights=error_abs) / filas
+    con_ventas = reales != 0
+    ape = np.divide(error_abs, np.abs(reales), out=np.zeros_like(error_abs), where=con_ventas)
+    n_ventas = np.bincount(inverso, weights=con_ventas)
+    mape = np.divide(
+        np.bincount(inverso, weights=ape) * 100, n_ventas, out=np.full(len(ids), np.nan), where=n_ventas > 0
+    )
+    return ids, filas, mae, mape
+
+
+def _redondear(valor):
+    return None if valor is None or np.isnan(valor) else round(float(valor), 4)
+
+
+def metricas(producto_ids, reales, estimados):
+    """
+    MAE/MAPE global, por categoría y los productos con más error.
+    Los tres arreglos tienen una posición por par (producto, mes).
+    """
+    producto_ids = np.asarray(producto_ids, dtype=np.int64)
+    reales = np.asarray(reales, dtype=np.float64)
+    error_abs = np.abs(np.asarray(estimados, dtype=np.float64) - reales)
+    _, _, mae, mape = _por_grupo(np.zeros(len(reales), dtype=np.int8), error_abs, reales)
+
+    productos = np.unique(producto_ids)
+    categoria_de = dict(Producto.objects.filter(id__in=productos.tolist()).values_list("id", "categoria_id"))
+    # -1: producto sin categoría (o eliminado)
+    categoria = np.fromiter(
+        (categoria_de.get(p) or -1 for p in producto_ids.tolist()), dtype=np.int64, count=len(producto_ids)
+    )
+    nombres = dict(Categoria.objects.values_list("id", "nombre"))
+    ids, filas, mae_c, mape_c = _por_grupo(categoria, error_abs, reales)
+    por_categoria = [
+        {
+            "categoria": None if c == -1 else c,
+            "nombre": nombres.get(c, "Sin categoría"),
+            "filas": int(n),
+            "mae": _redondear(e),
+            "mape": _redondear(p),
+        }
+        for c, n, e, p in zip(ids.tolist(), filas, mae_c, mape_c)
+    ]
+
+    ids, filas, mae_p, mape_p = _por_grupo(producto_ids, error_abs, reales)
+    orden = np.argsort(-mae_p, kind="stable")
+    return {
+        "mae": _redondear(mae[0]) if len(reales) else 0.0,
+        "mape": _redondear(mape[0]) if len(reales) else None,
+        "filas": int(len(reales)),
+        "productos": int(len(productos)),
+        "por_categoria": por_categoria,
+        "por_producto": {
+            "producto": ids, "filas": filas, "mae": mae_p, "mape": mape_p,
+        },
+        "peores_productos": [
+            {"producto": int(ids[i]), "mae": _redondear(mae_p[i]), "mape": _redondear(mape_p[i])}
+            for i in orden[:PEORES_PRODUCTOS]
+        ],
+    }
+
+
+def _guardar(modelo, tipo, resultado, parametros):
+    return EvaluacionModelo.objects.create(
+        modelo=modelo,
+        tipo=tipo,
+        mae=resultado["mae"],
+        mape=resultado["mape"],
+        filas=resultado["filas"],
+        productos=resultado["productos"],
+        meses=resultado["meses"],
+        segundos_entrenamiento=resultado.get("segundos_entrenamiento"),
+        segundos_inferencia=resultado.get("segundos_inferencia"),
+        filas_inferencia=resultado.get("filas_inferencia", 0),
+        por_categoria=resultado["por_categoria"],
+        peores_productos=resultado["peores_productos"],
+        parametros=parametros,
+    )
+
+
+def backtest(modelo, origenes=3, horizonte=1, guardar=True):
+    """
+    Backtesting con origen móvil de un ModeloEntrenado. Lanza ValueError si
+    el historial no alcanza para al menos un origen.
+    Devuelve (resultado, EvaluacionModelo o None).
+    """
+    import pandas as pd
+    from sklearn.base import clone
+
+    if origenes < 1 or horizonte < 1:
+        raise ValueError("origenes y horizonte deben ser mayores que 0")
+    base = registro_modelos.obtener(modelo)
+    # Sin el mes en curso: sus ventas parciales medirían un error que no existe
+    claves, y = _completar_ceros(*_agregar_meses(hasta=inicio_mes_actual()))
+    indice = claves[:, 0] * 12 + claves[:, 1] - 1 if len(claves) else np.empty(0, dtype=np.int64)
+    meses = np.unique(indice)
+    # Un origen necesita al menos un mes de entrenamiento antes y `horizonte` meses después
+    candidatos = meses[1:][meses[1:] + horizonte - 1 <= meses[-1]] if len(meses) else meses
+    if not len(candidatos):
+        raise ValueError("No hay historial suficiente para el backtesting")
+    X = pd.DataFrame(claves, columns=FEATURES)
+
+    productos, reales, estimados, cortes = [], [], [], []
+    t_entrenamiento = t_inferencia = 0.0
+    for origen in candidatos[-origenes:].tolist():
+        entrenar = indice < origen
+        probar = (indice >= origen) & (indice < origen + horizonte)
+        t0 = time.perf_counter()
+        estimador = clone(base).fit(X[entrenar], y[entrenar])
+        t1 = time.perf_counter()
+        prediccion = estimador.predict(X[probar])
+        t2 = time.perf_counter()
+        t_entrenamiento += t1 - t0
+        t_inferencia += t2 - t1
+        productos.append(claves[probar, 2])
+        reales.append(y[probar])
+        estimados.append(np.maximum(prediccion, 0))  # se guardan sin negativos (a_decimal)
+        cortes.append({
+            "origen": f"{origen // 12}-{origen % 12 + 1:02d}",
+            "mae": _redondear(np.abs(estimados[-1] - reales[-1]).mean()),
+            "segundos_entrenamiento": round(t1 - t0, 3),
+        })
+
+    resultado = metricas(np.concatenate(productos), np.concatenate(reales), np.concatenate(estimados))
+    resultado.update(
+        meses=len(cortes) + horizonte - 1,
+        origenes=cortes,
+        segundos_entrenamiento=round(t_entrenamiento, 3),
+        segundos_inferencia=round(t_inferencia, 4),
+        filas_inferencia=resultado["filas"],
+    )
+    evaluacion = None
+    if guardar:
+        evaluacion = _guardar(modelo, "backtest", resultado, {"origenes": len(cortes), "horizonte": horizonte})
+    logger.info("Backtest modelo %s: MAE %s MAPE %s", modelo.pk, resultado["mae"], resultado["mape"])
+    return resultado, evaluacion
+
+
+def _medir_inferencia(modelo):
+    """Segundos de predict() para el mes siguiente sobre todos los productos activos."""
+    try:
+        estimador = registro_modelos.obtener(modelo)
+    except FileNotFoundError:
+        return None, 0
+    hoy = timezone.localdate()
+    indice = hoy.year * 12 + hoy.month  # mes siguiente
+    ids = list(productos_a_predecir({}))
+    if not ids:
+        return None, 0
+    X, _ = matriz_features(ids, indice // 12, indice % 12 + 1, 1)
+    inicio = time.perf_counter()
+    estimador.predict(X)
+    return round(time.perf_counter() - inicio, 4), len(ids)
+
+
+def seguimiento(modelo, guardar=True):
+    """
+    Predicciones mensuales guardadas de `modelo` para meses ya cerrados
+    contra las ventas reales. Devuelve (resultado, EvaluacionModelo), o
+    (None, None) si el modelo no tiene predicciones de meses cerrados.
+    """
+    inicio_mes = inicio_mes_actual()
+    filas = list(
+        PrediccionVenta.objects.filter(
+            modelo=modelo, periodo="Mensual", producto__isnull=False, fecha_prediccion__lt=inicio_mes
+        ).values_list("producto_id", "fecha_prediccion", "ventas_estimadas")
+    )
+    if not filas:
+        return None, None
+    producto_col, fecha_col, valor_col = zip(*filas)
+    productos = np.fromiter(producto_col, dtype=np.int64, count=len(filas))
+    mes = np.fromiter((f.year * 12 + f.month - 1 for f in fecha_col), dtype=np.int64, count=len(filas))
+    estimados = np.fromiter((float(v) for v in valor_col), dtype=np.float64, count=len(filas))
+
+    # Ventas reales desde el primer mes pronosticado; sin fila = no se vendió
+    claves, ingresos = _agregar_meses(min(fecha_col).replace(day=1))
+    base = int(max(productos.max(), claves[:, 2].max() if len(claves) else 0)) + 1
+    clave_real = (claves[:, 0] * 12 + claves[:, 1] - 1) * base + claves[:, 2]
+    orden = np.argsort(clave_real)
+    clave_real, ingresos = clave_real[orden], ingresos[orden]
+    buscada = mes * base + productos
+    pos = np.clip(np.searchsorted(clave_real, buscada), 0, max(len(clave_real) - 1, 0))
+    encontrada = (clave_real[pos] == buscada) if len(clave_real) else np.zeros(len(buscada), dtype=bool)
+    reales = np.where(encontrada, ingresos[pos] if len(ingresos) else 0.0, 0.0)
+
+    resultado = metricas(productos, reales, estimados)
+    resultado["meses"] = int(len(np.unique(mes)))
+    resultado["segundos_inferencia"], resultado["filas_inferencia"] = _medir_inferencia(modelo)
+    evaluacion = None
+    if guardar:
+        evaluacion = _guardar(modelo, "seguimiento", resultado, {"hasta": inicio_mes.isoformat()})
+    logger.info("Seguimiento modelo %s: MAE %s MAPE %s", modelo.pk, resultado["mae"], resultado["mape"])
+    return resultado, evaluacion
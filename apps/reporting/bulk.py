@@ -0,0 +1,66 @@
+"""
+Upsert por lotes con SQL directo.
+
+INSERT ... VALUES (...), (...), ... ON CONFLICT (...) DO UPDATE SET
+col = EXCLUDED.col es común a PostgreSQL y SQLite. Se usa en lugar de
+bulk_create(update_conflicts=True) en escrituras de cientos de miles de
+filas: el ORM construye una instancia y prepara cada valor campo por campo
+(~100 µs por fila), mientras que aquí las filas llegan ya como tuplas
+listas para la BD.
+
+Cada lote es una sola sentencia con un grupo (%s, ...) por fila: con
+psycopg2, cursor.executemany() manda un INSERT por fila, que es justo lo
+que se quiere evitar.
+"""
+from django.db import connection
+
+BATCH_SIZE = 5000
+
+
+def _filas_por_sentencia(columnas, batch_size):
+    """batch_size acotado por el máximo de parámetros del backend (999 en SQLite)."""
+    maximo = connection.features.max_query_params
+    if maximo:
+        return max(1, min(batch_size, maximo // len(columnas)))
+    return batch_size
+
+
+def upsert(modelo, columnas, conflicto, filas, batch_size=BATCH_SIZE):
+    """
+    `columnas`: nombres de columna en la BD (p. ej. "producto_id").
+    `conflicto`: columnas del índice único. Se actualizan las demás.
+    `filas`: iterable de tuplas en el orden de `columnas`, con valores ya
+    adaptados (connection.ops.adapt_*). Devuelve la cantidad de filas.
+
+    Si una clave se repite dentro de un lote queda la última fila, como con
+    un INSERT por fila (PostgreSQL rechaza una sentencia ON CONFLICT que
+    actualiza dos veces la misma fila).
+    """
+    q = connection.ops.quote_name
+    actualizar = ", ".join(f"{q(c)} = EXCLUDED.{q(c)}" for c in columnas if c not in conflicto)
+    inicio = f"INSERT INTO {q(modelo._meta.db_table)} ({', '.join(q(c) for c in columnas)}) VALUES "
+    fin = f" ON CONFLICT ({', '.join(q(c) for c in conflicto)}) DO UPDATE SET {actualizar}"
+    grupo = f"({', '.join(['%s'] * len(columnas))})"
+    clave = [columnas.index(c) for c in conflicto]
+    batch_size = _filas_por_sentencia(columnas, batch_size)
+    sentencias = {}
+
+    def escribir(cursor, lote):
+        unicas = list({tuple(fila[i] for i in clave): fila for fila in lote}.values())
+        if len(unicas) not in sentencias:
+            sentencias[len(unicas)] = inicio + ", ".join([grupo] * len(unicas)) + fin
+        cursor.execute(sentencias[len(unicas)], [valor for fila in unicas for valor in fila])
+
+    total = 0
+    lote = []
+    with connection.cursor() as cursor:
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= batch_size:
+                escribir(cursor, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            escribir(cursor, lote)
+            total += len(lote)
+    return total
@@ -0,0 +1,110 @@
+"""
+Caché de reportes generados.
+
+La clave es un SHA-256 de (tipo, formato, parámetros normalizados, marca de
+agua). La marca de agua resume los datos del rango (máximo id, última fecha,
+cantidad...), así que cualquier venta nueva o modificada produce otra clave
+y el reporte viejo deja de usarse. Las entradas se descartan por LRU y por
+presupuesto total de disco (REPORTING_CACHE_*).
+"""
+import hashlib
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ReporteCache
+
+# Parámetros que no cambian el contenido del reporte
+PARAMETROS_IGNORADOS = {"sin_cache"}
+
+
+def _ruta_absoluta(ruta_rel):
+    return Path(settings.MEDIA_ROOT) / ruta_rel
+
+
+def normalizar_parametros(params):
+    """Quita vacíos y parámetros de control, y ordena listas para un hash estable."""
+    normalizados = {}
+    for k, v in (params or {}).items():
+        if k in PARAMETROS_IGNORADOS or v in (None, "", [], {}):
+            continue
+        if isinstance(v, str) and "," in v:
+            v = [x.strip() for x in v.split(",") if x.strip()]
+        if isinstance(v, (list, tuple)):
+            v = sorted(str(x) for x in v)
+        normalizados[k] = v
+    return normalizados
+
+
+def clave_reporte(tipo, formato, params, marca_agua):
+    payload = json.dumps(
+        [tipo, formato, normalizar_parametros(params), marca_agua],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def buscar(clave):
+    """Devuelve el Reporte cacheado o None. Descarta entradas cuyo archivo ya no existe."""
+    entrada = ReporteCache.objects.select_related("reporte").filter(clave=clave).first()
+    if entrada is None:
+        return None
+    if not _ruta_absoluta(entrada.reporte.ruta_archivo).exists():
+        entrada.delete()
+        return None
+    ReporteCache.objects.filter(pk=entrada.pk).update(
+        hits=F("hits") + 1, ultimo_uso=timezone.now()
+    )
+    return entrada.reporte
+
+
+def guardar(clave, reporte):
+    try:
+        tamano = _ruta_absoluta(reporte.ruta_archivo).stat().st_size
+    except OSError:
+        return None
+    try:
+        with transaction.atomic():
+            entrada = ReporteCache.objects.create(
+                clave=clave, reporte=reporte, tamano_bytes=tamano
+            )
+    except IntegrityError:
+        # Otra petición guardó la misma clave en paralelo
+        return None
+    desalojar()
+    return entrada
+
+
+def _eliminar(entrada):
+    reporte = entrada.reporte
+    try:
+        _ruta_absoluta(reporte.ruta_archivo).unlink()
+    except OSError:
+        pass
+    entrada.delete()
+    reporte.ruta_archivo = ""
+    reporte.save(update_fields=["ruta_archivo"])
+
+
+def desalojar():
+    """Elimina las entradas menos usadas hasta respetar el límite de entradas y de disco."""
+    max_entradas = settings.REPORTING_CACHE_MAX_ENTRIES
+    max_bytes = settings.REPORTING_CACHE_MAX_BYTES
+    total = ReporteCache.objects.aggregate(t=Sum("tamano_bytes"))["t"] or 0
+    cantidad = ReporteCache.objects.count()
+    eliminadas = 0
+    if cantidad <= max_entradas and total <= max_bytes:
+        return eliminadas
+    for entrada in ReporteCache.objects.select_related("reporte").order_by("ultimo_uso"):
+        if cantidad <= max_entradas and total <= max_bytes:
+            break
+        cantidad -= 1
+        total -= entrada.tamano_bytes
+        _eliminar(entrada)
+        eliminadas += 1
+    return eliminadas
@@ -0,0 +1,113 @@
+"""
+KPIs del dashboard de administración.
+
+calcular_kpis() resuelve todo con 4 consultas agregadas. obtener_kpis() lo
+sirve desde la caché de Django: si el valor tiene más de
+REPORTING_DASHBOARD_TTL segundos se devuelve igual (stale) y se recalcula
+en un hilo aparte, así los refrescos del dashboard no esperan a la BD.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from apps.cart.models import Carrito
+from apps.catalog.models import Producto
+from apps.sales.models import DetalleVenta, Venta
+from .models import VentaDiaria
+
+logger = logging.getLogger(__name__)
+
+PERIODOS = (1, 7, 30, 90, 365)  # días permitidos (acota las claves de caché)
+TOP_PRODUCTOS = 5
+
+
+def _clave(dias):
+    return f"reporting:dashboard:{dias}"
+
+
+def calcular_kpis(dias=30):
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias - 1)
+
+    if settings.REPORTING_USAR_RESUMEN:
+        base = VentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+        totales = base.aggregate(ingresos=Sum('ingresos'), pedidos=Sum('pedidos'))
+        top = (
+            base.values('producto_id', 'producto__nombre')
+            .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+            .order_by('-ingresos')[:TOP_PRODUCTOS]
+        )
+    else:
+        ventas = Venta.objects.exclude(estado_venta='cancelada').filter(
+            fecha_venta__date__gte=desde, fecha_venta__date__lte=hasta
+        )
+        totales = ventas.aggregate(ingresos=Sum('total'), pedidos=Count('id'))
+        top = (
+            DetalleVenta.objects.filter(venta__in=ventas)
+            .values('producto_id', 'producto__nombre')
+            .annotate(unidades=Sum('cantidad'), ingresos=Sum('total'))
+            .order_by('-ingresos')[:TOP_PRODUCTOS]
+        )
+
+    stock = Producto.objects.aggregate(
+        activos=Count('id', filter=Q(estado='activo')),
+        stock_bajo=Count('id', filter=Q(estado='activo', stock__lte=settings.REPORTING_STOCK_BAJO)),
+    )
+    carritos_activos = Carrito.objects.filter(estado='activo').count()
+
+    ingresos = totales['ingresos'] or Decimal('0')
+    pedidos = totales['pedidos'] or 0
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'ingresos': round(float(ingresos), 2),
+        'pedidos': pedidos,
+        'ticket_promedio': round(float(ingresos) / pedidos, 2) if pedidos else 0.0,
+        'top_productos': [
+            {
+                'producto': r['producto_id'],
+                'nombre': r['producto__nombre'],
+                'unidades': r['unidades'],
+                'ingresos': round(float(r['ingresos']), 2),
+            }
+            for r in top
+        ],
+        'productos_activos': stock['activos'],
+        'productos_stock_bajo': stock['stock_bajo'],
+        'carritos_activos': carritos_activos,
+        'calculado_en': timezone.now().isoformat(),
+    }
+
+
+def _refrescar(dias):
+    try:
+        cache.set(_clave(dias), (time.time(), calcular_kpis(dias)), settings.REPORTING_DASHBOARD_TTL * 10)
+    except Exception:
+        logger.exception("No se pudo refrescar el dashboard")
+    finally:
+        cache.delete(_clave(dias) + ":lock")
+        connection.close()
+
+
+def obtener_kpis(dias=30):
+    entrada = cache.get(_clave(dias))
+    if entrada is None:
+        # Primer acceso (o caché vacía): cálculo síncrono
+        datos = calcular_kpis(dias)
+        cache.set(_clave(dias), (time.time(), datos), settings.REPORTING_DASHBOARD_TTL * 10)
+        return datos
+
+    calculado, datos = entrada
+    if time.time() - calculado > settings.REPORTING_DASHBOARD_TTL:
+        # cache.add es atómico: un solo hilo refresca a la vez
+        if cache.add(_clave(dias) + ":lock", 1, settings.REPORTING_DASHBOARD_TTL):
+            threading.Thread(target=_refrescar, args=(dias,), daemon=True).start()
+    return datos
@@ -0,0 +1,122 @@
+"""
+Descarga de archivos de reportes.
+
+- Range (un solo rango "bytes=a-b") para descargas reanudables -> 206
+- ETag / Last-Modified y GET condicional -> 304
+- Opcionalmente delega la transferencia al servidor web con
+  X-Accel-Redirect (nginx) o X-Sendfile (apache), ver REPORTING_SENDFILE.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+BLOQUE = 64 * 1024
+RANGO_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _tipo_contenido(nombre):
+    tipo, encoding = mimetypes.guess_type(nombre)
+    if encoding or not tipo:
+        return "application/octet-stream"
+    return tipo
+
+
+def _leer_rango(fpath, inicio, longitud):
+    with open(fpath, "rb") as f:
+        f.seek(inicio)
+        restante = longitud
+        while restante > 0:
+            bloque = f.read(min(BLOQUE, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+
+
+def _parse_rango(cabecera, tamano):
+    """
+    Devuelve (inicio, fin) inclusivo, None si no aplica (se sirve completo)
+    o False si el rango no se puede satisfacer (416).
+    """
+    m = RANGO_RE.match(cabecera.strip())
+    if not m:
+        return None  # varios rangos o sintaxis desconocida: respuesta completa
+    desde, hasta = m.groups()
+    if desde == "" and hasta == "":
+        return None
+    if desde == "":
+        # sufijo: últimos N bytes
+        n = int(hasta)
+        if n == 0:
+            return False
+        return max(tamano - n, 0), tamano - 1
+    inicio = int(desde)
+    fin = int(hasta) if hasta else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, min(fin, tamano - 1)
+
+
+def ruta_segura(ruta_rel):
+    """Ruta absoluta dentro de MEDIA_ROOT/reports, o Http404."""
+    base = os.path.realpath(os.path.join(settings.MEDIA_ROOT, "reports"))
+    fpath = os.path.realpath(os.path.join(settings.MEDIA_ROOT, ruta_rel or ""))
+    if not ruta_rel or os.path.commonpath([base, fpath]) != base or not os.path.isfile(fpath):
+        raise Http404("Archivo de reporte no encontrado")
+    return fpath
+
+
+def servir_archivo(request, ruta_rel):
+    fpath = ruta_segura(ruta_rel)
+    st = os.stat(fpath)
+    nombre = os.path.basename(fpath)
+    etag = quote_etag(f"{st.st_size:x}-{st.st_mtime_ns:x}")
+    last_modified = int(st.st_mtime)
+
+    # 304 / 412 según If-None-Match, If-Modified-Since, If-Match...
+    condicional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if condicional is not None:
+        return condicional
+
+    modo = getattr(settings, "REPORTING_SENDFILE", "")
+    if modo:
+        response = HttpResponse(content_type=_tipo_contenido(nombre))
+        if modo == "x-accel":
+            response["X-Accel-Redirect"] = settings.REPORTING_SENDFILE_PREFIX.rstrip("/") + "/" + ruta_rel
+        else:
+            response["X-Sendfile"] = fpath
+    else:
+        rango = None
+        cabecera = request.META.get("HTTP_RANGE")
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if cabecera and (not if_range or if_range.strip() == etag):
+            rango = _parse_rango(cabecera, st.st_size)
+
+        if rango is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return response
+        if rango:
+            inicio, fin = rango
+            longitud = fin - inicio + 1
+            response = StreamingHttpResponse(
+                _leer_rango(fpath, inicio, longitud),
+                status=206,
+                content_type=_tipo_contenido(nombre),
+            )
+            response["Content-Range"] = f"bytes {inicio}-{fin}/{st.st_size}"
+            response["Content-Length"] = str(longitud)
+        else:
+            response = FileResponse(open(fpath, "rb"), content_type=_tipo_contenido(nombre))
+            response["Content-Length"] = str(st.st_size)
+
+    response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
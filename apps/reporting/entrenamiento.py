@@ -0,0 +1,194 @@
+"""
+Entrenamiento del modelo de predicción de ventas mensuales.
+
+Features: (anio, mes, producto_id), las mismas columnas que arma
+PrediccionViewSet.ejecutar_prediccion. Objetivo: ingresos del producto en
+el mes (lo que compara el reporte 'ia' contra las ventas reales).
+
+El dataset se agrega en la BD (GROUP BY mes, producto) y se completa con
+ceros para los meses sin ventas de cada producto, todo con NumPy. Se
+guarda en REPORTING_MODELOS_DIR/dataset_mensual.npz: con `desde` sólo se
+vuelven a agregar los meses a partir de esa fecha y el resto se toma del
+archivo, así el reentrenamiento nocturno no recorre todo el historial.
+Sólo entran meses cerrados: el mes en curso está incompleto y, tratado
+como un mes entero, enseñaría al modelo una caída de ventas que no existe.
+"""
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from apps.sales.models import DetalleVenta
+from .models import ModeloEntrenado, VentaDiaria
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ["anio", "mes", "producto_id"]
+ARCHIVO_DATASET = "dataset_mensual.npz"
+
+
+def directorio_modelos():
+    ruta = Path(settings.REPORTING_MODELOS_DIR)
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def inicio_mes_actual():
+    """Primer día del mes en curso: límite (exclusivo) de los meses cerrados."""
+    return timezone.localdate().replace(day=1)
+
+
+def _agregar_meses(desde=None, hasta=None):
+    """
+    (anio, mes, producto_id, ingresos) por mes y producto, agregado en la BD,
+    para las fechas desde <= fecha < hasta.
+    """
+    if settings.REPORTING_USAR_RESUMEN:
+        qs = VentaDiaria.objects.all()
+        if desde:
+            qs = qs.filter(fecha__gte=desde)
+        if hasta:
+            qs = qs.filter(fecha__lt=hasta)
+        qs = qs.values(anio=ExtractYear("fecha"), mes=ExtractMonth("fecha"), prod=F("producto_id"))
+        qs = qs.annotate(ingresos=Sum("ingresos"))
+    else:
+        qs = DetalleVenta.objects.exclude(venta__estado_venta="cancelada")
+        if desde:
+            qs = qs.filter(venta__fecha_venta__date__gte=desde)
+        if hasta:
+            qs = qs.filter(venta__fecha_venta__date__lt=hasta)
+        qs = qs.values(
+            anio=ExtractYear("venta__fecha_venta"), mes=ExtractMonth("venta__fecha_venta"),
+            prod=F("producto_id"),
+        ).annotate(ingresos=Sum("total"))
+    filas = list(qs.order_by().values_list("anio", "mes", "prod", "ingresos"))
+    if not filas:
+        return np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.float64)
+    anio, mes, prod, ingresos = zip(*filas)
+    claves = np.column_stack([
+        np.fromiter(anio, dtype=np.int64), np.fromiter(mes, dtype=np.int64), np.fromiter(prod, dtype=np.int64),
+    ])
+    return claves, np.fromiter((float(x or 0) for x in ingresos), dtype=np.float64, count=len(filas))
+
+
+def _completar_ceros(claves, ingresos):
+    """
+    Producto cartesiano meses x productos con ventas, con 0 donde no hubo
+    ventas: sin esas filas el modelo nunca vería un mes sin ventas.
+    """
+    if not len(claves):
+        return claves, ingresos
+    indice_mes = claves[:, 0] * 12 + claves[:, 1] - 1
+    meses = np.arange(indice_mes.min(), indice_mes.max() + 1)
+    productos = np.unique(claves[:, 2])
+    grilla = np.zeros((len(meses), len(productos)))
+    grilla[indice_mes - meses[0], np.searchsorted(productos, claves[:, 2])] = ingresos
+    m, p = np.meshgrid(meses, productos, indexing="ij")
+    completas = np.column_stack([m.ravel() // 12, m.ravel() % 12 + 1, p.ravel()])
+    return completas, grilla.ravel()
+
+
+def _mes_texto(indice_mes):
+    return f"{indice_mes // 12}-{indice_mes % 12 + 1:02d}"
+
+
+def dataset_mensual(desde=None, hasta=None):
+    """
+    Devuelve (X, y, info) con los meses anteriores a `hasta` (date, por
+    defecto el mes en curso, que queda afuera). Con `desde` (date) se
+    reutilizan del archivo los meses anteriores y sólo se agregan en la BD
+    los meses >= desde.
+    """
+    archivo = directorio_modelos() / ARCHIVO_DATASET
+    hasta = (hasta or inicio_mes_actual()).replace(day=1)
+    inicio = time.perf_counter()
+    if desde and archivo.exists():
+        desde = min(desde.replace(day=1), hasta)
+        with np.load(archivo) as previo:
+            claves_prev, ingresos_prev = previo["claves"], previo["ingresos"]
+        conservar = claves_prev[:, 0] * 12 + claves_prev[:, 1] < desde.year * 12 + desde.month
+        claves_nuevas, ingresos_nuevos = _agregar_meses(desde, hasta)
+        claves = np.concatenate([claves_prev[conservar], claves_nuevas])
+        ingresos = np.concatenate([ingresos_prev[conservar], ingresos_nuevos])
+        modo = f"incremental desde {desde:%Y-%m}"
+    else:
+        claves, ingresos = _agregar_meses(hasta=hasta)
+        modo = "completo"
+    # El archivo guarda sólo meses con ventas; los ceros se agregan al entrenar
+    np.savez(archivo, claves=claves, ingresos=ingresos)
+    duracion = time.perf_counter() - inicio
+
+    claves_c, y = _completar_ceros(claves, ingresos)
+    indice_mes = claves_c[:, 0] * 12 + claves_c[:, 1] - 1
+    info = {
+        "modo": modo,
+        "filas_con_ventas": int(len(claves)),
+        "filas": int(len(claves_c)),
+        "productos": int(len(np.unique(claves[:, 2]))) if len(claves) else 0,
+        "desde": _mes_texto(indice_mes.min()) if len(claves_c) else None,
+        "hasta": _mes_texto(indice_mes.max()) if len(claves_c) else None,
+        "segundos_dataset": round(duracion, 3),
+    }
+    return claves_c, y, info
+
+
+def entrenar(desde=None, n_estimators=200, max_depth=None, n_jobs=-1, meses_prueba=1, comprimir=0, hasta=None):
+    """
+    Entrena un RandomForestRegressor, guarda el .joblib y registra el
+    ModeloEntrenado. Los últimos `meses_prueba` meses cerrados se reservan
+    para medir precision_modelo (R² fuera de muestra) antes de reentrenar
+    con todo.
+    """
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import r2_score
+
+    X, y, info = dataset_mensual(desde, hasta)
+    if not len(X):
+        raise ValueError("No hay ventas para entrenar el modelo")
+    X = pd.DataFrame(X, columns=FEATURES)
+
+    def nuevo_modelo():
+        return RandomForestRegressor(
+            n_estimators=n_estimators, max_depth=max_depth, n_jobs=n_jobs, random_state=42
+        )
+
+    indice_mes = X["anio"].to_numpy() * 12 + X["mes"].to_numpy()
+    corte = np.unique(indice_mes)[-meses_prueba] if len(np.unique(indice_mes)) > meses_prueba else None
+    precision = None
+    inicio = time.perf_counter()
+    if corte is not None:
+        entrenamiento = indice_mes < corte
+        evaluacion = nuevo_modelo().fit(X[entrenamiento], y[entrenamiento])
+        precision = float(r2_score(y[~entrenamiento], evaluacion.predict(X[~entrenamiento])))
+    modelo = nuevo_modelo().fit(X, y)
+    info["segundos_entrenamiento"] = round(time.perf_counter() - inicio, 3)
+
+    version = timezone.localtime().strftime("%Y%m%d%H%M%S")
+    ruta = directorio_modelos() / f"sales_rf_{version}.joblib"
+    # Sin compresión por defecto: permite joblib.load(mmap_mode='r') en el registro
+    joblib.dump(modelo, ruta, compress=comprimir)
+
+    try:
+        ruta_guardada = str(ruta.relative_to(settings.BASE_DIR))
+    except ValueError:
+        ruta_guardada = str(ruta)
+    registro = ModeloEntrenado.objects.create(
+        nombre_modelo="sales_rf",
+        version=version,
+        ruta_archivo=ruta_guardada,
+        dataset_usado=(
+            f"{'VentaDiaria' if settings.REPORTING_USAR_RESUMEN else 'DetalleVenta'} "
+            f"{info['desde']}..{info['hasta']}, {info['filas']} filas, {info['productos']} productos"
+        )[:255],
+        precision_modelo=precision,
+    )
+    info["precision_r2"] = precision
+    logger.info("Modelo %s entrenado: %s", registro.pk, info)
+    return registro, info
@@ -0,0 +1,169 @@
+"""
+Escritores de filas para export_rows.
+
+Todos reciben la primera fila ya leída y el resto como iterador, y escriben
+de forma incremental (los formatos columnares por lotes de CHUNK_SIZE).
+
+Mapeo de tipos explícito para Parquet/Feather. Cada columna toma el tipo de
+su primer valor no nulo dentro del primer lote (CHUNK_SIZE filas):
+    Decimal  -> decimal128(18, s)   s = mayor escala del lote, entre 2 y 6;
+                                    los valores se redondean a s decimales
+    date     -> date32
+    datetime -> timestamp[us, TIME_ZONE]
+    int      -> int64, float -> float64, bool -> bool
+    resto, o columna sin valores en el primer lote -> string
+"""
+import csv
+import gzip
+import json
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import chain, islice
+
+from django.conf import settings
+
+CHUNK_SIZE = 2000
+DECIMAL_PRECISION = 18
+DECIMAL_ESCALA_MAX = 6
+
+# formato -> (extensión, escritor, compresión)
+FORMATOS = {
+    'CSV': ('csv', 'csv', None),
+    'CSV_GZ': ('csv.gz', 'csv', 'gzip'),
+    'CSV_ZST': ('csv.zst', 'csv', 'zstd'),
+    'JSON': ('json', 'json', None),
+    'NDJSON': ('ndjson', 'ndjson', None),
+    'NDJSON_GZ': ('ndjson.gz', 'ndjson', 'gzip'),
+    'NDJSON_ZST': ('ndjson.zst', 'ndjson', 'zstd'),
+    'PARQUET': ('parquet', 'parquet', None),
+    'FEATHER': ('feather', 'feather', None),
+}
+
+
+def _json_default(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return str(v)  # Decimal y otros
+
+
+def abrir_texto(fpath, compresion):
+    if compresion == 'gzip':
+        return gzip.open(fpath, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    if compresion == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("El formato zstd requiere el paquete 'zstandard'")
+        return zstandard.open(fpath, 'wt', encoding='utf-8', newline='')
+    return open(fpath, 'w', newline='', encoding='utf-8')
+
+
+def escribir_csv(f, first, rows):
+    if first is None:
+        return  # sin filas: archivo vacío con headers omitidos
+    fieldnames = list(first.keys())
+    # Columnas de fecha: se escriben en ISO 8601
+    temporales = [k for k, v in first.items() if isinstance(v, (date, datetime))]
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in chain([first], rows):
+        if temporales:
+            row = dict(row)
+            for k in temporales:
+                if row[k] is not None:
+                    row[k] = row[k].isoformat()
+        writer.writerow(row)
+
+
+def escribir_json(f, first, rows):
+    f.write('[')
+    if first is not None:
+        for i, row in enumerate(chain([first], rows)):
+            f.write(',\n  ' if i else '\n  ')
+            f.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+        f.write('\n')
+    f.write(']')
+
+
+def escribir_ndjson(f, first, rows):
+    if first is None:
+        return
+    for row in chain([first], rows):
+        f.write(json.dumps(row, ensure_ascii=False, default=_json_default))
+        f.write('\n')
+
+
+def _tipo_arrow(pa, valores):
+    """Tipo Arrow del primer valor no nulo de la columna (string si todos son nulos)."""
+    valor = next((v for v in valores if v is not None), None)
+    if isinstance(valor, bool):
+        return pa.bool_()
+    if isinstance(valor, int):
+        return pa.int64()
+    if isinstance(valor, float):
+        return pa.float64()
+    if isinstance(valor, Decimal):
+        # Escala: la mayor de la muestra (mínimo 2, los montos), hasta DECIMAL_ESCALA_MAX
+        escala = max((-v.as_tuple().exponent for v in valores if isinstance(v, Decimal) and v.is_finite()), default=2)
+        return pa.decimal128(DECIMAL_PRECISION, min(max(escala, 2), DECIMAL_ESCALA_MAX))
+    if isinstance(valor, datetime):
+        return pa.timestamp('us', tz=settings.TIME_ZONE)
+    if isinstance(valor, date):
+        return pa.date32()
+    return pa.string()
+
+
+def esquema_arrow(filas):
+    """Esquema de las columnas de la primera fila, cada una inferida de su primer valor no nulo en `filas`."""
+    import pyarrow as pa
+
+    return pa.schema([(k, _tipo_arrow(pa, [f[k] for f in filas])) for k in filas[0]])
+
+
+def _conversor(pa, tipo):
+    """Función que adapta un valor al tipo de la columna, o None si no hace falta."""
+    if pa.types.is_decimal(tipo):
+        exponente = Decimal(1).scaleb(-tipo.scale)
+        return lambda v: Decimal(str(v)).quantize(exponente, rounding=ROUND_HALF_UP)
+    if pa.types.is_floating(tipo):
+        return float
+    if pa.types.is_string(tipo):
+        return _texto
+    return None
+
+
+def _texto(v):
+    return v if isinstance(v, str) else _json_default(v)
+
+
+def escribir_arrow(fpath, first, rows, formato):
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f"El formato {formato} requiere el paquete 'pyarrow'")
+
+    # El esquema sale del primer lote completo, no sólo de la primera fila:
+    # un None en la primera fila no fija la columna como string.
+    lote = [first] + list(islice(rows, CHUNK_SIZE - 1)) if first is not None else []
+    schema = esquema_arrow(lote) if lote else pa.schema([])
+    conversores = [
+        (campo.name, conv) for campo in schema if (conv := _conversor(pa, campo.type)) is not None
+    ]
+    if formato == 'PARQUET':
+        writer = pq.ParquetWriter(fpath, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(
+            str(fpath), schema, options=pa.ipc.IpcWriteOptions(compression='zstd')
+        )
+    with writer:
+        while lote:
+            if conversores:
+                lote = [dict(fila) for fila in lote]
+                for fila in lote:
+                    for k, conv in conversores:
+                        if fila[k] is not None:
+                            fila[k] = conv(fila[k])
+            writer.write_batch(pa.RecordBatch.from_pylist(lote, schema=schema))
+            lote = list(islice(rows, CHUNK_SIZE))
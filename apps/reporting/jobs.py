@@ -0,0 +1,318 @@
+"""
+Cola de reportes en segundo plano.
+
+Los trabajos se guardan en TrabajoReporte (la tabla es la fuente de verdad
+de la cola) y se ejecutan en un ThreadPoolExecutor local al proceso, así una
+petición HTTP no queda bloqueada mientras se genera un reporte grande.
+Las corridas de predicción (EjecucionPrediccion) comparten el mismo pool y
+el mismo límite de cola.
+
+Si el proceso que encoló se reinicia antes de ejecutar un trabajo, la fila
+queda 'pendiente' sin nadie que la procese: cada proceso servidor recorre la
+tabla al arrancar y cada REPORTING_RECLAMO_INTERVALO segundos
+(reclamar_pendientes) y vuelve a enviar esas filas a su pool.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+
+from apps.marketing.models import Notificacion
+from .models import EjecucionPrediccion, TrabajoReporte
+from .services import crear_reporte
+from . import predicciones, registro_modelos
+
+logger = logging.getLogger(__name__)
+
+ACTIVOS = ("pendiente", "en_proceso")
+
+_executor = None
+_lock = threading.Lock()
+_en_ejecucion = 0
+_enviados = set()  # (modelo, pk) enviados al pool de este proceso y aún sin terminar
+_pid_reclamo = None
+
+
+class ColaLlena(Exception):
+    pass
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REPORTING_WORKERS,
+                thread_name_prefix="reportes",
+            )
+    return _executor
+
+
+def _enviar(funcion, fila):
+    clave = (type(fila), fila.pk)
+    with _lock:
+        if clave in _enviados:
+            return
+        _enviados.add(clave)
+    futuro = get_executor().submit(funcion, fila.pk)
+    futuro.add_done_callback(lambda _: _enviados.discard(clave))
+
+
+def reclamar_pendientes():
+    """
+    Vuelve a enviar al pool de este proceso los trabajos y predicciones que
+    siguen 'pendiente' después de REPORTING_RECLAMO_GRACIA segundos (su
+    proceso se reinició o nunca los envió). Las filas se bloquean con
+    select_for_update(skip_locked=True), así dos procesos que reclaman a la
+    vez no se reparten la misma fila; si igual se envía dos veces, la toma
+    atómica de ejecutar_trabajo/ejecutar_prediccion deja una sola ejecución.
+    Toma como máximo los workers libres del proceso. Devuelve cuántas envió.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.REPORTING_RECLAMO_GRACIA)
+    with _lock:
+        libres = settings.REPORTING_WORKERS - len(_enviados)
+    enviados = 0
+    for modelo, funcion in ((TrabajoReporte, ejecutar_trabajo), (EjecucionPrediccion, ejecutar_prediccion)):
+        if libres - enviados <= 0:
+            break
+        with transaction.atomic():
+            filas = list(
+                modelo.objects.select_for_update(skip_locked=True)
+                .filter(estado="pendiente", creado_en__lt=limite)
+                .exclude(pk__in=[pk for m, pk in list(_enviados) if m is modelo])
+                .order_by("creado_en")[: libres - enviados]
+            )
+            for fila in filas:
+                transaction.on_commit(lambda f=fila, fn=funcion: _enviar(fn, f))
+        enviados += len(filas)
+    if enviados:
+        logger.info("Reclamados %s trabajos pendientes", enviados)
+    return enviados
+
+
+def _bucle_reclamo():
+    from django.apps import apps
+
+    while not apps.ready:
+        time.sleep(0.05)
+    while True:
+        try:
+            reclamar_pendientes()
+            marcar_vencidos()
+        except Exception:
+            logger.exception("Falló el reclamo de trabajos pendientes")
+        finally:
+            connection.close()
+        time.sleep(settings.REPORTING_RECLAMO_INTERVALO)
+
+
+def iniciar_reclamo():
+    """Lanza el hilo de reclamo una vez por proceso (también en cada worker tras el fork)."""
+    global _pid_reclamo
+    if _pid_reclamo == os.getpid() or settings.REPORTING_RECLAMO_INTERVALO <= 0:
+        return
+    _pid_reclamo = os.getpid()
+    threading.Thread(target=_bucle_reclamo, name="reclamo-reportes", daemon=True).start()
+
+
+def marcar_vencidos():
+    """Da por fallidos los trabajos que superaron REPORTING_JOB_TIMEOUT."""
+    limite = timezone.now() - timedelta(seconds=settings.REPORTING_JOB_TIMEOUT)
+    vencidos = Q(estado="en_proceso", iniciado_en__lt=limite) | Q(estado="pendiente", creado_en__lt=limite)
+    cambios = {
+        "estado": "fallido",
+        "error": "Tiempo máximo de ejecución excedido",
+        "finalizado_en": timezone.now(),
+    }
+    return (
+        TrabajoReporte.objects.filter(vencidos).update(**cambios)
+        + EjecucionPrediccion.objects.filter(vencidos).update(**cambios)
+    )
+
+
+def _en_cola():
+    return (
+        TrabajoReporte.objects.filter(estado__in=ACTIVOS).count()
+        + EjecucionPrediccion.objects.filter(estado__in=ACTIVOS).count()
+    )
+
+
+def encolar(tipo, formato="CSV", parametros=None, prompt="", user=None):
+    """
+    Registra el trabajo y lo envía al pool cuando la transacción confirma.
+    Lanza ColaLlena si ya hay REPORTING_MAX_QUEUE trabajos activos.
+    """
+    marcar_vencidos()
+    if _en_cola() >= settings.REPORTING_MAX_QUEUE:
+        raise ColaLlena("La cola de reportes está llena, intente más tarde.")
+
+    trabajo = TrabajoReporte.objects.create(
+        tipo_reporte=tipo,
+        formato=formato,
+        parametros=parametros or {},
+        prompt_texto=prompt,
+        solicitado_por=user if user and user.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: _enviar(ejecutar_trabajo, trabajo))
+    return trabajo
+
+
+def _finalizar(modelo, pk, cambios, inicio):
+    """
+    Escribe el resultado sólo si la fila sigue 'en_proceso': si marcar_vencidos()
+    ya la dio por fallida, el usuario vio el timeout y no se pisa. Devuelve
+    True si la escribió.
+    """
+    escrito = modelo.objects.filter(pk=pk, estado="en_proceso").update(
+        finalizado_en=timezone.now(),
+        duracion_segundos=round(time.perf_counter() - inicio, 3),
+        **cambios,
+    )
+    if not escrito:
+        logger.warning("%s %s terminó después de vencer; se descarta el resultado", modelo.__name__, pk)
+    return bool(escrito)
+
+
+def ejecutar_trabajo(trabajo_id):
+    global _en_ejecucion
+    close_old_connections()
+    with _lock:
+        _en_ejecucion += 1
+    inicio = time.perf_counter()
+    try:
+        # Tomamos el trabajo de forma atómica: si otro worker ya lo tomó, no hacemos nada
+        tomado = TrabajoReporte.objects.filter(pk=trabajo_id, estado="pendiente").update(
+            estado="en_proceso", iniciado_en=timezone.now()
+        )
+        if not tomado:
+            return
+        trabajo = TrabajoReporte.objects.get(pk=trabajo_id)
+        try:
+            rep, _ = crear_reporte(
+                trabajo.tipo_reporte,
+                formato=trabajo.formato,
+                parametros=trabajo.parametros,
+                prompt=trabajo.prompt_texto,
+            )
+        except Exception as e:
+            logger.exception("Falló el trabajo de reporte %s", trabajo_id)
+            rep = None
+            cambios = {"estado": "fallido", "error": str(e)}
+        else:
+            cambios = {"estado": "completado", "reporte": rep}
+        if not _finalizar(TrabajoReporte, trabajo_id, cambios, inicio):
+            return
+        if rep and trabajo.solicitado_por_id:
+            Notificacion.objects.create(
+                user_id=trabajo.solicitado_por_id,
+                titulo="Reporte listo",
+                mensaje=f"El reporte #{rep.id} ({rep.descripcion}) ya está disponible.",
+                tipo="alerta",
+            )
+    finally:
+        with _lock:
+            _en_ejecucion -= 1
+        connection.close()
+
+
+def encolar_prediccion(modelo, parametros, user=None):
+    """Como encolar(), para una corrida de predicción (EjecucionPrediccion)."""
+    marcar_vencidos()
+    if _en_cola() >= settings.REPORTING_MAX_QUEUE:
+        raise ColaLlena("La cola de trabajos está llena, intente más tarde.")
+
+    ejecucion = EjecucionPrediccion.objects.create(
+        modelo=modelo,
+        parametros=parametros,
+        solicitado_por=user if user and user.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: _enviar(ejecutar_prediccion, ejecucion))
+    return ejecucion
+
+
+def ejecutar_prediccion(ejecucion_id):
+    global _en_ejecucion
+    close_old_connections()
+    with _lock:
+        _en_ejecucion += 1
+    inicio = time.perf_counter()
+    try:
+        tomado = EjecucionPrediccion.objects.filter(pk=ejecucion_id, estado="pendiente").update(
+            estado="en_proceso", iniciado_en=timezone.now()
+        )
+        if not tomado:
+            return
+        ejecucion = EjecucionPrediccion.objects.select_related("modelo").get(pk=ejecucion_id)
+        params = ejecucion.parametros
+        try:
+            producto_ids = list(predicciones.productos_a_predecir(params))
+            EjecucionPrediccion.objects.filter(pk=ejecucion_id).update(productos_total=len(producto_ids))
+
+            def progreso(procesados, filas):
+                EjecucionPrediccion.objects.filter(pk=ejecucion_id).update(
+                    productos_procesados=procesados, filas=filas
+                )
+
+            resumen = predicciones.pronosticar(
+                ejecucion.modelo,
+                registro_modelos.obtener(ejecucion.modelo),
+                producto_ids,
+                params["anio"],
+                params["mes"],
+                params["horizonte"],
+                bloque=settings.REPORTING_PREDICCION_BLOQUE,
+                progreso=progreso,
+            )
+        except Exception as e:
+            logger.exception("Falló la ejecución de predicción %s", ejecucion_id)
+            resumen = None
+            cambios = {"estado": "fallido", "error": str(e)}
+        else:
+            cambios = {"estado": "completado", "filas": resumen["filas"]}
+        if not _finalizar(EjecucionPrediccion, ejecucion_id, cambios, inicio):
+            return
+        if resumen and ejecucion.solicitado_por_id:
+            Notificacion.objects.create(
+                user_id=ejecucion.solicitado_por_id,
+                titulo="Predicción lista",
+                mensaje=(
+                    f"La predicción #{ejecucion.id} ({resumen['filas']} filas, "
+                    f"{len(resumen['meses'])} meses) ya está disponible."
+                ),
+                tipo="alerta",
+            )
+    finally:
+        with _lock:
+            _en_ejecucion -= 1
+        connection.close()
+
+
+def estadisticas():
+    """Profundidad de la cola, concurrencia y duración de los trabajos."""
+    marcar_vencidos()
+    por_estado = dict(
+        TrabajoReporte.objects.values_list("estado").annotate(n=Count("id")).order_by()
+    )
+    duraciones = TrabajoReporte.objects.filter(estado="completado").aggregate(
+        promedio=Avg("duracion_segundos"), maximo=Max("duracion_segundos")
+    )
+    return {
+        "workers": settings.REPORTING_WORKERS,
+        "en_ejecucion_proceso": _en_ejecucion,
+        "max_cola": settings.REPORTING_MAX_QUEUE,
+        "timeout_segundos": settings.REPORTING_JOB_TIMEOUT,
+        "pendientes": por_estado.get("pendiente", 0),
+        "en_proceso": por_estado.get("en_proceso", 0),
+        "completados": por_estado.get("completado", 0),
+        "fallidos": por_estado.get("fallido", 0),
+        "duracion_promedio_segundos": duraciones["promedio"],
+        "duracion_maxima_segundos": duraciones["maximo"],
+        "predicciones_activas": EjecucionPrediccion.objects.filter(estado__in=ACTIVOS).count(),
+    }
@@ -0,0 +1,77 @@
+import resource
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.reporting.exporters import FORMATOS
+from apps.reporting.services import detalle_ventas_rows, export_rows
+
+
+def _peak_rss_mb():
+    # ru_maxrss viene en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _filas_sinteticas(n):
+    base = timezone.localtime()
+    for i in range(n):
+        yield {
+            'venta': i // 3,
+            'fecha': base - timedelta(minutes=i),
+            'metodo_pago': 'tarjeta' if i % 2 else 'efectivo',
+            'producto': i % 5000,
+            'producto_nombre': f'Producto {i % 5000}',
+            'cantidad': 1 + i % 4,
+            'precio_unitario': Decimal('19.90'),
+            'total': Decimal('19.90') * (1 + i % 4),
+        }
+
+
+class Command(BaseCommand):
+    help = "Benchmark de exportación de reportes: pico de RSS y filas/seg."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--formato', default='CSV', choices=list(FORMATOS))
+        parser.add_argument('--fuente', default='sintetica', choices=['sintetica', 'db'],
+                            help="'db' lee DetalleVenta con iterator(); 'sintetica' genera filas en memoria")
+        parser.add_argument('--materializar', action='store_true',
+                            help="Convierte el generador en lista antes de exportar (comportamiento anterior)")
+        parser.add_argument('--keep', action='store_true', help="No borrar el archivo generado")
+
+    def handle(self, *args, **opts):
+        rss_inicial = _peak_rss_mb()
+        if opts['fuente'] == 'db':
+            rows = detalle_ventas_rows()
+        else:
+            rows = _filas_sinteticas(opts['rows'])
+        if opts['materializar']:
+            rows = list(rows)
+
+        contador = {'n': 0}
+
+        def contar(it):
+            for row in it:
+                contador['n'] += 1
+                yield row
+
+        inicio = time.perf_counter()
+        ruta_rel = export_rows(contar(rows), formato=opts['formato'], base_filename='bench_export')
+        duracion = time.perf_counter() - inicio
+
+        fpath = Path(settings.MEDIA_ROOT) / ruta_rel
+        tamano_mb = fpath.stat().st_size / (1024 * 1024)
+        if not opts['keep']:
+            fpath.unlink()
+
+        n = contador['n']
+        self.stdout.write(
+            f"formato={opts['formato']} fuente={opts['fuente']} materializar={opts['materializar']}\n"
+            f"filas={n} tiempo={duracion:.2f}s filas/seg={n / duracion if duracion else 0:,.0f}\n"
+            f"archivo={tamano_mb:.1f} MB rss_inicial={rss_inicial:.1f} MB pico_rss={_peak_rss_mb():.1f} MB"
+        )
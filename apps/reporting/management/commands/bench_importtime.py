@@ -0,0 +1,75 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time:       904 |     678359 | pandas" (microsegundos; la sangría del nombre es la profundidad)
+LINEA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+PESADAS = ("pandas", "sklearn", "scipy", "joblib", "tensorflow", "torch")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque con `python -X importtime`: django.setup() más los módulos "
+        "indicados (por defecto ROOT_URLCONF, que importa todas las vistas). Falla si "
+        "supera --max-ms o si se importa alguna librería de --prohibir."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modulos', nargs='*', help="Módulos a importar (default: ROOT_URLCONF)")
+        parser.add_argument('--repeticiones', type=int, default=3, help="Se informa la mejor corrida")
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--max-ms', type=float, default=None)
+        parser.add_argument(
+            '--prohibir', default='pandas,sklearn,tensorflow',
+            help="Librerías que no deben cargarse al arrancar (separadas por coma, vacío para ninguna)",
+        )
+
+    def _medir(self, modulos):
+        codigo = "import django; django.setup()\n" + "".join(f"import {m}\n" for m in modulos)
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)}
+        inicio = time.perf_counter()
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo],
+            capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+        )
+        duracion = time.perf_counter() - inicio
+        if proceso.returncode:
+            raise CommandError(proceso.stderr.strip().splitlines()[-1])
+        acumulado, total = {}, 0
+        for linea in proceso.stderr.splitlines():
+            m = LINEA.match(linea)
+            if m:
+                acumulado[m.group(4)] = int(m.group(2))
+                if len(m.group(3)) == 1:
+                    total += int(m.group(2))  # primer nivel: su suma es el total de imports
+        return duracion, total, acumulado
+
+    def handle(self, *args, **opts):
+        modulos = opts['modulos'] or [settings.ROOT_URLCONF]
+        corridas = [self._medir(modulos) for _ in range(max(1, opts['repeticiones']))]
+        duracion, total, acumulado = min(corridas, key=lambda c: c[1])
+
+        self.stdout.write(f"módulos: {', '.join(modulos)}")
+        self.stdout.write(f"proceso completo: {duracion * 1000:.0f} ms  imports: {total / 1000:.0f} ms  "
+                          f"({len(acumulado)} módulos, mejor de {len(corridas)})")
+        self.stdout.write(f"\n{'acumulado ms':>12}  módulo")
+        for nombre, us in sorted(acumulado.items(), key=lambda x: -x[1])[:opts['top']]:
+            self.stdout.write(f"{us / 1000:12.1f}  {nombre}")
+
+        cargadas = [p for p in PESADAS if p in acumulado]
+        self.stdout.write(f"\nlibrerías pesadas cargadas: {', '.join(cargadas) or 'ninguna'}")
+
+        errores = []
+        prohibidas = [p.strip() for p in opts['prohibir'].split(',') if p.strip()]
+        for nombre in prohibidas:
+            if nombre in acumulado:
+                errores.append(f"{nombre} se importa al arrancar ({acumulado[nombre] / 1000:.0f} ms)")
+        if opts['max_ms'] is not None and total / 1000 > opts['max_ms']:
+            errores.append(f"imports {total / 1000:.0f} ms > --max-ms {opts['max_ms']:.0f}")
+        if errores:
+            raise CommandError("; ".join(errores))
@@ -0,0 +1,73 @@
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.catalog.models import Categoria, Producto
+from apps.reporting.models import ModeloEntrenado, PrediccionVenta
+from apps.reporting.predicciones import a_decimal, guardar
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la escritura de PrediccionVenta fila por fila (create) contra "
+        "el upsert por lotes de apps/reporting/predicciones.py, en la BD configurada. "
+        "Cuenta sentencias SQL: un executemany cuenta una por fila, que es lo que "
+        "manda psycopg2 (una ida y vuelta por fila). Todo se descarta al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=20000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def _medir(self, nombre, funcion):
+        sentencias = []
+
+        def contar(execute, sql, params, many, context):
+            if many:
+                params = list(params)
+            sentencias.append(len(params) if many else 1)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            inicio = time.perf_counter()
+            funcion()
+            duracion = time.perf_counter() - inicio
+        self.stdout.write(f"{nombre:<28} {duracion * 1000:10.1f} ms  sentencias={sum(sentencias)}")
+        return duracion
+
+    def handle(self, *args, **opts):
+        n = opts['productos']
+        rnd = random.Random(42)
+        with transaction.atomic():
+            cat = Categoria.objects.create(nombre="Bench predicciones")
+            productos = Producto.objects.bulk_create(
+                [Producto(categoria=cat, nombre=f"Bench {i}", precio=Decimal("10")) for i in range(n)],
+                batch_size=5000,
+            )
+            modelo = ModeloEntrenado.objects.create(nombre_modelo="bench", version="0", ruta_archivo="")
+            valores = [rnd.uniform(-5, 500) for _ in productos]
+            fecha = date(2030, 1, 1)
+
+            def por_fila():
+                # Comportamiento anterior: borrar y un INSERT por producto
+                PrediccionVenta.objects.filter(modelo=modelo, fecha_prediccion=fecha).delete()
+                for p, v in zip(productos, valores):
+                    PrediccionVenta.objects.create(
+                        modelo=modelo, producto=p, fecha_prediccion=fecha,
+                        ventas_estimadas=a_decimal(v), periodo="Mensual",
+                    )
+
+            def upsert():
+                guardar(modelo, zip([p.pk for p in productos], [fecha] * n, valores), batch_size=opts['batch_size'])
+
+            self.stdout.write(f"{n} productos, BD {connection.vendor}")
+            antes = self._medir("create() por fila", por_fila)
+            PrediccionVenta.objects.filter(modelo=modelo).delete()
+            despues = self._medir("upsert (inserta)", upsert)
+            self._medir("upsert (actualiza)", upsert)
+            self.stdout.write(self.style.SUCCESS(f"Aceleración: x{antes / despues:.1f}"))
+            transaction.set_rollback(True)
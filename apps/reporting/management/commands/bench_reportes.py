@@ -0,0 +1,116 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.catalog.models import Categoria, Producto
+from apps.customers.models import Cliente
+from apps.reporting.models import ModeloEntrenado, PrediccionVenta
+from apps.reporting.reportes import REGISTRO
+from apps.reporting.rollup import reconstruir
+from apps.sales.models import DetalleVenta, Venta
+
+
+def sembrar(productos, clientes, ventas, dias=365, seed=42):
+    """Datos sintéticos para medir los reportes (se crean dentro de la transacción del benchmark)."""
+    rnd = random.Random(seed)
+    ahora = timezone.now()
+    cats = Categoria.objects.bulk_create([Categoria(nombre=f"Bench {i}") for i in range(20)])
+    prods = Producto.objects.bulk_create([
+        Producto(
+            categoria=cats[i % len(cats)], nombre=f"Bench producto {i}",
+            precio=Decimal(rnd.randint(5, 500)), stock=rnd.randint(0, 200),
+        )
+        for i in range(productos)
+    ], batch_size=2000)
+    users = User.objects.bulk_create([
+        User(username=f"bench_{ahora:%H%M%S}_{i}", password="!") for i in range(clientes)
+    ], batch_size=2000)
+    clis = Cliente.objects.bulk_create([
+        Cliente(user=u, ciudad=rnd.choice(["La Paz", "Santa Cruz", "Cochabamba"])) for u in users
+    ], batch_size=2000)
+
+    lote_ventas = Venta.objects.bulk_create([
+        Venta(
+            cliente=rnd.choice(clis),
+            fecha_venta=ahora - timedelta(days=rnd.randint(0, dias), minutes=rnd.randint(0, 1440)),
+            metodo_pago=rnd.choice(["tarjeta", "efectivo", "stripe"]),
+            total=Decimal("0"),
+            estado_venta=rnd.choice(["completada"] * 9 + ["cancelada"]),
+        )
+        for _ in range(ventas)
+    ], batch_size=2000)
+    detalles = []
+    for v in lote_ventas:
+        total = Decimal("0")
+        for p in rnd.sample(prods, rnd.randint(1, 3)):
+            cantidad = rnd.randint(1, 4)
+            detalles.append(DetalleVenta(
+                venta=v, producto=p, cantidad=cantidad,
+                precio_unitario=p.precio, total=p.precio * cantidad,
+            ))
+            total += p.precio * cantidad
+        v.total = total
+    Venta.objects.bulk_update(lote_ventas, ["total"], batch_size=2000)
+    DetalleVenta.objects.bulk_create(detalles, batch_size=5000)
+
+    modelo = ModeloEntrenado.objects.create(nombre_modelo="bench", version="0", ruta_archivo="")
+    hoy = timezone.localdate()
+    meses = [date(hoy.year - (hoy.month - k <= 0), (hoy.month - k - 1) % 12 + 1, 1) for k in range(12)]
+    PrediccionVenta.objects.bulk_create([
+        PrediccionVenta(
+            modelo=modelo, producto=p, fecha_prediccion=m,
+            ventas_estimadas=Decimal(rnd.randint(0, 2000)), periodo="Mensual",
+        )
+        for p in prods for m in meses
+    ], batch_size=5000)
+    reconstruir()
+    return len(detalles)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark de los tipos de reporte registrados: tiempo, filas/seg y número de consultas. "
+        "Con --seed-ventas crea datos sintéticos y los descarta al terminar (rollback)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tipo', action='append', help="Tipo a medir (repetible); por defecto todos")
+        parser.add_argument('--seed-ventas', type=int, default=0)
+        parser.add_argument('--seed-productos', type=int, default=2000)
+        parser.add_argument('--seed-clientes', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        tipos = opts['tipo'] or list(REGISTRO)
+        with transaction.atomic():
+            if opts['seed_ventas']:
+                inicio = time.perf_counter()
+                lineas = sembrar(opts['seed_productos'], opts['seed_clientes'], opts['seed_ventas'])
+                self.stdout.write(
+                    f"Datos sintéticos: {opts['seed_ventas']} ventas / {lineas} líneas "
+                    f"en {time.perf_counter() - inicio:.1f}s"
+                )
+            for tipo in tipos:
+                builder = REGISTRO[tipo]
+                params = dict(builder.parametros_benchmark)
+                try:
+                    builder.validar(params)
+                except ValueError as e:
+                    self.stdout.write(f"{tipo:<10} omitido: {e}")
+                    continue
+                with CaptureQueriesContext(connection) as ctx:
+                    inicio = time.perf_counter()
+                    filas = sum(1 for _ in builder.rows(params))
+                    duracion = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"{tipo:<10} filas={filas:<8} tiempo={duracion * 1000:8.1f} ms "
+                    f"filas/seg={filas / duracion if duracion else 0:>10,.0f} consultas={len(ctx.captured_queries)}"
+                )
+            # Nunca persistimos los datos del benchmark
+            transaction.set_rollback(True)
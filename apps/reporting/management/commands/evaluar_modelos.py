@@ -0,0 +1,71 @@
+import csv
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reporting.backtesting import backtest, seguimiento
+from apps.reporting.models import ModeloEntrenado
+
+
+class Command(BaseCommand):
+    help = (
+        "Evalúa modelos de predicción y guarda EvaluacionModelo: predicciones de meses "
+        "cerrados vs. ventas reales y, con --backtest, backtesting con origen móvil. "
+        "Pensado para cron, p. ej. el día 1 de cada mes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', type=int, action='append', help="Id de ModeloEntrenado (repetible)")
+        parser.add_argument('--ultimos', type=int, default=5, help="Sin --modelo: los N más recientes")
+        parser.add_argument('--backtest', action='store_true')
+        parser.add_argument('--origenes', type=int, default=3)
+        parser.add_argument('--horizonte', type=int, default=1)
+        parser.add_argument('--csv', help="Archivo con MAE/MAPE por producto de cada evaluación")
+
+    def handle(self, *args, **opts):
+        modelos = ModeloEntrenado.objects.order_by('-fecha_entrenamiento')
+        modelos = modelos.filter(id__in=opts['modelo']) if opts['modelo'] else modelos[:opts['ultimos']]
+        if not modelos:
+            raise CommandError("No hay modelos para evaluar")
+
+        resultados = []
+        for modelo in modelos:
+            try:
+                r, _ = seguimiento(modelo)
+                if r is not None:
+                    resultados.append((modelo, 'seguimiento', r))
+                if opts['backtest']:
+                    r, _ = backtest(modelo, opts['origenes'], opts['horizonte'])
+                    resultados.append((modelo, 'backtest', r))
+            except (FileNotFoundError, ValueError) as e:
+                self.stderr.write(f"Modelo {modelo.pk}: {e}")
+
+        # Menor MAPE primero; a igual precisión, la inferencia más rápida
+        resultados.sort(key=lambda x: (
+            x[2]['mape'] if x[2]['mape'] is not None else math.inf,
+            x[2].get('segundos_inferencia') or math.inf,
+        ))
+        self.stdout.write(
+            f"{'modelo':>6}  {'tipo':<11} {'MAE':>12} {'MAPE %':>8} {'filas':>8} "
+            f"{'entren. s':>9} {'infer. s':>9} {'filas inf.':>10}"
+        )
+        for modelo, tipo, r in resultados:
+            mape = f"{r['mape']:.1f}" if r['mape'] is not None else '-'
+            entrenamiento = f"{r['segundos_entrenamiento']:.2f}" if r.get('segundos_entrenamiento') else '-'
+            inferencia = f"{r['segundos_inferencia']:.4f}" if r.get('segundos_inferencia') else '-'
+            self.stdout.write(
+                f"{modelo.pk:>6}  {tipo:<11} {r['mae']:>12.2f} {mape:>8} {r['filas']:>8} "
+                f"{entrenamiento:>9} {inferencia:>9} {r.get('filas_inferencia', 0):>10}"
+            )
+
+        if opts['csv']:
+            with open(opts['csv'], 'w', newline='', encoding='utf-8') as f:
+                w = csv.writer(f)
+                w.writerow(['modelo', 'tipo', 'producto', 'filas', 'mae', 'mape'])
+                for modelo, tipo, r in resultados:
+                    p = r['por_producto']
+                    for fila in zip(p['producto'].tolist(), p['filas'].tolist(), p['mae'].tolist(), p['mape'].tolist()):
+                        w.writerow([modelo.pk, tipo, fila[0], fila[1], round(fila[2], 4),
+                                    '' if math.isnan(fila[3]) else round(fila[3], 4)])
+            self.stdout.write(f"Detalle por producto: {opts['csv']}")
+        self.stdout.write(self.style.SUCCESS(f"{len(resultados)} evaluaciones guardadas"))
@@ -0,0 +1,26 @@
+import resource
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.reporting.rfm import calcular
+
+
+class Command(BaseCommand):
+    help = "Recalcula la segmentación RFM de clientes (SegmentoCliente)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha-corte', type=date.fromisoformat, help="YYYY-MM-DD (por defecto hoy)")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        m = calcular(opts['fecha_corte'], chunk_size=opts['chunk_size'], batch_size=opts['batch_size'])
+        pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"{m['clientes']} clientes segmentados en {m['total_s']:.2f}s "
+            f"(extracción {m['extraccion_s']:.2f}s, puntajes {m['puntajes_s']:.3f}s, "
+            f"RSS pico {pico_mb:.0f} MB); {m['eliminados']} segmentos obsoletos eliminados"
+        ))
+        for segmento, cantidad in sorted(m['segmentos'].items(), key=lambda x: -x[1]):
+            self.stdout.write(f"  {segmento:<20} {cantidad}")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0003_trabajoreporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporteCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('tamano_bytes', models.BigIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('ultimo_uso', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('reporte', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cache', to='reporting.reporte')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0004_reportecache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reporte',
+            name='formato',
+            field=models.CharField(choices=[('CSV', 'CSV'), ('JSON', 'JSON'), ('CSV_GZ', 'CSV (gzip)'), ('CSV_ZST', 'CSV (zstd)'), ('NDJSON', 'NDJSON'), ('NDJSON_GZ', 'NDJSON (gzip)'), ('NDJSON_ZST', 'NDJSON (zstd)'), ('PARQUET', 'Parquet'), ('FEATHER', 'Feather')], default='CSV', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='trabajoreporte',
+            name='formato',
+            field=models.CharField(choices=[('CSV', 'CSV'), ('JSON', 'JSON'), ('CSV_GZ', 'CSV (gzip)'), ('CSV_ZST', 'CSV (zstd)'), ('NDJSON', 'NDJSON'), ('NDJSON_GZ', 'NDJSON (gzip)'), ('NDJSON_ZST', 'NDJSON (zstd)'), ('PARQUET', 'Parquet'), ('FEATHER', 'Feather')], default='CSV', max_length=10),
+        ),
+    ]
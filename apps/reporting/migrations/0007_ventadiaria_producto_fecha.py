@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_remove_producto_imagen_url_producto_imagen'),
+        ('reporting', '0006_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ventadiaria',
+            index=models.Index(fields=['producto', 'fecha'], name='reporting_v_product_50437f_idx'),
+        ),
+    ]
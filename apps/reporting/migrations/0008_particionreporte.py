@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0007_ventadiaria_producto_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticionReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=120)),
+                ('fecha', models.DateField(db_index=True)),
+                ('filas', models.JSONField(default=list)),
+                ('generado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('clave', 'fecha'), name='uniq_particion_reporte')],
+            },
+        ),
+    ]
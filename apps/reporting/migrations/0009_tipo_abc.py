@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0008_particionreporte'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reporte',
+            name='tipo_reporte',
+            field=models.CharField(choices=[('ventas', 'Ventas'), ('clientes', 'Clientes'), ('productos', 'Productos'), ('ia', 'IA'), ('abc', 'ABC / Pareto')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='trabajoreporte',
+            name='tipo_reporte',
+            field=models.CharField(choices=[('ventas', 'Ventas'), ('clientes', 'Clientes'), ('productos', 'Productos'), ('ia', 'IA'), ('abc', 'ABC / Pareto')], max_length=30),
+        ),
+    ]
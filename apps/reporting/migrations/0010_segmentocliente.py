@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('reporting', '0009_tipo_abc'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recencia_dias', models.PositiveIntegerField()),
+                ('frecuencia', models.PositiveIntegerField()),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('r_score', models.PositiveSmallIntegerField()),
+                ('f_score', models.PositiveSmallIntegerField()),
+                ('m_score', models.PositiveSmallIntegerField()),
+                ('segmento', models.CharField(choices=[('campeones', 'Campeones'), ('leales', 'Leales'), ('potenciales', 'Potenciales'), ('necesitan_atencion', 'Necesitan atención'), ('en_riesgo', 'En riesgo'), ('hibernando', 'Hibernando'), ('perdidos', 'Perdidos')], db_index=True, max_length=20)),
+                ('calculado_en', models.DateTimeField()),
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='segmento_rfm', to='customers.cliente')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:49
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def eliminar_duplicados(apps, schema_editor):
+    # Se conserva la predicción más reciente de cada (modelo, producto, fecha, periodo)
+    PrediccionVenta = apps.get_model('reporting', 'PrediccionVenta')
+    grupos = (
+        PrediccionVenta.objects.values('modelo', 'producto', 'fecha_prediccion', 'periodo')
+        .annotate(ultimo=Max('id'), n=models.Count('id'))
+        .filter(n__gt=1)
+    )
+    for g in grupos.iterator():
+        PrediccionVenta.objects.filter(
+            modelo=g['modelo'], producto=g['producto'],
+            fecha_prediccion=g['fecha_prediccion'], periodo=g['periodo'],
+        ).exclude(id=g['ultimo']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_remove_producto_imagen_url_producto_imagen'),
+        ('reporting', '0010_segmentocliente'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='prediccionventa',
+            constraint=models.UniqueConstraint(fields=('modelo', 'producto', 'fecha_prediccion', 'periodo'), name='uniq_prediccion_venta'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0012_ejecucionprediccion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluacionModelo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('backtest', 'Backtesting (origen móvil)'), ('seguimiento', 'Predicciones vs. ventas reales')], max_length=15)),
+                ('mae', models.FloatField()),
+                ('mape', models.FloatField(blank=True, null=True)),
+                ('filas', models.PositiveIntegerField(default=0)),
+                ('productos', models.PositiveIntegerField(default=0)),
+                ('meses', models.PositiveIntegerField(default=0)),
+                ('segundos_entrenamiento', models.FloatField(blank=True, null=True)),
+                ('segundos_inferencia', models.FloatField(blank=True, null=True)),
+                ('filas_inferencia', models.PositiveIntegerField(default=0)),
+                ('por_categoria', models.JSONField(blank=True, default=list)),
+                ('peores_productos', models.JSONField(blank=True, default=list)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('evaluado_en', models.DateTimeField(auto_now_add=True)),
+                ('modelo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evaluaciones', to='reporting.modeloentrenado')),
+            ],
+            options={
+                'ordering': ['-evaluado_en'],
+                'indexes': [models.Index(fields=['modelo', 'tipo', 'evaluado_en'], name='reporting_e_modelo__cec417_idx')],
+            },
+        ),
+    ]
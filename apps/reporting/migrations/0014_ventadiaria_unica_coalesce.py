@@ -0,0 +1,93 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:22
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def filas_agregadas(DetalleVenta):
+    """
+    Copia congelada de rollup.filas_agregadas() sobre el modelo histórico:
+    un día/producto/categoría/método por fila, con pedidos atribuidos a la
+    primera línea de cada venta y de cada categoría dentro de la venta.
+    """
+    lineas_venta = DetalleVenta.objects.filter(venta=OuterRef('venta')).order_by('id').values('id')
+    primera_de_categoria = Case(
+        When(
+            producto__categoria__isnull=True,
+            then=Subquery(lineas_venta.filter(producto__categoria__isnull=True)[:1]),
+        ),
+        default=Subquery(lineas_venta.filter(producto__categoria=OuterRef('producto__categoria'))[:1]),
+    )
+    uno = Value(1, output_field=IntegerField())
+    return (
+        DetalleVenta.objects.exclude(venta__estado_venta='cancelada')
+        .annotate(primera=Subquery(lineas_venta[:1]), primera_cat=primera_de_categoria)
+        .values(
+            dia=TruncDate('venta__fecha_venta'),
+            prod=F('producto_id'),
+            cat=F('producto__categoria_id'),
+            metodo=F('venta__metodo_pago'),
+        )
+        .annotate(
+            unidades=Sum('cantidad'),
+            ingresos=Sum('total'),
+            pedidos=Sum(Case(When(id=F('primera'), then=uno), default=0)),
+            pedidos_categoria=Sum(Case(When(id=F('primera_cat'), then=uno), default=0)),
+        )
+        .order_by()
+    )
+
+
+def llenar_resumen(apps, schema_editor):
+    """
+    Llena VentaDiaria desde DetalleVenta si está vacía (recién creada por
+    0006 y nunca reconstruida), o la rehace si tiene filas duplicadas sin
+    categoría (la restricción anterior no se creaba en SQLite ni en
+    PostgreSQL < 15). Las particiones guardadas se descartan en ese caso.
+    """
+    VentaDiaria = apps.get_model('reporting', 'VentaDiaria')
+    DetalleVenta = apps.get_model('sales', 'DetalleVenta')
+    ParticionReporte = apps.get_model('reporting', 'ParticionReporte')
+
+    duplicadas = (
+        VentaDiaria.objects.values('fecha', 'producto', 'metodo_pago', cat=Coalesce('categoria', 0))
+        .annotate(n=Count('id')).filter(n__gt=1).order_by()
+    )
+    if VentaDiaria.objects.exists() and not duplicadas.exists():
+        return
+    VentaDiaria.objects.all().delete()
+    ParticionReporte.objects.all().delete()
+    lote = []
+    for r in filas_agregadas(DetalleVenta).iterator(chunk_size=5000):
+        lote.append(VentaDiaria(
+            fecha=r['dia'], producto_id=r['prod'], categoria_id=r['cat'], metodo_pago=r['metodo'],
+            unidades=r['unidades'], ingresos=r['ingresos'],
+            pedidos=r['pedidos'], pedidos_categoria=r['pedidos_categoria'],
+        ))
+        if len(lote) >= 5000:
+            VentaDiaria.objects.bulk_create(lote)
+            lote = []
+    VentaDiaria.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_productosimilar'),
+        ('reporting', '0013_evaluacionmodelo'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ventadiaria',
+            name='uniq_venta_diaria',
+        ),
+        migrations.RunPython(llenar_resumen, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ventadiaria',
+            constraint=models.UniqueConstraint(models.F('fecha'), models.F('producto'), django.db.models.functions.comparison.Coalesce('categoria', 0), models.F('metodo_pago'), name='uniq_venta_diaria_categoria'),
+        ),
+    ]
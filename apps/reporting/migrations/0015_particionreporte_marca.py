@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0014_ventadiaria_unica_coalesce'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='particionreporte',
+            name='marca',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='particionreporte',
+            name='usado_en',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
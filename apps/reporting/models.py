@@ -1,6 +1,9 @@
 from django.db import models
+from django.utils import timezone
+from django.db.models.functions import Coalesce
 from django.conf import settings 
-from apps.catalog.models import Producto 
+from apps.catalog.models import Categoria, Producto
+from apps.customers.models import Cliente
 
 
 class Reporte(models.Model):
@@ -9,10 +12,18 @@ class Reporte(models.Model):
         ("clientes", "Clientes"),
         ("productos", "Productos"),
         ("ia", "IA"),
+        ("abc", "ABC / Pareto"),
     )
     FORMATOS = (
         ("CSV", "CSV"),
         ("JSON", "JSON"),
+        ("CSV_GZ", "CSV (gzip)"),
+        ("CSV_ZST", "CSV (zstd)"),
+        ("NDJSON", "NDJSON"),
+        ("NDJSON_GZ", "NDJSON (gzip)"),
+        ("NDJSON_ZST", "NDJSON (zstd)"),
+        ("PARQUET", "Parquet"),
+        ("FEATHER", "Feather"),
         # ('PDF','PDF'),  # si luego implementas PDF
         # ('XLSX','Excel'),  # si luego agregas openpyxl
     )
@@ -28,6 +39,24 @@ class Reporte(models.Model):
         return f"{self.tipo_reporte} ({self.formato}) - {self.fecha_generacion:%Y-%m-%d %H:%M}"
 
 
+class ReporteCache(models.Model):
+    """
+    Entrada de caché direccionada por contenido: `clave` es el hash de
+    (tipo, formato, parámetros normalizados, marca de agua de los datos).
+    Ver apps/reporting/cache.py.
+    """
+
+    clave = models.CharField(max_length=64, unique=True)
+    reporte = models.OneToOneField(Reporte, on_delete=models.CASCADE, related_name="cache")
+    tamano_bytes = models.BigIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Cache {self.clave[:12]} → reporte {self.reporte_id}"
+
+
 class ConsultaReporte(models.Model):
     reporte = models.ForeignKey(
         Reporte,
@@ -44,6 +73,154 @@ class ConsultaReporte(models.Model):
         return f"Consulta {self.id} → {self.reporte_id or 'pendiente'}"
 
 
+class TrabajoReporte(models.Model):
+    """
+    Solicitud de reporte ejecutada en segundo plano por el pool de workers
+    (ver apps/reporting/jobs.py). El cliente consulta su estado hasta que
+    `reporte` queda asignado.
+    """
+
+    ESTADOS = (
+        ("pendiente", "Pendiente"),
+        ("en_proceso", "En proceso"),
+        ("completado", "Completado"),
+        ("fallido", "Fallido"),
+    )
+    tipo_reporte = models.CharField(max_length=30, choices=Reporte.TIPOS)
+    formato = models.CharField(max_length=10, choices=Reporte.FORMATOS, default="CSV")
+    parametros = models.JSONField(null=True, blank=True)
+    prompt_texto = models.TextField(blank=True)
+    estado = models.CharField(max_length=15, choices=ESTADOS, default="pendiente")
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="trabajos_reporte",
+    )
+    reporte = models.ForeignKey(
+        Reporte, null=True, blank=True, on_delete=models.SET_NULL, related_name="trabajos"
+    )
+    error = models.TextField(blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+    duracion_segundos = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        indexes = [models.Index(fields=["estado", "creado_en"])]
+
+    def __str__(self):
+        return f"Trabajo {self.id} {self.tipo_reporte} ({self.estado})"
+
+
+class VentaDiaria(models.Model):
+    """
+    Resumen diario de ventas (no canceladas) por producto, categoría y método
+    de pago. Se mantiene en la misma transacción que crea o cancela la venta
+    (ver apps/reporting/rollup.py) y se reconstruye con
+    `manage.py rebuild_ventas_diarias`.
+
+    Cada venta suma 1 a `pedidos` en una sola fila (la de su primera línea) y
+    1 a `pedidos_categoria` en una fila por categoría, así SUM() da el número
+    exacto de pedidos tanto por día/método de pago como por categoría.
+
+    La unicidad usa COALESCE(categoria_id, 0): un índice único funcional que
+    existe en SQLite y en cualquier PostgreSQL, y trata igual las filas sin
+    categoría (nulls_distinct=False sólo existe desde PostgreSQL 15).
+    """
+
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="ventas_diarias")
+    # Copia de la categoría al momento de la venta (sin FK real: no se pierde al borrar la categoría)
+    categoria = models.ForeignKey(
+        Categoria,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    metodo_pago = models.CharField(max_length=30)
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pedidos = models.IntegerField(default=0)
+    pedidos_categoria = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                "fecha",
+                "producto",
+                Coalesce("categoria", 0),
+                "metodo_pago",
+                name="uniq_venta_diaria_categoria",
+            )
+        ]
+        indexes = [models.Index(fields=["producto", "fecha"])]
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id} ({self.metodo_pago}): {self.ingresos}"
+
+
+class ParticionReporte(models.Model):
+    """
+    Agregado parcial de un día cerrado para un reporte (ver
+    apps/reporting/particiones.py). `clave` identifica el reporte y sus
+    dimensiones; `filas` guarda los totales del día ya agrupados.
+    Se borra cuando cambia una venta de ese día (rollup/señales) y además
+    sólo se reutiliza si `marca` coincide con la marca de agua actual de
+    las ventas del día. `usado_en` permite descartar las que nadie consulta.
+    """
+
+    clave = models.CharField(max_length=120)
+    fecha = models.DateField(db_index=True)
+    filas = models.JSONField(default=list)
+    marca = models.CharField(max_length=100, blank=True)
+    generado_en = models.DateTimeField(auto_now_add=True)
+    usado_en = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["clave", "fecha"], name="uniq_particion_reporte")
+        ]
+
+    def __str__(self):
+        return f"{self.clave} {self.fecha}"
+
+
+class SegmentoCliente(models.Model):
+    """
+    Segmentación RFM (recencia, frecuencia, monto) de un cliente, calculada
+    por apps/reporting/rfm.py. Los puntajes van de 1 (peor) a 5 (mejor)
+    según el quintil del cliente en cada métrica.
+    """
+
+    SEGMENTOS = (
+        ("campeones", "Campeones"),
+        ("leales", "Leales"),
+        ("potenciales", "Potenciales"),
+        ("necesitan_atencion", "Necesitan atención"),
+        ("en_riesgo", "En riesgo"),
+        ("hibernando", "Hibernando"),
+        ("perdidos", "Perdidos"),
+    )
+
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, related_name="segmento_rfm")
+    recencia_dias = models.PositiveIntegerField()
+    frecuencia = models.PositiveIntegerField()
+    monto = models.DecimalField(max_digits=14, decimal_places=2)
+    r_score = models.PositiveSmallIntegerField()
+    f_score = models.PositiveSmallIntegerField()
+    m_score = models.PositiveSmallIntegerField()
+    segmento = models.CharField(max_length=20, choices=SEGMENTOS, db_index=True)
+    calculado_en = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.cliente_id} {self.segmento} ({self.r_score}{self.f_score}{self.m_score})"
+
+
 class ModeloEntrenado(models.Model):
     """
     Almacena metadatos sobre un modelo de ML (Random Forest)
@@ -80,6 +257,88 @@ class PrediccionVenta(models.Model):
 
     class Meta:
         ordering = ["-fecha_prediccion"]
+        constraints = [
+            # Clave del upsert de apps/reporting/predicciones.py
+            models.UniqueConstraint(
+                fields=["modelo", "producto", "fecha_prediccion", "periodo"],
+                name="uniq_prediccion_venta",
+            )
+        ]
 
     def __str__(self):
         return f"Predicción para {self.fecha_prediccion}: {self.ventas_estimadas}"
+
+
+class EjecucionPrediccion(models.Model):
+    """
+    Corrida de predicción en segundo plano (ver jobs.ejecutar_prediccion).
+    `productos_procesados` avanza por bloques para consultar el progreso.
+    """
+
+    modelo = models.ForeignKey(ModeloEntrenado, on_delete=models.CASCADE, related_name="ejecuciones")
+    estado = models.CharField(max_length=15, choices=TrabajoReporte.ESTADOS, default="pendiente")
+    parametros = models.JSONField(default=dict, blank=True)
+    productos_total = models.PositiveIntegerField(default=0)
+    productos_procesados = models.PositiveIntegerField(default=0)
+    filas = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ejecuciones_prediccion",
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+    duracion_segundos = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+        indexes = [models.Index(fields=["estado", "creado_en"])]
+
+    @property
+    def progreso(self):
+        if not self.productos_total:
+            return 0.0
+        return round(self.productos_procesados / self.productos_total, 4)
+
+    def __str__(self):
+        return f"Ejecución {self.id} modelo {self.modelo_id} ({self.estado})"
+
+
+class EvaluacionModelo(models.Model):
+    """
+    Precisión y tiempos de un ModeloEntrenado (ver apps/reporting/backtesting.py).
+    - backtest: se reentrena una copia del modelo con origen móvil sobre el historial.
+    - seguimiento: PrediccionVenta de meses ya cerrados contra las ventas reales.
+    MAPE en porcentaje, sólo sobre meses con ventas reales distintas de cero.
+    """
+
+    TIPOS = [
+        ("backtest", "Backtesting (origen móvil)"),
+        ("seguimiento", "Predicciones vs. ventas reales"),
+    ]
+
+    modelo = models.ForeignKey(ModeloEntrenado, on_delete=models.CASCADE, related_name="evaluaciones")
+    tipo = models.CharField(max_length=15, choices=TIPOS)
+    mae = models.FloatField()
+    mape = models.FloatField(null=True, blank=True)
+    filas = models.PositiveIntegerField(default=0)  # pares (producto, mes) evaluados
+    productos = models.PositiveIntegerField(default=0)
+    meses = models.PositiveIntegerField(default=0)
+    segundos_entrenamiento = models.FloatField(null=True, blank=True)
+    segundos_inferencia = models.FloatField(null=True, blank=True)
+    filas_inferencia = models.PositiveIntegerField(default=0)
+    por_categoria = models.JSONField(default=list, blank=True)
+    peores_productos = models.JSONField(default=list, blank=True)
+    parametros = models.JSONField(default=dict, blank=True)
+    evaluado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-evaluado_en"]
+        indexes = [models.Index(fields=["modelo", "tipo", "evaluado_en"])]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} modelo {self.modelo_id}: MAE {self.mae:.2f}"
@@ -0,0 +1,169 @@
+"""
+Generación incremental del reporte de ventas por particiones diarias.
+
+Los días cerrados (anteriores a hoy) se agregan una sola vez y se guardan en
+ParticionReporte. Una ejecución posterior sólo consulta los días que faltan
+y hoy, y combina el resultado con las particiones guardadas. Un reporte del
+año en curso cuesta así un día de trabajo más una consulta GROUP BY día
+sobre Venta para las marcas de agua.
+
+Una partición guardada deja de servir cuando:
+- se borra al cambiar una venta del día (rollup.aplicar_venta, señales de
+  Venta/DetalleVenta -> rollup.reconstruir), o
+- su `marca` ya no coincide con la marca de agua del día (cantidad, suma de
+  totales, ids mínimo/máximo y canceladas de Venta). Cubre escrituras que no
+  emiten señales, como QuerySet.update() o SQL directo.
+Las particiones sin uso en REPORTING_PARTICIONES_RETENCION días se borran
+(podar).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.sales.models import Venta
+from .models import ParticionReporte
+
+MARCA_SIN_VENTAS = "0"
+
+
+def clave_ventas(dims):
+    return "ventas:" + ",".join(sorted(dims))
+
+
+def invalidar(fecha_desde, fecha_hasta=None):
+    """Borra las particiones de un día (o de un rango) para que se recalculen."""
+    qs = ParticionReporte.objects.all()
+    if fecha_hasta is None:
+        return qs.filter(fecha=fecha_desde).delete()
+    if fecha_desde:
+        qs = qs.filter(fecha__gte=fecha_desde)
+    return qs.filter(fecha__lte=fecha_hasta).delete()
+
+
+def marcas_por_dia(desde, hasta):
+    """{fecha: marca} de los días con ventas en [desde, hasta], en una sola consulta agrupada."""
+    filas = (
+        Venta.objects.filter(fecha_venta__date__gte=desde, fecha_venta__date__lte=hasta)
+        .values(dia=TruncDate("fecha_venta"))
+        .annotate(
+            n=Count("id"),
+            suma=Sum("total"),
+            min_id=Min("id"),
+            max_id=Max("id"),
+            canceladas=Count("id", filter=Q(estado_venta="cancelada")),
+        )
+        .order_by()
+    )
+    return {
+        r["dia"]: f"{r['n']}:{r['suma']}:{r['min_id']}:{r['max_id']}:{r['canceladas']}"
+        for r in filas
+    }
+
+
+def podar():
+    """Borra las particiones que nadie usó en REPORTING_PARTICIONES_RETENCION días."""
+    limite = timezone.now() - timedelta(days=settings.REPORTING_PARTICIONES_RETENCION)
+    return ParticionReporte.objects.filter(usado_en__lt=limite).delete()[0]
+
+
+def _periodo(fecha, granularidad):
+    # Mismo criterio que TruncWeek (lunes ISO) y TruncMonth
+    if granularidad == "semana":
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == "mes":
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _rangos_contiguos(fechas):
+    rangos = []
+    for f in sorted(fechas):
+        if rangos and f == rangos[-1][1] + timedelta(days=1):
+            rangos[-1][1] = f
+        else:
+            rangos.append([f, f])
+    return rangos
+
+
+def ventas_particionadas(consulta_diaria, desde, hasta, granularidad, dims):
+    """
+    consulta_diaria(desde, hasta, dims) debe devolver registros por día con
+    las claves 'periodo', 'dim_<dimension>', 'monto' y 'cantidad_ventas'.
+    Devuelve registros con la misma forma, agregados a `granularidad`.
+    """
+    clave = clave_ventas(dims)
+    cerrado_hasta = min(hasta, timezone.localdate() - timedelta(days=1))
+
+    guardadas, marcas = {}, {}
+    if desde <= cerrado_hasta:
+        # Las marcas se leen antes que los datos: si entra una venta en el
+        # medio, la partición queda con la marca vieja y se rehace la próxima vez
+        marcas = marcas_por_dia(desde, cerrado_hasta)
+        existentes = ParticionReporte.objects.filter(clave=clave, fecha__gte=desde, fecha__lte=cerrado_hasta)
+        guardadas = {
+            fecha: filas
+            for fecha, filas, marca in existentes.values_list("fecha", "filas", "marca")
+            if marca == marcas.get(fecha, MARCA_SIN_VENTAS)
+        }
+        inicio_hoy = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        existentes.filter(fecha__in=list(guardadas), usado_en__lt=inicio_hoy).update(usado_en=timezone.now())
+
+    faltantes = [
+        desde + timedelta(days=i)
+        for i in range((hasta - desde).days + 1)
+        if desde + timedelta(days=i) not in guardadas
+    ]
+    nuevas = defaultdict(list)
+    for inicio, fin in _rangos_contiguos(faltantes):
+        for r in consulta_diaria(inicio, fin, dims):
+            fecha = r["periodo"].date() if isinstance(r["periodo"], datetime) else r["periodo"]
+            nuevas[fecha].append({
+                "d": {dim: r[f"dim_{dim}"] for dim in dims},
+                "m": str(r["monto"] or 0),
+                "n": r["cantidad_ventas"],
+            })
+
+    # Guardamos también los días cerrados sin ventas, para no volver a consultarlos;
+    # las particiones con marca vieja se sobrescriben
+    cerradas = [
+        ParticionReporte(
+            clave=clave, fecha=f, filas=nuevas.get(f, []), marca=marcas.get(f, MARCA_SIN_VENTAS),
+            generado_en=timezone.now(), usado_en=timezone.now(),
+        )
+        for f in faltantes
+        if f <= cerrado_hasta
+    ]
+    if cerradas:
+        ParticionReporte.objects.bulk_create(
+            cerradas,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=["clave", "fecha"],
+            update_fields=["filas", "marca", "generado_en", "usado_en"],
+        )
+        podar()
+
+    acumulado = {}
+    for fecha, filas in chain(guardadas.items(), nuevas.items()):
+        periodo = _periodo(fecha, granularidad)
+        for fila in filas:
+            k = (periodo,) + tuple(fila["d"].get(dim) for dim in dims)
+            monto, cantidad = acumulado.get(k, (Decimal("0"), 0))
+            acumulado[k] = (monto + Decimal(fila["m"]), cantidad + fila["n"])
+
+    def orden(item):
+        k = item[0]
+        return (k[0],) + tuple((v is None, str(v)) for v in k[1:])
+
+    registros = []
+    for k, (monto, cantidad) in sorted(acumulado.items(), key=orden):
+        r = {"periodo": k[0], "monto": monto, "cantidad_ventas": cantidad}
+        r.update({f"dim_{dim}": v for dim, v in zip(dims, k[1:])})
+        registros.append(r)
+    return registros
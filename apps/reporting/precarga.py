@@ -0,0 +1,86 @@
+"""
+Precarga de modelos al arrancar (PRECARGAR_MODELOS).
+
+Las librerías pesadas (pandas, sklearn, joblib) se importan recién cuando
+se usan, así los comandos de manage.py no las pagan. En los procesos que
+atienden peticiones, el primer usuario sí las pagaría: con la precarga
+activa, cada app registra en su AppConfig.ready() una función que se
+ejecuta en un hilo aparte, sin demorar el arranque.
+
+Con gunicorn --preload las apps se cargan en el master antes del fork;
+os.register_at_fork vuelve a lanzar la precarga en cada worker, porque los
+hilos del master no sobreviven al fork.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_funciones = []
+_pid_iniciado = None
+_fork_registrado = False
+
+
+def _proceso_servidor():
+    """False en comandos de manage.py (migrate, shell, train_model...) salvo runserver."""
+    if os.path.basename(sys.argv[0]) != "manage.py":
+        return True  # gunicorn, uvicorn, daphne, mod_wsgi...
+    if sys.argv[1:2] != ["runserver"]:
+        return False
+    # El autoreloader arranca un proceso vigilante que no atiende peticiones
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
+def _ejecutar():
+    from django.apps import apps
+
+    # registrar() corre dentro de ready(): esperar a que terminen todas las
+    # apps, así se ven sus funciones y no se consulta la BD a medio arrancar
+    while not apps.ready:
+        time.sleep(0.05)
+    for funcion in _funciones:
+        inicio = time.perf_counter()
+        try:
+            funcion()
+            logger.info("Precarga %s.%s en %.2fs", funcion.__module__, funcion.__name__,
+                        time.perf_counter() - inicio)
+        except Exception:
+            logger.exception("Falló la precarga %s.%s", funcion.__module__, funcion.__name__)
+    connection.close()
+
+
+def iniciar():
+    """Lanza la precarga una sola vez por proceso."""
+    global _pid_iniciado
+    if _pid_iniciado == os.getpid() or not _funciones:
+        return
+    _pid_iniciado = os.getpid()
+    threading.Thread(target=_ejecutar, name="precarga-modelos", daemon=True).start()
+
+
+def registrar(funcion):
+    """Llamar desde AppConfig.ready(); no hace nada si PRECARGAR_MODELOS está apagado."""
+    global _fork_registrado
+    if not settings.PRECARGAR_MODELOS or not _proceso_servidor():
+        return
+    _funciones.append(funcion)
+    if not _fork_registrado and hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=iniciar)
+        _fork_registrado = True
+    iniciar()
+
+
+def precargar_prediccion():
+    """Deja en el registro el último modelo de ventas entrenado."""
+    from .models import ModeloEntrenado
+    from . import registro_modelos
+
+    modelo = ModeloEntrenado.objects.order_by("-fecha_entrenamiento").first()
+    if modelo is not None:
+        registro_modelos.obtener(modelo)
@@ -0,0 +1,212 @@
+"""
+Persistencia de resultados de predicción.
+
+guardar() escribe todas las filas con bulk.upsert: un
+INSERT ... ON CONFLICT (modelo, producto, fecha_prediccion, periodo)
+DO UPDATE por lote, en lugar de borrar e insertar fila por fila. Volver a
+ejecutar la misma predicción actualiza los valores existentes.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .bulk import BATCH_SIZE, upsert
+from .models import PrediccionVenta
+
+COLUMNAS = ("modelo_id", "producto_id", "fecha_prediccion", "periodo", "ventas_estimadas", "generado_en")
+CLAVE = ("modelo_id", "producto_id", "fecha_prediccion", "periodo")
+
+
+def a_decimal(valor):
+    """Estimación del modelo -> Decimal(12, 2), sin negativos."""
+    return Decimal(str(round(max(float(valor), 0.0), 2)))
+
+
+@transaction.atomic
+def guardar(modelo, filas, periodo="Mensual", batch_size=BATCH_SIZE):
+    """
+    `filas`: iterable de (producto_id, fecha_prediccion, valor).
+    Devuelve la cantidad de filas escritas.
+    """
+    ops = connection.ops
+    ahora = ops.adapt_datetimefield_value(timezone.now())
+    return upsert(
+        PrediccionVenta,
+        COLUMNAS,
+        CLAVE,
+        (
+            (modelo.pk, producto_id, ops.adapt_datefield_value(fecha), periodo, a_decimal(valor), ahora)
+            for producto_id, fecha, valor in filas
+        ),
+        batch_size=batch_size,
+    )
+
+
+def parametros_prediccion(data, hoy=None):
+    """
+    Normaliza el body de ejecutar-prediccion. Lanza ValueError si es inválido.
+    """
+    hoy = hoy or timezone.localdate()
+    try:
+        anio = int(data.get("anio", hoy.year))
+        mes = int(data.get("mes", hoy.month))
+        horizonte = int(data.get("horizonte", 1))
+    except (TypeError, ValueError):
+        raise ValueError("anio, mes y horizonte deben ser enteros")
+    if not 1 <= mes <= 12 or not 1 <= horizonte <= 36:
+        raise ValueError("mes debe estar entre 1 y 12 y horizonte entre 1 y 36")
+    return {
+        "anio": anio,
+        "mes": mes,
+        "horizonte": horizonte,
+        "productos": _ids(data.get("productos")),
+        "categoria": _id(data.get("categoria"), "categoria"),
+    }
+
+
+def _id(valor, campo):
+    """Entero positivo o None (vacío). bool se rechaza aunque sea subclase de int."""
+    if valor in (None, ""):
+        return None
+    if isinstance(valor, bool):
+        raise ValueError(f"{campo} debe ser un entero")
+    try:
+        entero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser un entero")
+    if isinstance(valor, float) and valor != entero or entero < 1:
+        raise ValueError(f"{campo} debe ser un entero positivo")
+    return entero
+
+
+def _ids(valor):
+    """Lista de ids de producto (sin repetidos) o None si no se filtra."""
+    if valor in (None, "", []):
+        return None
+    if not isinstance(valor, (list, tuple)):
+        raise ValueError("productos debe ser una lista de enteros")
+    return list(dict.fromkeys(_id(v, "productos") for v in valor)) or None
+
+
+def productos_a_predecir(parametros):
+    """Ids (values_list) de productos activos, filtrados por `productos` y `categoria`."""
+    from apps.catalog.models import Producto
+
+    qs = Producto.objects.filter(estado="activo")
+    if parametros.get("productos"):
+        qs = qs.filter(id__in=parametros["productos"])
+    if parametros.get("categoria"):
+        qs = qs.filter(categoria_id=parametros["categoria"])
+    return qs.order_by("id").values_list("id", flat=True)
+
+
+def matriz_features(producto_ids, anio, mes, horizonte):
+    """
+    Producto cartesiano (mes, producto) para `horizonte` meses desde
+    anio/mes, como DataFrame con las columnas del entrenamiento.
+    Devuelve (X, fechas) con una fecha (día 1 del mes) por fila.
+    """
+    import pandas as pd
+    from .entrenamiento import FEATURES
+
+    productos = np.asarray(producto_ids, dtype=np.int64)
+    indice = anio * 12 + (mes - 1) + np.arange(horizonte)
+    anios, meses = indice // 12, indice % 12 + 1
+    X = pd.DataFrame(
+        {
+            "anio": np.repeat(anios, len(productos)),
+            "mes": np.repeat(meses, len(productos)),
+            "producto_id": np.tile(productos, horizonte),
+        },
+        columns=FEATURES,
+    )
+    fechas = [date(int(a), int(m), 1) for a, m in zip(anios, meses)]
+    return X, np.repeat(np.array(fechas, dtype=object), len(productos))
+
+
+def pronosticar(modelo, estimador, producto_ids, anio, mes, horizonte=1, bloque=None, progreso=None):
+    """
+    Pronóstico de `horizonte` meses para todos los productos con un solo
+    predict() y un upsert por lotes. Con `bloque` se procesa de a N
+    productos y se llama a progreso(procesados, filas) después de cada uno.
+    Devuelve métricas de la ejecución.
+    """
+    inicio = time.perf_counter()
+    bloque = bloque or max(len(producto_ids), 1)
+    filas = 0
+    t_prediccion = 0.0
+    meses = []
+    for desde in range(0, len(producto_ids), bloque):
+        parte = producto_ids[desde:desde + bloque]
+        t0 = time.perf_counter()
+        X, fechas = matriz_features(parte, anio, mes, horizonte)
+        valores = estimador.predict(X)
+        t_prediccion += time.perf_counter() - t0
+        filas += guardar(modelo, zip(X["producto_id"].tolist(), fechas, valores.tolist()))
+        meses = fechas[:: len(parte)]
+        if progreso:
+            progreso(desde + len(parte), filas)
+    return {
+        "modelo": modelo.pk,
+        "productos": len(producto_ids),
+        "meses": [f.isoformat() for f in meses],
+        "filas": filas,
+        "segundos_prediccion": round(t_prediccion, 3),
+        "segundos_total": round(time.perf_counter() - inicio, 3),
+    }
+
+
+def version_predicciones(modelo_id):
+    """
+    Sello barato de las predicciones de un modelo (usa el índice único que
+    empieza por modelo_id): cambia con cada upsert porque generado_en se
+    actualiza, y con cada borrado porque cambia la cantidad.
+    """
+    from django.db.models import Count, Max
+
+    v = PrediccionVenta.objects.filter(modelo_id=modelo_id).aggregate(n=Count("id"), ultimo=Max("generado_en"))
+    return f"{modelo_id}:{v['n']}:{v['ultimo'].timestamp() if v['ultimo'] else 0}"
+
+
+def matriz(modelo_id, desde=None, hasta=None, categoria=None, periodo="Mensual"):
+    """
+    Predicciones de un modelo como matriz producto x mes, con una sola
+    consulta agregada: {'meses', 'productos', 'nombres', 'valores'}, donde
+    valores[i][j] es la estimación del producto i en el mes j (None si falta).
+    """
+    from django.db.models import Sum
+
+    qs = PrediccionVenta.objects.filter(modelo_id=modelo_id, periodo=periodo, producto__isnull=False)
+    if desde:
+        qs = qs.filter(fecha_prediccion__gte=desde)
+    if hasta:
+        qs = qs.filter(fecha_prediccion__lte=hasta)
+    if categoria:
+        qs = qs.filter(producto__categoria_id=categoria)
+    filas = list(
+        qs.values("producto_id", "producto__nombre", "fecha_prediccion")
+        .annotate(valor=Sum("ventas_estimadas"))
+        .order_by("producto_id", "fecha_prediccion")
+        .values_list("producto_id", "producto__nombre", "fecha_prediccion", "valor")
+    )
+    if not filas:
+        return {"modelo": modelo_id, "meses": [], "productos": [], "nombres": [], "valores": []}
+
+    producto_col, nombre_col, fecha_col, valor_col = zip(*filas)
+    productos, fila_idx = np.unique(np.array(producto_col, dtype=np.int64), return_inverse=True)
+    meses, col_idx = np.unique(np.array(fecha_col, dtype="datetime64[D]"), return_inverse=True)
+    valores = np.full((len(productos), len(meses)), np.nan)
+    valores[fila_idx, col_idx] = np.array(valor_col, dtype=np.float64)
+    # Primer nombre de cada producto (las filas vienen ordenadas por producto)
+    nombres = np.array(nombre_col, dtype=object)[np.searchsorted(np.array(producto_col), productos)]
+    return {
+        "modelo": modelo_id,
+        "meses": [str(m) for m in meses],
+        "productos": productos.tolist(),
+        "nombres": nombres.tolist(),
+        "valores": [[None if np.isnan(v) else round(v, 2) for v in fila] for fila in valores.tolist()],
+    }
@@ -0,0 +1,126 @@
+"""
+Registro en memoria de los modelos entrenados (ModeloEntrenado).
+
+Cada proceso guarda los estimadores ya deserializados en una caché LRU con
+clave (ModeloEntrenado.id, mtime del archivo): si el .joblib se reemplaza,
+la clave cambia y se vuelve a cargar. Se desaloja por cantidad
+(REPORTING_MODELOS_MAX) y por tamaño en disco (REPORTING_MODELOS_MAX_BYTES).
+
+Con REPORTING_MODELOS_MMAP los arreglos NumPy del modelo se abren con
+joblib.load(mmap_mode='r'): los workers de gunicorn comparten las mismas
+páginas del page cache en lugar de tener una copia cada uno. Sólo aplica a
+archivos guardados sin compresión (joblib.dump(..., compress=0)).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cargas = {}  # id -> Lock, para no deserializar el mismo modelo dos veces a la vez
+_cache = OrderedDict()  # (id, mtime_ns) -> (estimador, bytes)
+_metricas = {"hits": 0, "misses": 0, "desalojos": 0, "segundos_carga": 0.0, "ultima_carga_s": None}
+
+
+def _despues_de_fork():
+    # Un lock tomado por otro hilo del master quedaría tomado para siempre en el hijo
+    global _lock
+    _lock = threading.Lock()
+    _cargas.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_despues_de_fork)
+
+
+def ruta_modelo(modelo_entrenado):
+    ruta = Path(modelo_entrenado.ruta_archivo)
+    if not ruta.is_absolute():
+        ruta = Path(settings.BASE_DIR) / ruta
+    return ruta
+
+
+def _desalojar():
+    total = sum(tamano for _, tamano in _cache.values())
+    while _cache and (
+        len(_cache) > settings.REPORTING_MODELOS_MAX
+        or total > settings.REPORTING_MODELOS_MAX_BYTES
+    ):
+        if len(_cache) == 1:
+            break  # el modelo recién cargado se queda aunque exceda el presupuesto
+        clave, (_, tamano) = _cache.popitem(last=False)
+        total -= tamano
+        _metricas["desalojos"] += 1
+        logger.info("Modelo %s desalojado del registro", clave[0])
+
+
+def obtener(modelo_entrenado):
+    """
+    Estimador del ModeloEntrenado, desde la caché o cargado del disco.
+    Lanza FileNotFoundError si el archivo no existe.
+    """
+    ruta = ruta_modelo(modelo_entrenado)
+    st = os.stat(ruta)
+    clave = (modelo_entrenado.pk, st.st_mtime_ns)
+
+    with _lock:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            _metricas["hits"] += 1
+            return _cache[clave][0]
+        carga = _cargas.setdefault(modelo_entrenado.pk, threading.Lock())
+
+    with carga:
+        with _lock:
+            # Otro hilo pudo cargarlo mientras esperábamos
+            if clave in _cache:
+                _cache.move_to_end(clave)
+                _metricas["hits"] += 1
+                return _cache[clave][0]
+
+        import joblib
+
+        inicio = time.perf_counter()
+        estimador = joblib.load(ruta, mmap_mode="r" if settings.REPORTING_MODELOS_MMAP else None)
+        duracion = time.perf_counter() - inicio
+
+        with _lock:
+            # Versiones anteriores del mismo modelo ya no sirven
+            for vieja in [k for k in _cache if k[0] == modelo_entrenado.pk]:
+                del _cache[vieja]
+            _cache[clave] = (estimador, st.st_size)
+            _metricas["misses"] += 1
+            _metricas["segundos_carga"] += duracion
+            _metricas["ultima_carga_s"] = round(duracion, 4)
+            _desalojar()
+    logger.info("Modelo %s cargado en %.3fs", modelo_entrenado.pk, duracion)
+    return estimador
+
+
+def invalidar(modelo_id=None):
+    """Quita un modelo (o todos) del registro de este proceso."""
+    with _lock:
+        for clave in [k for k in _cache if modelo_id is None or k[0] == modelo_id]:
+            del _cache[clave]
+
+
+def estadisticas():
+    with _lock:
+        consultas = _metricas["hits"] + _metricas["misses"]
+        return {
+            **_metricas,
+            "segundos_carga": round(_metricas["segundos_carga"], 4),
+            "hit_ratio": round(_metricas["hits"] / consultas, 4) if consultas else None,
+            "cargados": [
+                {"modelo": k[0], "bytes": tamano} for k, (_, tamano) in _cache.items()
+            ],
+            "bytes": sum(tamano for _, tamano in _cache.values()),
+            "mmap": settings.REPORTING_MODELOS_MMAP,
+            "pid": os.getpid(),
+        }
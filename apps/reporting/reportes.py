@@ -0,0 +1,595 @@
+"""
+Registro de tipos de reporte.
+
+Cada builder declara sus parámetros, arma una consulta agregada en la base
+de datos (nada de bucles por fila con consultas) y expone un generador de
+filas que export_rows escribe en streaming. Para agregar un tipo nuevo basta
+con una subclase decorada con @registrar y su entrada en Reporte.TIPOS.
+"""
+import hashlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Count, DecimalField, F, IntegerField, Max, OuterRef, Q, Subquery, Sum,
+)
+from django.db.models.functions import Coalesce, ExtractMonth
+from django.utils import timezone
+
+from apps.catalog.models import Categoria, Producto
+from apps.customers.models import Cliente
+from apps.sales.models import DetalleVenta, Venta
+from .exporters import CHUNK_SIZE
+from .models import ModeloEntrenado, PrediccionVenta, VentaDiaria
+from .services import (
+    normalizar_agrupacion, detalle_ventas_rows, parse_fechas, ventas_agregadas,
+)
+
+REGISTRO = {}
+
+
+def registrar(cls):
+    REGISTRO[cls.tipo] = cls()
+    return cls
+
+
+def get_builder(tipo):
+    try:
+        return REGISTRO[tipo]
+    except KeyError:
+        raise ValueError("Tipo de reporte no soportado")
+
+
+def _entero(params, nombre, defecto):
+    try:
+        return int(params.get(nombre) or defecto)
+    except (TypeError, ValueError):
+        raise ValueError(f"Parámetro '{nombre}' inválido")
+
+
+def _rango(params):
+    return f"{params.get('date_from') or ''} - {params.get('date_to') or ''}".strip()
+
+
+def _rango_ventas(prefijo, date_from, date_to):
+    """
+    Filtro por fecha de venta con límites datetime en lugar de __date (como
+    rfm.extraer): compara la columna directamente, sin convertir cada fila.
+    """
+    filtro = Q()
+    if date_from:
+        filtro &= Q(**{f'{prefijo}fecha_venta__gte': _inicio_del_dia(date_from)})
+    if date_to:
+        filtro &= Q(**{f'{prefijo}fecha_venta__lt': _inicio_del_dia(date_to + timedelta(days=1))})
+    return filtro
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+
+def _huella(modelo, *campos):
+    """
+    Hash de `campos` en todas las filas de `modelo`, en orden de id. Recorre
+    la tabla completa: sólo para catálogo y clientes, nunca para ventas.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    filas = modelo.objects.order_by('pk').values_list('pk', *campos).iterator(chunk_size=CHUNK_SIZE)
+    for fila in filas:
+        h.update(repr(fila).encode())
+    return h.hexdigest()
+
+
+HUELLAS = {
+    'catalogo': (Producto, 'nombre', 'categoria_id', 'estado', 'stock', 'categoria__nombre'),
+    'clientes': (Cliente, 'ciudad', 'user__username', 'user__email'),
+}
+
+
+def _suma_por_producto(campo_resumen, campo_detalle, date_from, date_to):
+    """
+    Subconsulta correlacionada (por Producto) con lo vendido en el rango:
+    desde VentaDiaria si está habilitado, si no desde DetalleVenta.
+    """
+    if settings.REPORTING_USAR_RESUMEN:
+        qs = VentaDiaria.objects.filter(producto=OuterRef('pk'))
+        if date_from:
+            qs = qs.filter(fecha__gte=date_from)
+        if date_to:
+            qs = qs.filter(fecha__lte=date_to)
+        campo = campo_resumen
+    else:
+        qs = DetalleVenta.objects.filter(producto=OuterRef('pk')).exclude(
+            venta__estado_venta='cancelada'
+        )
+        if date_from:
+            qs = qs.filter(venta__fecha_venta__date__gte=date_from)
+        if date_to:
+            qs = qs.filter(venta__fecha_venta__date__lte=date_to)
+        campo = campo_detalle
+    return Subquery(
+        qs.order_by().values('producto').annotate(s=Sum(campo)).values('s')[:1]
+    )
+
+
+_DINERO = DecimalField(max_digits=14, decimal_places=2)
+_CENTAVO = Decimal('0.01')
+
+
+class ReportBuilder:
+    tipo = None
+    # nombre -> descripción (se expone en GET reportes/tipos)
+    parametros = {
+        'date_from': "YYYY-MM-DD (opcional)",
+        'date_to': "YYYY-MM-DD (opcional)",
+    }
+    # Parámetros usados por `manage.py bench_reportes`
+    parametros_benchmark = {}
+
+    def validar(self, params):
+        """Lanza ValueError antes de abrir el archivo si los parámetros son inválidos."""
+        parse_fechas(params)
+
+    def queryset(self, params):
+        raise NotImplementedError
+
+    def rows(self, params):
+        for r in self.queryset(params).iterator(chunk_size=CHUNK_SIZE):
+            yield r
+
+    def nombre_archivo(self, params):
+        return self.tipo
+
+    def descripcion(self, params):
+        return f"Reporte de {self.tipo} {_rango(params)}".strip()
+
+    # Columnas de catálogo/clientes que aparecen en el reporte (nombre, categoría, ciudad...)
+    huellas = ()
+
+    def marca_de_agua(self, params):
+        """
+        Resumen barato de los datos de origen, para la caché de reportes.
+        Ventas y detalles se resumen con agregados (por método de pago y
+        estado, para notar cuando una venta cambia de grupo; los detalles con
+        la suma de producto_id, para notar cuando una línea cambia de producto). Las columnas de
+        `huellas` se resumen con un hash, porque renombrar un producto o
+        cambiarle la categoría no altera ninguna cantidad.
+        """
+        date_from, date_to = parse_fechas(params)
+        ventas = Venta.objects.filter(_rango_ventas('', date_from, date_to))
+        detalles = DetalleVenta.objects.filter(_rango_ventas('venta__', date_from, date_to))
+        marca = {
+            # Suma de ids por estado: cambia si una venta pasa de un estado a otro
+            'ventas': sorted(
+                ventas.order_by().values_list('metodo_pago').annotate(
+                    Count('id'), Sum('total'), Max('id'), Max('fecha_venta'),
+                    **{estado: Sum('id', filter=Q(estado_venta=estado)) for estado, _ in Venta.ESTADOS},
+                ),
+                key=str,
+            ),
+            'detalles': detalles.aggregate(
+                filas=Count('id'),
+                max_id=Max('id'),
+                unidades=Sum('cantidad'),
+                suma=Sum('total'),
+                productos=Sum('producto_id'),
+            ),
+        }
+        for huella in self.huellas:
+            marca[huella] = _huella(*HUELLAS[huella])
+        return marca
+
+
+@registrar
+class VentasReporte(ReportBuilder):
+    tipo = 'ventas'
+    parametros = {
+        **ReportBuilder.parametros,
+        'granularidad': "dia | semana | mes",
+        'agrupar_por': "lista: metodo_pago, estado_venta, categoria, ciudad",
+        'detalle': "true: una fila por DetalleVenta",
+    }
+    parametros_benchmark = {'granularidad': 'dia', 'agrupar_por': ['categoria']}
+    huellas = ('catalogo',)
+
+    def validar(self, params):
+        super().validar(params)
+        normalizar_agrupacion(params.get('agrupar_por'))
+
+    def rows(self, params):
+        date_from, date_to = parse_fechas(params)
+        if params.get('detalle'):
+            return detalle_ventas_rows(date_from, date_to)
+        return ventas_agregadas(
+            date_from, date_to, params.get('granularidad', 'dia'), params.get('agrupar_por')
+        )
+
+    def nombre_archivo(self, params):
+        if params.get('detalle'):
+            return 'detalle_ventas'
+        return f"ventas_por_{params.get('granularidad', 'dia')}"
+
+    def marca_de_agua(self, params):
+        marca = super().marca_de_agua(params)
+        if 'ciudad' in normalizar_agrupacion(params.get('agrupar_por')):
+            marca['clientes'] = _huella(*HUELLAS['clientes'])
+        return marca
+
+    def descripcion(self, params):
+        if params.get('detalle'):
+            return f"Detalle de ventas {_rango(params)}".strip()
+        descripcion = f"Ventas por {params.get('granularidad', 'dia')} {_rango(params)}".strip()
+        agrupar_por = normalizar_agrupacion(params.get('agrupar_por'))
+        if agrupar_por:
+            descripcion += f" (agrupado por {', '.join(agrupar_por)})"
+        return descripcion
+
+
+@registrar
+class ClientesReporte(ReportBuilder):
+    """Mejores clientes por ingresos en el periodo (ventas no canceladas)."""
+
+    tipo = 'clientes'
+    parametros = {
+        **ReportBuilder.parametros,
+        'limite': "cantidad de clientes (por defecto 100)",
+        'ciudad': "filtrar por ciudad (opcional)",
+    }
+    parametros_benchmark = {'limite': 1000}
+    huellas = ('clientes',)
+
+    def validar(self, params):
+        super().validar(params)
+        _entero(params, 'limite', 100)
+
+    def queryset(self, params):
+        date_from, date_to = parse_fechas(params)
+        qs = Venta.objects.exclude(estado_venta='cancelada')
+        if date_from:
+            qs = qs.filter(fecha_venta__date__gte=date_from)
+        if date_to:
+            qs = qs.filter(fecha_venta__date__lte=date_to)
+        if params.get('ciudad'):
+            qs = qs.filter(cliente__ciudad__iexact=params['ciudad'])
+        return (
+            qs.values(
+                cliente_ref=F('cliente_id'),
+                username=F('cliente__user__username'),
+                email=F('cliente__user__email'),
+                ciudad=F('cliente__ciudad'),
+            )
+            .annotate(
+                ingresos=Sum('total'),
+                pedidos=Count('id'),
+                ultima_compra=Max('fecha_venta'),
+            )
+            .order_by('-ingresos', 'cliente_ref')[: _entero(params, 'limite', 100)]
+        )
+
+    def rows(self, params):
+        for posicion, r in enumerate(super().rows(params), start=1):
+            yield {
+                'posicion': posicion,
+                'cliente': r['cliente_ref'],
+                'username': r['username'],
+                'email': r['email'],
+                'ciudad': r['ciudad'],
+                'ingresos': r['ingresos'],
+                'pedidos': r['pedidos'],
+                'ticket_promedio': (r['ingresos'] / r['pedidos']).quantize(Decimal('0.01')),
+                'ultima_compra': timezone.localtime(r['ultima_compra']),
+            }
+
+    def descripcion(self, params):
+        return f"Top {_entero(params, 'limite', 100)} clientes por ingresos {_rango(params)}".strip()
+
+
+@registrar
+class ProductosReporte(ReportBuilder):
+    """
+    Sell-through y cobertura de stock por producto:
+    sell_through = vendidas / (vendidas + stock)
+    cobertura_dias = stock / (vendidas por día del periodo)
+    Sin rango se usan los últimos 30 días.
+    """
+
+    tipo = 'productos'
+    parametros = {
+        **ReportBuilder.parametros,
+        'categoria': "id de categoría (opcional)",
+        'estado': "estado del producto (por defecto todos)",
+    }
+    parametros_benchmark = {}
+    huellas = ('catalogo',)
+
+    def _periodo(self, params):
+        date_from, date_to = parse_fechas(params)
+        date_to = date_to or timezone.localdate()
+        date_from = date_from or date_to - timedelta(days=29)
+        return date_from, date_to
+
+    def queryset(self, params):
+        date_from, date_to = self._periodo(params)
+        qs = Producto.objects.all()
+        if params.get('categoria'):
+            qs = qs.filter(categoria_id=params['categoria'])
+        if params.get('estado'):
+            qs = qs.filter(estado=params['estado'])
+        return (
+            qs.annotate(
+                vendidas=Coalesce(
+                    _suma_por_producto('unidades', 'cantidad', date_from, date_to),
+                    0, output_field=IntegerField(),
+                ),
+                ingresos=Coalesce(
+                    _suma_por_producto('ingresos', 'total', date_from, date_to),
+                    Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2),
+                ),
+            )
+            .values('id', 'nombre', 'categoria__nombre', 'stock', 'estado', 'vendidas', 'ingresos')
+            .order_by('-vendidas', 'id')
+        )
+
+    def rows(self, params):
+        date_from, date_to = self._periodo(params)
+        dias = (date_to - date_from).days + 1
+        for r in super().rows(params):
+            vendidas, stock = r['vendidas'], max(r['stock'], 0)
+            por_dia = vendidas / dias
+            yield {
+                'producto': r['id'],
+                'nombre': r['nombre'],
+                'categoria': r['categoria__nombre'],
+                'estado': r['estado'],
+                'stock': r['stock'],
+                'vendidas': vendidas,
+                'ingresos': r['ingresos'],
+                'sell_through': round(vendidas / (vendidas + stock), 4) if vendidas + stock else 0.0,
+                'cobertura_dias': round(stock / por_dia, 1) if por_dia else None,
+            }
+
+    def descripcion(self, params):
+        date_from, date_to = self._periodo(params)
+        return f"Sell-through y cobertura de stock {date_from} - {date_to}"
+
+    def marca_de_agua(self, params):
+        marca = super().marca_de_agua(params)
+        # Sin rango explícito el periodo depende del día actual
+        marca['hoy'] = timezone.localdate()
+        return marca
+
+
+@registrar
+class AbcReporte(ReportBuilder):
+    """
+    Clasificación ABC (Pareto) de productos por ingresos del periodo, con
+    posición global, posición dentro de la categoría y participación
+    acumulada. Las ventas se agregan primero por producto en una tabla
+    derivada (GROUP BY producto_id sobre VentaDiaria o DetalleVenta) y las
+    funciones de ventana corren sobre una fila por producto, unida a
+    Producto para incluir también los que no vendieron. Con `top` se
+    devuelven sólo los N primeros de cada categoría (el filtro se aplica
+    después de calcular el acumulado).
+
+    El ORM no arma un JOIN contra una subconsulta agregada: la consulta
+    interna sale del ORM y la externa (ventanas) es SQL, como bulk.upsert.
+    """
+
+    tipo = 'abc'
+    parametros = {
+        **ReportBuilder.parametros,
+        'categoria': "id de categoría (opcional)",
+        'top': "N primeros productos por categoría (opcional)",
+        'umbral_a': "participación acumulada de la clase A (por defecto 0.8)",
+        'umbral_b': "participación acumulada hasta la clase B (por defecto 0.95)",
+    }
+    parametros_benchmark = {'top': 10}
+    huellas = ('catalogo',)
+    COLUMNAS = (
+        'id', 'nombre', 'categoria', 'categoria__nombre', 'unidades', 'ingresos',
+        'posicion', 'posicion_categoria', 'acumulado', 'total_periodo',
+    )
+
+    def _umbrales(self, params):
+        try:
+            a = float(params.get('umbral_a') or 0.8)
+            b = float(params.get('umbral_b') or 0.95)
+        except (TypeError, ValueError):
+            raise ValueError("Umbrales ABC inválidos")
+        if not 0 < a < b <= 1:
+            raise ValueError("Se requiere 0 < umbral_a < umbral_b <= 1")
+        return Decimal(str(a)), Decimal(str(b))
+
+    def validar(self, params):
+        super().validar(params)
+        self._umbrales(params)
+        _entero(params, 'categoria', 0)
+        if _entero(params, 'top', 0) < 0:
+            raise ValueError("Parámetro 'top' inválido")
+
+    def _vendido_por_producto(self, params):
+        """QuerySet (pid, unidades, ingresos) agrupado por producto en el rango."""
+        date_from, date_to = parse_fechas(params)
+        if settings.REPORTING_USAR_RESUMEN:
+            qs = VentaDiaria.objects.all()
+            if date_from:
+                qs = qs.filter(fecha__gte=date_from)
+            if date_to:
+                qs = qs.filter(fecha__lte=date_to)
+            unidades, ingresos = Sum('unidades'), Sum('ingresos')
+        else:
+            qs = DetalleVenta.objects.exclude(venta__estado_venta='cancelada')
+            if date_from:
+                qs = qs.filter(venta__fecha_venta__date__gte=date_from)
+            if date_to:
+                qs = qs.filter(venta__fecha_venta__date__lte=date_to)
+            unidades, ingresos = Sum('cantidad'), Sum('total')
+        return qs.values(pid=F('producto')).annotate(unidades=unidades, ingresos=ingresos).order_by()
+
+    def consulta(self, params):
+        """(sql, parámetros) con una fila por producto y las columnas de COLUMNAS."""
+        q = connection.ops.quote_name
+        vendido_sql, sql_params = self._vendido_por_producto(params).query.sql_with_params()
+        producto, categoria = Producto._meta.db_table, Categoria._meta.db_table
+        ingresos = "COALESCE(v.ingresos, 0)"
+        orden = f"ORDER BY {ingresos} DESC, p.id"
+        donde = ""
+        sql_params = list(sql_params)
+        if _entero(params, 'categoria', 0):
+            donde = "WHERE p.categoria_id = %s"
+            sql_params.append(_entero(params, 'categoria', 0))
+        sql = (
+            f"SELECT p.id, p.nombre, p.categoria_id, c.nombre, COALESCE(v.unidades, 0), {ingresos}, "
+            f"ROW_NUMBER() OVER ({orden}) AS posicion, "
+            f"RANK() OVER (PARTITION BY p.categoria_id {orden}) AS posicion_categoria, "
+            f"SUM({ingresos}) OVER ({orden} ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW), "
+            f"SUM({ingresos}) OVER () "
+            f"FROM {q(producto)} p LEFT JOIN {q(categoria)} c ON c.id = p.categoria_id "
+            f"LEFT JOIN ({vendido_sql}) v ON v.pid = p.id {donde}"
+        )
+        top = _entero(params, 'top', 0)
+        if top:
+            sql = f"SELECT * FROM ({sql}) abc WHERE posicion_categoria <= %s"
+            sql_params.append(top)
+        return f"{sql} ORDER BY posicion", sql_params
+
+    def _filas(self, params):
+        sql, sql_params = self.consulta(params)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, sql_params)
+            while lote := cursor.fetchmany(CHUNK_SIZE):
+                for fila in lote:
+                    r = dict(zip(self.COLUMNAS, fila))
+                    # SQLite devuelve REAL para las sumas de DecimalField
+                    for k in ('ingresos', 'acumulado', 'total_periodo'):
+                        r[k] = Decimal(str(r[k])).quantize(_CENTAVO)
+                    yield r
+
+    def rows(self, params):
+        umbral_a, umbral_b = self._umbrales(params)
+        for r in self._filas(params):
+            ingresos, acumulado, total = r['ingresos'], r['acumulado'], r['total_periodo']
+            # Lo acumulado *antes* del producto decide la clase: el que cruza el umbral entra en ella
+            previo = acumulado - ingresos
+            if ingresos <= 0:
+                clase = 'C'
+            elif previo < total * umbral_a:
+                clase = 'A'
+            elif previo < total * umbral_b:
+                clase = 'B'
+            else:
+                clase = 'C'
+            yield {
+                'posicion': r['posicion'],
+                'posicion_categoria': r['posicion_categoria'],
+                'producto': r['id'],
+                'nombre': r['nombre'],
+                'categoria': r['categoria__nombre'],
+                'unidades': r['unidades'],
+                'ingresos': r['ingresos'],
+                'participacion': round(float(ingresos / total), 6) if total else 0.0,
+                'participacion_acumulada': round(float(acumulado / total), 6) if total else 0.0,
+                'clase': clase,
+            }
+
+    def nombre_archivo(self, params):
+        return 'abc_productos'
+
+    def descripcion(self, params):
+        descripcion = f"Clasificación ABC de productos {_rango(params)}".strip()
+        if _entero(params, 'top', 0):
+            descripcion += f" (top {_entero(params, 'top', 0)} por categoría)"
+        return descripcion
+
+
+@registrar
+class IAReporte(ReportBuilder):
+    """Predicción vs. ventas reales (ingresos) por producto y mes."""
+
+    tipo = 'ia'
+    parametros = {
+        'modelo': "id de ModeloEntrenado (por defecto el último)",
+        'date_from': "desde fecha_prediccion YYYY-MM-DD (opcional)",
+        'date_to': "hasta fecha_prediccion YYYY-MM-DD (opcional)",
+    }
+    parametros_benchmark = {}
+    huellas = ('catalogo',)
+
+    def _modelo_id(self, params):
+        if params.get('modelo'):
+            return _entero(params, 'modelo', None)
+        ultimo = ModeloEntrenado.objects.order_by('-fecha_entrenamiento').values_list('id', flat=True).first()
+        if ultimo is None:
+            raise ValueError("No hay modelos entrenados")
+        return ultimo
+
+    def validar(self, params):
+        super().validar(params)
+        self._modelo_id(params)
+
+    def queryset(self, params):
+        date_from, date_to = parse_fechas(params)
+        qs = PrediccionVenta.objects.filter(modelo_id=self._modelo_id(params))
+        if date_from:
+            qs = qs.filter(fecha_prediccion__gte=date_from)
+        if date_to:
+            qs = qs.filter(fecha_prediccion__lte=date_to)
+        # fecha_prediccion es el día 1 del mes: rango [día 1, día 1 + 31) acotado al mismo mes
+        if settings.REPORTING_USAR_RESUMEN:
+            reales = VentaDiaria.objects.filter(
+                producto=OuterRef('producto'),
+                fecha__gte=OuterRef('fecha_prediccion'),
+                fecha__lt=OuterRef('fecha_prediccion') + timedelta(days=31),
+                fecha__month=ExtractMonth(OuterRef('fecha_prediccion')),
+            )
+            campo = 'ingresos'
+        else:
+            reales = DetalleVenta.objects.filter(
+                producto=OuterRef('producto'),
+                venta__fecha_venta__date__gte=OuterRef('fecha_prediccion'),
+                venta__fecha_venta__date__lt=OuterRef('fecha_prediccion') + timedelta(days=31),
+                venta__fecha_venta__month=ExtractMonth(OuterRef('fecha_prediccion')),
+            ).exclude(venta__estado_venta='cancelada')
+            campo = 'total'
+        real = Subquery(
+            reales.order_by().values('producto').annotate(s=Sum(campo)).values('s')[:1]
+        )
+        return (
+            qs.annotate(
+                real=Coalesce(
+                    real, Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2)
+                )
+            )
+            .values(
+                'producto_id', 'producto__nombre', 'fecha_prediccion', 'periodo',
+                'ventas_estimadas', 'real',
+            )
+            .order_by('fecha_prediccion', 'producto_id')
+        )
+
+    def rows(self, params):
+        for r in super().rows(params):
+            estimado, real = r['ventas_estimadas'], r['real']
+            error = real - estimado
+            yield {
+                'producto': r['producto_id'],
+                'nombre': r['producto__nombre'],
+                'fecha': r['fecha_prediccion'],
+                'periodo': r['periodo'],
+                'estimado': estimado,
+                'real': real,
+                'error': error,
+                'error_pct': round(float(abs(error) / real) * 100, 2) if real else None,
+            }
+
+    def descripcion(self, params):
+        return f"Predicción vs. real (modelo {self._modelo_id(params)}) {_rango(params)}".strip()
+
+    def marca_de_agua(self, params):
+        marca = super().marca_de_agua({})  # los reales pueden caer fuera del rango de fechas
+        marca.update(PrediccionVenta.objects.filter(modelo_id=self._modelo_id(params)).aggregate(
+            predicciones=Count('id'), max_prediccion=Max('id'), max_generado=Max('generado_en')
+        ))
+        return marca
@@ -0,0 +1,156 @@
+"""
+Segmentación RFM de clientes.
+
+1. La BD agrega las ventas no canceladas por cliente (última compra,
+   cantidad y monto) y el resultado se lee por lotes con
+   values_list().iterator() directamente a arreglos NumPy.
+2. Puntajes por quintil y etiqueta de segmento, todo vectorizado.
+3. Los segmentos se escriben por lotes con bulk.upsert
+   (INSERT ... ON CONFLICT) sobre SegmentoCliente.cliente, y los de
+   clientes sin ventas se borran en la misma transacción.
+
+La memoria crece sólo con la cantidad de clientes (unos 40 bytes por
+cliente), no con la cantidad de ventas.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import repeat
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from apps.sales.models import Venta
+from .bulk import upsert
+from .exporters import CHUNK_SIZE
+from .models import SegmentoCliente
+
+logger = logging.getLogger(__name__)
+
+QUINTILES = 5
+
+
+def extraer(fecha_corte, chunk_size=CHUNK_SIZE):
+    """
+    Devuelve (cliente_id, recencia_dias, frecuencia, monto) como arreglos
+    NumPy, a partir de las ventas hasta `fecha_corte` (inclusive).
+    """
+    # Límite como datetime (no __date) para que la BD pueda usar el índice de fecha_venta
+    limite = timezone.make_aware(datetime.combine(fecha_corte + timedelta(days=1), datetime.min.time()))
+    qs = (
+        Venta.objects.exclude(estado_venta="cancelada")
+        .filter(fecha_venta__lt=limite)
+        .values("cliente_id")
+        .annotate(ultima=Max("fecha_venta"), frecuencia=Count("id"), monto=Sum("total"))
+        .order_by()
+        .values_list("cliente_id", "ultima", "frecuencia", "monto")
+    )
+    ids, dias, frecuencia, monto = [], [], [], []
+    bloque = []
+    for fila in qs.iterator(chunk_size=chunk_size):
+        bloque.append(fila)
+        if len(bloque) >= chunk_size:
+            _volcar(bloque, fecha_corte, ids, dias, frecuencia, monto)
+            bloque = []
+    if bloque:
+        _volcar(bloque, fecha_corte, ids, dias, frecuencia, monto)
+    if not ids:
+        vacio = np.empty(0, dtype=np.int64)
+        return vacio, vacio, vacio, np.empty(0, dtype=np.float64)
+    return np.concatenate(ids), np.concatenate(dias), np.concatenate(frecuencia), np.concatenate(monto)
+
+
+def _volcar(bloque, fecha_corte, ids, dias, frecuencia, monto):
+    cliente_id, ultima, n, total = zip(*bloque)
+    ids.append(np.fromiter(cliente_id, dtype=np.int64, count=len(bloque)))
+    dias.append(np.fromiter(
+        ((fecha_corte - timezone.localdate(u)).days for u in ultima), dtype=np.int64, count=len(bloque)
+    ))
+    frecuencia.append(np.fromiter(n, dtype=np.int64, count=len(bloque)))
+    monto.append(np.fromiter((float(t or 0) for t in total), dtype=np.float64, count=len(bloque)))
+
+
+def quintil(valores, mayor_es_mejor=True):
+    """
+    Puntaje 1..5 por posición (percentil) de cada valor. Los empates toman
+    la menor posición del grupo (rank method='min'), así dos clientes con el
+    mismo valor tienen el mismo puntaje sin importar el orden en que la BD
+    devolvió las filas. Con muchos valores repetidos (p. ej. frecuencia = 1)
+    los quintiles quedan desparejos.
+    """
+    n = len(valores)
+    if n == 0:
+        return np.empty(0, dtype=np.int8)
+    clave = valores if mayor_es_mejor else -valores
+    posicion = np.searchsorted(np.sort(clave, kind="stable"), clave, side="left")
+    return (posicion * QUINTILES // n + 1).astype(np.int8)
+
+
+def segmentar(r, f, m):
+    """Etiqueta de segmento a partir de los puntajes (mapa RFM clásico R vs. FM)."""
+    fm = (f.astype(np.int16) + m + 1) // 2
+    condiciones = [
+        (r >= 4) & (fm >= 4),
+        (r >= 3) & (fm >= 3),
+        (r >= 4),
+        (r == 3),
+        (r <= 2) & (fm >= 3),
+        (r == 2),
+    ]
+    etiquetas = ["campeones", "leales", "potenciales", "necesitan_atencion", "en_riesgo", "hibernando"]
+    return np.select(condiciones, etiquetas, default="perdidos")
+
+
+CAMPOS = (
+    "cliente_id", "recencia_dias", "frecuencia", "monto",
+    "r_score", "f_score", "m_score", "segmento", "calculado_en",
+)
+
+
+def calcular(fecha_corte=None, chunk_size=CHUNK_SIZE, batch_size=5000):
+    """
+    Recalcula SegmentoCliente para todos los clientes con compras y borra
+    los segmentos de clientes que ya no tienen ventas válidas.
+    Devuelve métricas de la ejecución.
+    """
+    fecha_corte = fecha_corte or timezone.localdate()
+    ahora = timezone.now()
+    t0 = time.perf_counter()
+    ids, recencia, frecuencia, monto = extraer(fecha_corte, chunk_size)
+    t_extraccion = time.perf_counter() - t0
+
+    r = quintil(recencia, mayor_es_mejor=False)
+    f = quintil(frecuencia)
+    m = quintil(monto)
+    segmentos = segmentar(r, f, m)
+    t_puntajes = time.perf_counter() - t0 - t_extraccion
+
+    centavos = np.rint(monto * 100).astype(np.int64)
+    momento = connection.ops.adapt_datetimefield_value(ahora)
+    # Upsert y borrado juntos: un fallo a mitad no deja segmentos viejos y nuevos mezclados
+    with transaction.atomic():
+        for inicio in range(0, len(ids), batch_size):
+            fin = inicio + batch_size
+            upsert(SegmentoCliente, CAMPOS, ["cliente_id"], zip(
+                ids[inicio:fin].tolist(), recencia[inicio:fin].tolist(), frecuencia[inicio:fin].tolist(),
+                (Decimal(c).scaleb(-2) for c in centavos[inicio:fin].tolist()),
+                r[inicio:fin].tolist(), f[inicio:fin].tolist(), m[inicio:fin].tolist(),
+                segmentos[inicio:fin].tolist(), repeat(momento),
+            ), batch_size=batch_size)
+        eliminados, _ = SegmentoCliente.objects.filter(calculado_en__lt=ahora).delete()
+    t_total = time.perf_counter() - t0
+
+    segmentos_, cantidades = np.unique(segmentos, return_counts=True)
+    metricas = {
+        "clientes": len(ids),
+        "eliminados": eliminados,
+        "segmentos": dict(zip(segmentos_.tolist(), cantidades.tolist())),
+        "extraccion_s": round(t_extraccion, 3),
+        "puntajes_s": round(t_puntajes, 3),
+        "total_s": round(t_total, 3),
+    }
+    logger.info("Segmentación RFM: %s", metricas)
+    return metricas
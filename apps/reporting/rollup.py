@@ -0,0 +1,178 @@
+"""
+Mantenimiento del resumen diario VentaDiaria.
+
+- aplicar_venta(): suma (o resta, al cancelar) una venta dentro de la
+  transacción que la crea/cancela (VentaViewSet.create / cancelar, dentro
+  de gestion_manual()).
+- Cualquier otra escritura sobre Venta/DetalleVenta (update, destroy,
+  admin, shell) llega por las señales de apps/reporting/signals.py, que
+  recalculan los días afectados con recalcular_dias().
+- reconstruir(): recalcula un rango de fechas en bloque con una sola
+  consulta agregada sobre DetalleVenta.
+
+Los QuerySet.update()/bulk_create() sobre ventas no emiten señales: después
+de usarlos hay que llamar a recalcular_dias() o reconstruir().
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.sales.models import DetalleVenta
+from .models import VentaDiaria
+from . import particiones
+
+_local = threading.local()
+
+
+@contextmanager
+def gestion_manual():
+    """Dentro del bloque las señales no tocan el resumen: quien escribe llama a aplicar_venta()."""
+    anterior = getattr(_local, "manual", False)
+    _local.manual = True
+    try:
+        yield
+    finally:
+        _local.manual = anterior
+
+
+def en_gestion_manual():
+    return getattr(_local, "manual", False)
+
+
+def _incrementar(clave, valores):
+    cambios = {k: F(k) + v for k, v in valores.items()}
+    if VentaDiaria.objects.filter(**clave).update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            VentaDiaria.objects.create(**clave, **valores)
+    except IntegrityError:
+        # Otra transacción creó la fila en paralelo
+        VentaDiaria.objects.filter(**clave).update(**cambios)
+
+
+def aplicar_venta(venta, signo=1):
+    """Suma (signo=1) o resta (signo=-1) las líneas de `venta` en el resumen."""
+    fecha = timezone.localdate(venta.fecha_venta)
+    acumulado = {}
+    categorias_vistas = set()
+    lineas = venta.detalles.order_by("id").values_list(
+        "producto_id", "producto__categoria_id", "cantidad", "total"
+    )
+    for i, (producto_id, categoria_id, cantidad, total) in enumerate(lineas):
+        fila = acumulado.setdefault(
+            (producto_id, categoria_id),
+            {"unidades": 0, "ingresos": Decimal("0"), "pedidos": 0, "pedidos_categoria": 0},
+        )
+        fila["unidades"] += cantidad
+        fila["ingresos"] += total
+        if i == 0:
+            fila["pedidos"] += 1
+        if categoria_id not in categorias_vistas:
+            categorias_vistas.add(categoria_id)
+            fila["pedidos_categoria"] += 1
+
+    particiones.invalidar(fecha)
+    for (producto_id, categoria_id), valores in acumulado.items():
+        _incrementar(
+            {
+                "fecha": fecha,
+                "producto_id": producto_id,
+                "categoria_id": categoria_id,
+                "metodo_pago": venta.metodo_pago,
+            },
+            {k: v * signo for k, v in valores.items()},
+        )
+
+
+def filas_agregadas(date_from=None, date_to=None):
+    """
+    Agregación en la BD con la misma atribución de pedidos que aplicar_venta:
+    la primera línea (menor id) de cada venta, y de cada categoría dentro de la venta.
+    La migración 0014 tiene una copia congelada: si esto cambia, no se toca.
+    """
+    lineas_venta = DetalleVenta.objects.filter(venta=OuterRef("venta")).order_by("id").values("id")
+    primera_de_categoria = Case(
+        When(
+            producto__categoria__isnull=True,
+            then=Subquery(lineas_venta.filter(producto__categoria__isnull=True)[:1]),
+        ),
+        default=Subquery(
+            lineas_venta.filter(producto__categoria=OuterRef("producto__categoria"))[:1]
+        ),
+    )
+    qs = DetalleVenta.objects.exclude(venta__estado_venta="cancelada")
+    if date_from:
+        qs = qs.filter(venta__fecha_venta__date__gte=date_from)
+    if date_to:
+        qs = qs.filter(venta__fecha_venta__date__lte=date_to)
+    uno = Value(1, output_field=IntegerField())
+    return (
+        qs.annotate(primera=Subquery(lineas_venta[:1]), primera_cat=primera_de_categoria)
+        .values(
+            dia=TruncDate("venta__fecha_venta"),
+            prod=F("producto_id"),
+            cat=F("producto__categoria_id"),
+            metodo=F("venta__metodo_pago"),
+        )
+        .annotate(
+            unidades=Sum("cantidad"),
+            ingresos=Sum("total"),
+            pedidos=Sum(Case(When(id=F("primera"), then=uno), default=0)),
+            pedidos_categoria=Sum(Case(When(id=F("primera_cat"), then=uno), default=0)),
+        )
+        .order_by()
+    )
+
+
+def insertar_filas(filas, batch_size=5000):
+    """bulk_create de las filas de filas_agregadas(); devuelve cuántas insertó."""
+    total = 0
+    lote = []
+    for r in filas.iterator(chunk_size=batch_size):
+        lote.append(
+            VentaDiaria(
+                fecha=r["dia"],
+                producto_id=r["prod"],
+                categoria_id=r["cat"],
+                metodo_pago=r["metodo"],
+                unidades=r["unidades"],
+                ingresos=r["ingresos"],
+                pedidos=r["pedidos"],
+                pedidos_categoria=r["pedidos_categoria"],
+            )
+        )
+        if len(lote) >= batch_size:
+            VentaDiaria.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        VentaDiaria.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+@transaction.atomic
+def reconstruir(date_from=None, date_to=None, batch_size=5000):
+    """Borra y recalcula el resumen del rango indicado (todo el historial si no hay rango)."""
+    existentes = VentaDiaria.objects.all()
+    if date_from:
+        existentes = existentes.filter(fecha__gte=date_from)
+    if date_to:
+        existentes = existentes.filter(fecha__lte=date_to)
+    existentes.delete()
+    particiones.invalidar(date_from, date_to or timezone.localdate())
+    return insertar_filas(filas_agregadas(date_from, date_to), batch_size=batch_size)
+
+
+def recalcular_dias(*fechas):
+    """Reconstruye el resumen de cada día (date o datetime de la venta) indicado."""
+    dias = {timezone.localdate(f) if isinstance(f, datetime) else f for f in fechas if f is not None}
+    for dia in sorted(dias):
+        reconstruir(dia, dia)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Reporte, ConsultaReporte,ModeloEntrenado, PrediccionVenta
+from .models import Reporte, ConsultaReporte,ModeloEntrenado, PrediccionVenta, TrabajoReporte, SegmentoCliente, EjecucionPrediccion
+from .models import EvaluacionModelo
 
 
 class ReporteSerializer(serializers.ModelSerializer):
@@ -16,6 +17,45 @@ class ConsultaReporteSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "fecha_solicitud"]
 
 
+class TrabajoReporteSerializer(serializers.ModelSerializer):
+    reporte = ReporteSerializer(read_only=True)
+
+    class Meta:
+        model = TrabajoReporte
+        fields = "__all__"
+        read_only_fields = [
+            "id", "estado", "solicitado_por", "reporte", "error",
+            "creado_en", "iniciado_en", "finalizado_en", "duracion_segundos",
+        ]
+
+
+class SegmentoClienteSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="cliente.user.username", read_only=True)
+    email = serializers.CharField(source="cliente.user.email", read_only=True)
+
+    class Meta:
+        model = SegmentoCliente
+        fields = "__all__"
+
+
+class EjecucionPrediccionSerializer(serializers.ModelSerializer):
+    progreso = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = EjecucionPrediccion
+        fields = "__all__"
+        read_only_fields = [
+            "id", "estado", "productos_total", "productos_procesados", "filas", "error",
+            "solicitado_por", "creado_en", "iniciado_en", "finalizado_en", "duracion_segundos",
+        ]
+
+
+class EvaluacionModeloSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EvaluacionModelo
+        fields = "__all__"
+
+
 class ModeloEntrenadoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ModeloEntrenado
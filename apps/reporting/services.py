@@ -1,66 +1,276 @@
-import csv, json
+from decimal import Decimal
 from pathlib import Path
 from django.conf import settings
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
 from django.utils import timezone
 from datetime import datetime
-from apps.sales.models import Venta
+from apps.sales.models import Venta, DetalleVenta
+from .models import Reporte, ConsultaReporte, VentaDiaria
+from . import cache, exporters, particiones
+from .exporters import CHUNK_SIZE  # lote para QuerySet.iterator() y escritura columnar
 
-def ventas_por_dia_queryset(date_from=None, date_to=None):
-    qs = Venta.objects.all()
+# Granularidades soportadas por el motor de agregación
+GRANULARIDADES = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+# Dimensiones de agrupación -> ruta del campo partiendo de Venta
+DIMENSIONES = {
+    'metodo_pago': 'metodo_pago',
+    'estado_venta': 'estado_venta',
+    'ciudad': 'cliente__ciudad',
+    'categoria': 'producto__categoria__nombre',  # se resuelve desde DetalleVenta
+}
+
+
+def normalizar_agrupacion(agrupar_por):
+    if not agrupar_por:
+        return []
+    if isinstance(agrupar_por, str):
+        agrupar_por = [x.strip() for x in agrupar_por.split(',') if x.strip()]
+    for dim in agrupar_por:
+        if dim not in DIMENSIONES:
+            raise ValueError(f"Agrupación no soportada: {dim}")
+    return list(agrupar_por)
+
+
+# Dimensiones que se pueden resolver desde el resumen diario VentaDiaria
+DIMENSIONES_RESUMEN = {
+    'metodo_pago': 'metodo_pago',
+    'categoria': 'categoria__nombre',
+}
+
+
+def _ventas_desde_resumen(date_from, date_to, granularidad, dims):
+    """Lee VentaDiaria: el costo depende de días × productos, no del número de ventas."""
+    qs = VentaDiaria.objects.all()
+    if date_from:
+        qs = qs.filter(fecha__gte=date_from)
+    if date_to:
+        qs = qs.filter(fecha__lte=date_to)
+    periodo = F('fecha') if granularidad == 'dia' else GRANULARIDADES[granularidad]('fecha')
+    campos = {'periodo': periodo}
+    for dim in dims:
+        campos[f'dim_{dim}'] = F(DIMENSIONES_RESUMEN[dim])
+    # pedidos_categoria cuenta cada venta una vez por categoría; pedidos, una vez en total
+    pedidos = Sum('pedidos_categoria') if 'categoria' in dims else Sum('pedidos')
+    # Grupos que quedaron en cero por cancelaciones no se reportan (igual que en el detalle)
+    return (
+        qs.values(**campos)
+        .annotate(monto=Sum('ingresos'), cantidad_ventas=pedidos)
+        .filter(cantidad_ventas__gt=0)
+    )
+
+
+def _ventas_desde_detalle(date_from, date_to, granularidad, dims):
+    trunc = GRANULARIDADES[granularidad]
+    if 'categoria' in dims:
+        # La categoría vive en el producto: agregamos sobre las líneas de detalle
+        qs = DetalleVenta.objects.all()
+        prefijo = 'venta__'
+        pedidos = Count('venta', distinct=True)
+    else:
+        qs = Venta.objects.all()
+        prefijo = ''
+        pedidos = Count('id')
+
+    if 'estado_venta' not in dims:
+        qs = qs.exclude(**{f'{prefijo}estado_venta': 'cancelada'})
     if date_from:
-        qs = qs.filter(fecha_venta__date__gte=date_from)
+        qs = qs.filter(**{f'{prefijo}fecha_venta__date__gte': date_from})
     if date_to:
-        qs = qs.filter(fecha_venta__date__lte=date_to)
-    # agregamos en Python por simplicidad (podrías usar annotate/TruncDate)
-    data = {}
-    for v in qs.only('fecha_venta','total'):
-        d = v.fecha_venta.date().isoformat()
-        data[d] = data.get(d, 0) + float(v.total)
-    rows = [{'fecha': k, 'total': round(v, 2)} for k, v in sorted(data.items())]
+        qs = qs.filter(**{f'{prefijo}fecha_venta__date__lte': date_to})
+
+    campos = {'periodo': trunc(f'{prefijo}fecha_venta')}
+    for dim in dims:
+        ruta = DIMENSIONES[dim] if dim == 'categoria' else prefijo + DIMENSIONES[dim]
+        campos[f'dim_{dim}'] = F(ruta)
+    return qs.values(**campos).annotate(monto=Sum('total'), cantidad_ventas=pedidos)
+
+
+def _consulta_ventas(date_from, date_to, granularidad, dims):
+    if settings.REPORTING_USAR_RESUMEN and set(dims) <= set(DIMENSIONES_RESUMEN):
+        return _ventas_desde_resumen(date_from, date_to, granularidad, dims)
+    return _ventas_desde_detalle(date_from, date_to, granularidad, dims)
+
+
+def _ventas_por_particiones(date_from, date_to, granularidad, dims):
+    if date_from is None:
+        # Sin rango inicial: desde la primera venta registrada
+        if settings.REPORTING_USAR_RESUMEN:
+            date_from = VentaDiaria.objects.aggregate(m=Min('fecha'))['m']
+        else:
+            primera = Venta.objects.aggregate(m=Min('fecha_venta'))['m']
+            date_from = timezone.localdate(primera) if primera else None
+        if date_from is None:
+            return []
+    date_to = date_to or timezone.localdate()
+    if date_from > date_to:
+        return []
+    return particiones.ventas_particionadas(
+        lambda desde, hasta, d: _consulta_ventas(desde, hasta, 'dia', d),
+        date_from, date_to, granularidad, dims,
+    )
+
+
+def ventas_agregadas(date_from=None, date_to=None, granularidad='dia', agrupar_por=None):
+    """
+    Agrega las ventas en la base de datos (GROUP BY periodo + dimensiones)
+    y devuelve filas planas listas para export_rows:
+    {'fecha', <dimensiones...>, 'total', 'cantidad_ventas', 'ticket_promedio'}
+
+    Las ventas canceladas se excluyen, salvo que se agrupe por estado_venta.
+    Si las dimensiones lo permiten se lee del resumen diario VentaDiaria, y con
+    REPORTING_PARTICIONES los días cerrados se reutilizan de ParticionReporte.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError("Granularidad no soportada")
+    dims = normalizar_agrupacion(agrupar_por)
+
+    if settings.REPORTING_PARTICIONES:
+        registros = _ventas_por_particiones(date_from, date_to, granularidad, dims)
+    else:
+        registros = _consulta_ventas(date_from, date_to, granularidad, dims).order_by(
+            'periodo', *[f'dim_{dim}' for dim in dims]
+        )
+
+    rows = []
+    for r in registros:
+        monto = r['monto'] or Decimal('0')
+        cantidad = r['cantidad_ventas']
+        periodo = r['periodo']
+        row = {'fecha': periodo.date() if isinstance(periodo, datetime) else periodo}
+        for dim in dims:
+            row[dim] = r[f'dim_{dim}']
+        row['total'] = round(float(monto), 2)
+        row['cantidad_ventas'] = cantidad
+        row['ticket_promedio'] = round(float(monto) / cantidad, 2) if cantidad else 0.0
+        rows.append(row)
     return rows
 
+
+def ventas_por_dia_queryset(date_from=None, date_to=None):
+    return ventas_agregadas(date_from, date_to, granularidad='dia')
+
+def detalle_ventas_rows(date_from=None, date_to=None, chunk_size=CHUNK_SIZE):
+    """
+    Generador de líneas de DetalleVenta leídas por lotes con iterator():
+    nunca mantiene en memoria más de `chunk_size` filas.
+    """
+    qs = DetalleVenta.objects.all()
+    if date_from:
+        qs = qs.filter(venta__fecha_venta__date__gte=date_from)
+    if date_to:
+        qs = qs.filter(venta__fecha_venta__date__lte=date_to)
+    qs = qs.order_by('venta_id', 'id').values_list(
+        'venta_id', 'venta__fecha_venta', 'venta__metodo_pago',
+        'producto_id', 'producto__nombre', 'cantidad', 'precio_unitario', 'total',
+    )
+    for venta_id, fecha, metodo, producto_id, producto, cantidad, precio, total in qs.iterator(chunk_size=chunk_size):
+        yield {
+            'venta': venta_id,
+            'fecha': timezone.localtime(fecha),
+            'metodo_pago': metodo,
+            'producto': producto_id,
+            'producto_nombre': producto,
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'total': total,
+        }
+
+
 def ensure_reports_dir():
     reports_dir = Path(settings.MEDIA_ROOT) / 'reports'
     reports_dir.mkdir(parents=True, exist_ok=True)
     return reports_dir
 
 def export_rows(rows, formato='CSV', base_filename='reporte'):
+    """
+    Escribe `rows` (lista o generador de dicts) fila a fila, sin materializarlo.
+    Formatos: ver exporters.FORMATOS (CSV/JSON, NDJSON, variantes gzip/zstd,
+    Parquet y Feather).
+    """
+    if formato not in exporters.FORMATOS:
+        raise ValueError("Formato no soportado")
+    extension, escritor, compresion = exporters.FORMATOS[formato]
     reports_dir = ensure_reports_dir()
-    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-    if formato == 'CSV':
-        fname = f"{base_filename}_{timestamp}.csv"
-        fpath = reports_dir / fname
-        with open(fpath, 'w', newline='', encoding='utf-8') as f:
-            if rows:
-                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
-                writer.writeheader()
-                writer.writerows(rows)
-            else:
-                f.write("")  # vacío con headers omitidos
-        return f"reports/{fname}"
-    elif formato == 'JSON':
-        fname = f"{base_filename}_{timestamp}.json"
-        fpath = reports_dir / fname
-        with open(fpath, 'w', encoding='utf-8') as f:
-            json.dump(rows, f, ensure_ascii=False, indent=2)
-        return f"reports/{fname}"
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S_%f')  # µs: evita colisiones entre reportes cacheados
+    fname = f"{base_filename}_{timestamp}.{extension}"
+    fpath = reports_dir / fname
+    rows = iter(rows)
+    first = next(rows, None)
+
+    if escritor in ('parquet', 'feather'):
+        exporters.escribir_arrow(fpath, first, rows, formato)
     else:
-        raise ValueError("Formato no soportado")
+        with exporters.abrir_texto(fpath, compresion) as f:
+            if escritor == 'csv':
+                exporters.escribir_csv(f, first, rows)
+            elif escritor == 'json':
+                exporters.escribir_json(f, first, rows)
+            else:
+                exporters.escribir_ndjson(f, first, rows)
+    return f"reports/{fname}"
 
-def generar_reporte(tipo, formato='CSV', params=None):
-    params = params or {}
+def parse_fechas(params):
     date_from = params.get('date_from')  # 'YYYY-MM-DD' (opcional)
     date_to   = params.get('date_to')
     if date_from and isinstance(date_from, str):
         date_from = datetime.fromisoformat(date_from).date()
     if date_to and isinstance(date_to, str):
         date_to = datetime.fromisoformat(date_to).date()
+    return date_from, date_to
+
+
+def marca_de_agua(tipo, params=None):
+    """
+    Resumen barato de los datos que alimentan el reporte: si cambia (ventas
+    nuevas, borradas o canceladas en el rango) cambia la clave de caché.
+    """
+    from .reportes import get_builder  # reportes importa este módulo
+
+    return get_builder(tipo).marca_de_agua(params or {})
+
+
+def generar_reporte(tipo, formato='CSV', params=None):
+    """Genera el archivo de un tipo registrado en apps/reporting/reportes.py."""
+    from .reportes import get_builder  # reportes importa este módulo
+
+    params = params or {}
+    builder = get_builder(tipo)
+    builder.validar(params)
+    ruta_rel = export_rows(
+        builder.rows(params), formato=formato, base_filename=builder.nombre_archivo(params)
+    )
+    return ruta_rel, builder.descripcion(params)
 
-    if tipo == 'ventas':
-        rows = ventas_por_dia_queryset(date_from, date_to)
-        ruta_rel = export_rows(rows, formato=formato, base_filename='ventas_por_dia')
-        descripcion = f"Ventas por día {date_from or ''} - {date_to or ''}".strip()
-        return ruta_rel, descripcion
 
-    # Future: otros tipos (clientes, productos, IA, etc.)
-    raise ValueError("Tipo de reporte no soportado")
+def crear_reporte(tipo, formato='CSV', parametros=None, prompt=''):
+    """
+    Genera el archivo y registra el Reporte junto con su ConsultaReporte.
+    Lo usan tanto la vista síncrona como los workers en segundo plano.
+    Si ya existe un reporte con los mismos parámetros y datos, se reutiliza.
+    """
+    parametros = parametros or {}
+    usar_cache = not parametros.get('sin_cache')
+    rep = None
+    if usar_cache:
+        clave = cache.clave_reporte(tipo, formato, parametros, marca_de_agua(tipo, parametros))
+        rep = cache.buscar(clave)
+    if rep is None:
+        ruta_rel, descripcion = generar_reporte(tipo, formato=formato, params=parametros)
+        rep = Reporte.objects.create(
+            tipo_reporte=tipo,
+            formato=formato,
+            descripcion=descripcion,
+            ruta_archivo=ruta_rel,
+        )
+        if usar_cache:
+            cache.guardar(clave, rep)
+    consulta = ConsultaReporte.objects.create(
+        reporte=rep, prompt_texto=prompt, parametros=parametros
+    )
+    return rep, consulta
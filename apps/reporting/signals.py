@@ -0,0 +1,48 @@
+"""
+Mantiene VentaDiaria al día ante escrituras que no pasan por
+VentaViewSet.create / cancelar: update, partial_update, destroy, admin,
+shell. Cada cambio relevante recalcula los días afectados (el de antes y
+el de después si cambió la fecha) con rollup.recalcular_dias().
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.sales.models import DetalleVenta, Venta
+from . import rollup
+
+# Campos de Venta que cambian el resumen (el total sale de las líneas)
+CAMPOS_RESUMEN = ("fecha_venta", "estado_venta", "metodo_pago")
+
+
+@receiver(pre_save, sender=Venta)
+def venta_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if raw or rollup.en_gestion_manual() or instance.pk is None:
+        return
+    instance._resumen_anterior = Venta.objects.filter(pk=instance.pk).values(*CAMPOS_RESUMEN).first()
+
+
+@receiver(post_save, sender=Venta)
+def venta_guardada(sender, instance, created, raw=False, **kwargs):
+    anterior = getattr(instance, "_resumen_anterior", None)
+    instance._resumen_anterior = None
+    # Una venta nueva todavía no tiene líneas: las suma la señal de DetalleVenta
+    if raw or created or rollup.en_gestion_manual() or anterior is None:
+        return
+    if any(anterior[c] != getattr(instance, c) for c in CAMPOS_RESUMEN):
+        rollup.recalcular_dias(anterior["fecha_venta"], instance.fecha_venta)
+
+
+@receiver(post_delete, sender=Venta)
+def venta_borrada(sender, instance, **kwargs):
+    if not rollup.en_gestion_manual():
+        rollup.recalcular_dias(instance.fecha_venta)
+
+
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=DetalleVenta)
+def detalle_cambiado(sender, instance, raw=False, origin=None, **kwargs):
+    # Al borrar una venta sus líneas caen en cascada: basta con venta_borrada
+    if raw or rollup.en_gestion_manual() or isinstance(origin, Venta) or getattr(origin, "model", None) is Venta:
+        return
+    fecha = Venta.objects.filter(pk=instance.venta_id).values_list("fecha_venta", flat=True).first()
+    rollup.recalcular_dias(fecha)
@@ -1,3 +1,690 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.catalog.models import Categoria, Producto
+from apps.customers.models import Cliente
+from apps.sales.models import DetalleVenta, Venta
+from . import bulk, exporters, jobs, particiones, predicciones, rfm, rollup, services
+from .entrenamiento import dataset_mensual
+from .models import ParticionReporte, Reporte, SegmentoCliente, TrabajoReporte, VentaDiaria
+from .reportes import get_builder
+from .services import export_rows, ventas_agregadas
+
+
+def _ordenadas(filas):
+    # El orden de los NULL en ORDER BY depende del motor
+    return sorted(filas, key=lambda r: [str(v) for v in r.values()])
+
+
+class DatosVentasMixin:
+    """Catálogo chico, dos clientes y un usuario staff autenticado en self.api."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("admin", password="x", is_staff=True)
+        cls.categorias = [Categoria.objects.create(nombre=f"Cat{i}") for i in range(2)]
+        cls.productos = [
+            Producto.objects.create(
+                categoria=cls.categorias[i % 2] if i < 3 else None,
+                nombre=f"P{i}", precio=Decimal(10 + i), stock=100,
+            )
+            for i in range(4)
+        ]
+        cls.clientes = [
+            Cliente.objects.get(user=User.objects.create_user(f"cliente{i}", password="x")) for i in range(2)
+        ]
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+
+    def vender(self, cliente, items, metodo_pago="tarjeta"):
+        respuesta = self.api.post("/api/sales/ventas/", {
+            "cliente": cliente.pk,
+            "metodo_pago": metodo_pago,
+            "items": [{"producto": p.pk, "cantidad": c} for p, c in items],
+        }, format="json")
+        self.assertEqual(respuesta.status_code, 201, respuesta.content)
+        return Venta.objects.get(pk=respuesta.data["id"])
+
+
+@override_settings(REPORTING_WORKERS=2, REPORTING_RECLAMO_GRACIA=10)
+class ReclamoTrabajosTests(TestCase):
+    def setUp(self):
+        jobs._enviados.clear()
+
+    def _pendiente(self, segundos):
+        trabajo = TrabajoReporte.objects.create(tipo_reporte="ventas")
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            creado_en=timezone.now() - timedelta(seconds=segundos)
+        )
+        return trabajo
+
+    def test_reenvia_pendientes_huerfanos(self):
+        viejo = self._pendiente(60)
+        self._pendiente(0)  # recién encolado: lo envía su propio proceso
+        TrabajoReporte.objects.filter(pk=self._pendiente(60).pk).update(estado="completado")
+        with mock.patch.object(jobs, "_enviar") as enviar, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.reclamar_pendientes(), 1)
+        enviar.assert_called_once()
+        self.assertEqual(enviar.call_args.args[1].pk, viejo.pk)
+
+    def test_respeta_workers_libres_y_ya_enviados(self):
+        trabajos = [self._pendiente(60) for _ in range(3)]
+        jobs._enviados.add((TrabajoReporte, trabajos[0].pk))
+        with mock.patch.object(jobs, "_enviar") as enviar, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.reclamar_pendientes(), 1)
+        self.assertEqual(enviar.call_args.args[1].pk, trabajos[1].pk)
+
+
+class FinalizarTrabajosTests(TestCase):
+    def setUp(self):
+        # ejecutar_trabajo cierra la conexión al terminar: dentro de TestCase rompería la transacción
+        for nombre in ("connection", "close_old_connections"):
+            parche = mock.patch.object(jobs, nombre)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.usuario = User.objects.create_user("admin", password="x", is_staff=True)
+        self.trabajo = TrabajoReporte.objects.create(tipo_reporte="ventas", solicitado_por=self.usuario)
+
+    def _ejecutar(self, crear_reporte):
+        from apps.marketing.models import Notificacion
+
+        with mock.patch.object(jobs, "crear_reporte", side_effect=crear_reporte):
+            jobs.ejecutar_trabajo(self.trabajo.pk)
+        self.trabajo.refresh_from_db()
+        return Notificacion.objects.filter(user=self.usuario).count()
+
+    def test_completa_y_notifica(self):
+        reporte = Reporte.objects.create(tipo_reporte="ventas", ruta_archivo="x.csv")
+        self.assertEqual(self._ejecutar(lambda *a, **k: (reporte, False)), 1)
+        self.assertEqual((self.trabajo.estado, self.trabajo.reporte_id), ("completado", reporte.pk))
+
+    def test_no_pisa_un_trabajo_vencido(self):
+        reporte = Reporte.objects.create(tipo_reporte="ventas", ruta_archivo="x.csv")
+
+        def vence_mientras_corre(*args, **kwargs):
+            TrabajoReporte.objects.filter(pk=self.trabajo.pk).update(estado="fallido", error="Tiempo máximo")
+            return reporte, False
+
+        self.assertEqual(self._ejecutar(vence_mientras_corre), 0)
+        self.assertEqual((self.trabajo.estado, self.trabajo.error, self.trabajo.reporte_id), ("fallido", "Tiempo máximo", None))
+
+    def test_fallo_tardio_no_reescribe_el_error(self):
+        def vence_y_falla(*args, **kwargs):
+            TrabajoReporte.objects.filter(pk=self.trabajo.pk).update(estado="fallido", error="Tiempo máximo")
+            raise RuntimeError("otro error")
+
+        self.assertEqual(self._ejecutar(vence_y_falla), 0)
+        self.assertEqual(self.trabajo.error, "Tiempo máximo")
+
+    def test_generar_async_valida_antes_de_encolar(self):
+        api = APIClient()
+        api.force_authenticate(self.usuario)
+        invalidos = (
+            {"date_from": "2025-13-01"},
+            {"agrupar_por": ["inexistente"]},
+            ["no", "es", "un", "objeto"],
+        )
+        for parametros in invalidos:
+            with self.subTest(parametros=parametros):
+                respuesta = api.post("/api/reporting/reportes/generar/", {
+                    "tipo_reporte": "ventas", "parametros": parametros, "async": True,
+                }, format="json")
+                self.assertEqual(respuesta.status_code, 400, respuesta.content)
+        self.assertEqual(TrabajoReporte.objects.count(), 1)  # sólo el de setUp
+        with mock.patch.object(jobs, "_enviar"), self.captureOnCommitCallbacks(execute=True):
+            respuesta = api.post("/api/reporting/reportes/generar/", {
+                "tipo_reporte": "ventas", "parametros": {"agrupar_por": ["categoria"]}, "async": True,
+            }, format="json")
+        self.assertEqual(respuesta.status_code, 202, respuesta.content)
+
+
+class ExportadoresTests(SimpleTestCase):
+    # La primera fila trae None en columnas numéricas y un Decimal con más de 2 decimales
+    FILAS = [
+        {"producto": 1, "fecha": date(2025, 10, 1), "real": Decimal("0"), "error_pct": None, "nota": None},
+        {"producto": 2, "fecha": date(2025, 10, 1), "real": Decimal("12.345"), "error_pct": 7.5, "nota": "x"},
+        {"producto": 3, "fecha": None, "real": Decimal("3.10"), "error_pct": 100.0, "nota": None},
+    ]
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajuste = override_settings(MEDIA_ROOT=self.media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def _exportar(self, formato, filas=None):
+        return Path(self.media) / export_rows(iter(self.FILAS if filas is None else filas), formato, "prueba")
+
+    def _leer_texto(self, ruta):
+        if ruta.suffix == ".gz":
+            return gzip.open(ruta, "rt", encoding="utf-8").read()
+        if ruta.suffix == ".zst":
+            import zstandard
+
+            return zstandard.open(ruta, "rt", encoding="utf-8").read()
+        return ruta.read_text(encoding="utf-8")
+
+    def test_csv(self):
+        for formato in ("CSV", "CSV_GZ", "CSV_ZST"):
+            with self.subTest(formato=formato):
+                filas = list(csv.DictReader(io.StringIO(self._leer_texto(self._exportar(formato)))))
+                self.assertEqual([f["producto"] for f in filas], ["1", "2", "3"])
+                self.assertEqual(filas[0]["fecha"], "2025-10-01")
+                self.assertEqual(filas[0]["error_pct"], "")
+                self.assertEqual(filas[1]["real"], "12.345")
+
+    def test_json_y_ndjson(self):
+        for formato in ("JSON", "NDJSON", "NDJSON_GZ", "NDJSON_ZST"):
+            with self.subTest(formato=formato):
+                texto = self._leer_texto(self._exportar(formato))
+                filas = json.loads(texto) if formato == "JSON" else [json.loads(l) for l in texto.splitlines()]
+                self.assertEqual(len(filas), 3)
+                self.assertIsNone(filas[0]["error_pct"])
+                self.assertEqual(filas[1], {
+                    "producto": 2, "fecha": "2025-10-01", "real": "12.345", "error_pct": 7.5, "nota": "x",
+                })
+
+    def test_arrow_infiere_tipos_con_none_en_la_primera_fila(self):
+        import pyarrow as pa
+        import pyarrow.feather
+        import pyarrow.parquet as pq
+
+        for formato, leer in (("PARQUET", pq.read_table), ("FEATHER", pyarrow.feather.read_table)):
+            with self.subTest(formato=formato):
+                tabla = leer(self._exportar(formato))
+                self.assertEqual(tabla.schema.field("error_pct").type, pa.float64())
+                self.assertEqual(tabla.schema.field("real").type, pa.decimal128(18, 3))
+                self.assertEqual(tabla.schema.field("fecha").type, pa.date32())
+                self.assertEqual(tabla.schema.field("nota").type, pa.string())
+                self.assertEqual(tabla.to_pylist(), [
+                    {**self.FILAS[0], "real": Decimal("0.000")},
+                    {**self.FILAS[1], "real": Decimal("12.345")},
+                    {**self.FILAS[2], "real": Decimal("3.100")},
+                ])
+
+    def test_arrow_redondea_decimales_fuera_del_primer_lote(self):
+        import pyarrow.parquet as pq
+
+        filas = [{"monto": Decimal("1.50"), "id": None} for _ in range(exporters.CHUNK_SIZE)]
+        filas.append({"monto": Decimal("2.675"), "id": 5})  # escala 3 y entero que no estaban en el primer lote
+        tabla = pq.read_table(self._exportar("PARQUET", filas))
+        self.assertEqual(tabla.num_rows, exporters.CHUNK_SIZE + 1)
+        self.assertEqual(tabla.column("monto")[-1].as_py(), Decimal("2.68"))
+        self.assertEqual(tabla.column("id")[-1].as_py(), "5")
+
+    def test_sin_filas(self):
+        for formato in exporters.FORMATOS:
+            with self.subTest(formato=formato):
+                self.assertTrue(self._exportar(formato, []).exists())
+
+
+@override_settings(REPORTING_PARTICIONES=False)
+class ResumenDiarioTests(DatosVentasMixin, TestCase):
+    AGRUPACIONES = ([], ["metodo_pago"], ["categoria"], ["categoria", "metodo_pago"])
+
+    def assertResumenIgualAlDetalle(self):
+        for dims in self.AGRUPACIONES:
+            with self.subTest(agrupar_por=dims):
+                with override_settings(REPORTING_USAR_RESUMEN=True):
+                    resumen = ventas_agregadas(agrupar_por=dims)
+                with override_settings(REPORTING_USAR_RESUMEN=False):
+                    detalle = ventas_agregadas(agrupar_por=dims)
+                self.assertEqual(_ordenadas(resumen), _ordenadas(detalle))
+
+    def _ventas(self):
+        p = self.productos
+        return [
+            self.vender(self.clientes[0], [(p[0], 2), (p[1], 1), (p[2], 3)]),
+            self.vender(self.clientes[1], [(p[3], 1), (p[0], 1)], "efectivo"),
+            self.vender(self.clientes[1], [(p[2], 5)]),
+        ]
+
+    def test_crear_y_cancelar(self):
+        ventas = self._ventas()
+        self.assertTrue(VentaDiaria.objects.exists())
+        self.assertResumenIgualAlDetalle()
+
+        respuesta = self.api.post(f"/api/sales/ventas/{ventas[0].pk}/cancelar/")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertResumenIgualAlDetalle()
+
+    def test_update_y_destroy_via_api(self):
+        ventas = self._ventas()
+        ayer = timezone.now() - timedelta(days=1)
+        respuesta = self.api.patch(
+            f"/api/sales/ventas/{ventas[0].pk}/", {"fecha_venta": ayer.isoformat(), "metodo_pago": "qr"}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        self.api.patch(f"/api/sales/ventas/{ventas[1].pk}/", {"estado_venta": "cancelada"}, format="json")
+        self.assertResumenIgualAlDetalle()
+
+        self.assertEqual(self.api.delete(f"/api/sales/ventas/{ventas[2].pk}/").status_code, 204)
+        self.assertResumenIgualAlDetalle()
+
+    def test_cambios_de_lineas_fuera_de_la_api(self):
+        ventas = self._ventas()
+        linea = ventas[0].detalles.first()
+        linea.cantidad, linea.total = 7, linea.precio_unitario * 7
+        linea.save()
+        ventas[1].detalles.last().delete()
+        DetalleVenta.objects.create(
+            venta=ventas[2], producto=self.productos[1], cantidad=1,
+            precio_unitario=Decimal("11"), total=Decimal("11"),
+        )
+        # El detalle sin categoría suma Venta.total: se mantiene coherente con las líneas
+        for venta in ventas:
+            venta.total = sum(venta.detalles.values_list("total", flat=True))
+            venta.save()
+        self.assertResumenIgualAlDetalle()
+
+    def test_reconstruir_da_lo_mismo_que_el_mantenimiento_incremental(self):
+        self._ventas()
+        incremental = sorted(VentaDiaria.objects.values_list(
+            "fecha", "producto", "categoria", "metodo_pago", "unidades", "ingresos", "pedidos", "pedidos_categoria"
+        ))
+        rollup.reconstruir()
+        self.assertEqual(incremental, sorted(VentaDiaria.objects.values_list(
+            "fecha", "producto", "categoria", "metodo_pago", "unidades", "ingresos", "pedidos", "pedidos_categoria"
+        )))
+
+    def test_unicidad_sin_categoria(self):
+        from django.db import IntegrityError, transaction
+
+        fila = dict(fecha=timezone.localdate(), producto=self.productos[3], categoria=None, metodo_pago="tarjeta")
+        VentaDiaria.objects.create(**fila)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VentaDiaria.objects.create(**fila)
+
+
+class DescargaReporteTests(TestCase):
+    CONTENIDO = bytes(range(256)) * 4  # 1024 bytes
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajuste = override_settings(MEDIA_ROOT=media, REPORTING_SENDFILE="")
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        (Path(media) / "reports").mkdir()
+        (Path(media) / "reports" / "r.csv").write_bytes(self.CONTENIDO)
+        self.reporte = Reporte.objects.create(tipo_reporte="ventas", ruta_archivo="reports/r.csv")
+        self.url = f"/api/reporting/reportes/{self.reporte.pk}/descargar/"
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user("lector", password="x"))
+
+    def _cuerpo(self, respuesta):
+        return b"".join(respuesta.streaming_content)
+
+    def test_completo(self):
+        respuesta = self.api.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self._cuerpo(respuesta), self.CONTENIDO)
+        self.assertEqual(respuesta["Accept-Ranges"], "bytes")
+        self.assertEqual(respuesta["Content-Length"], "1024")
+
+    def test_rangos(self):
+        for cabecera, inicio, fin in (("bytes=0-99", 0, 99), ("bytes=1000-", 1000, 1023),
+                                      ("bytes=-24", 1000, 1023), ("bytes=1000-5000", 1000, 1023)):
+            with self.subTest(rango=cabecera):
+                respuesta = self.api.get(self.url, HTTP_RANGE=cabecera)
+                self.assertEqual(respuesta.status_code, 206)
+                self.assertEqual(respuesta["Content-Range"], f"bytes {inicio}-{fin}/1024")
+                self.assertEqual(self._cuerpo(respuesta), self.CONTENIDO[inicio:fin + 1])
+
+    def test_rango_insatisfacible(self):
+        for cabecera in ("bytes=1024-", "bytes=-0", "bytes=50-10"):
+            with self.subTest(rango=cabecera):
+                respuesta = self.api.get(self.url, HTTP_RANGE=cabecera)
+                self.assertEqual(respuesta.status_code, 416)
+                self.assertEqual(respuesta["Content-Range"], "bytes */1024")
+
+    def test_condicional_e_if_range(self):
+        etag = self.api.get(self.url)["ETag"]
+        self.assertEqual(self.api.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.api.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+        # If-Range con otro ETag (el archivo cambió): se sirve completo
+        respuesta = self.api.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"otro"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(self._cuerpo(respuesta)), 1024)
+
+    def test_ruta_fuera_de_reports(self):
+        Reporte.objects.filter(pk=self.reporte.pk).update(ruta_archivo="../settings.py")
+        self.assertEqual(self.api.get(self.url).status_code, 404)
+
+
+@override_settings(REPORTING_PARTICIONES=True, REPORTING_USAR_RESUMEN=False)
+class ParticionesTests(DatosVentasMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.localdate()
+        self.ventas = []
+        for dias in (3, 3, 2, 0):
+            venta = self.vender(self.clientes[dias % 2], [(self.productos[dias], 2), (self.productos[1], 1)])
+            Venta.objects.filter(pk=venta.pk).update(fecha_venta=timezone.now() - timedelta(days=dias))
+            self.ventas.append(Venta.objects.get(pk=venta.pk))
+        rollup.reconstruir()
+        self.desde = self.hoy - timedelta(days=5)
+
+    def _consultar(self, dims=("metodo_pago",)):
+        """(filas del reporte, rangos de días que se consultaron en la BD)."""
+        with mock.patch.object(services, "_consulta_ventas", wraps=services._consulta_ventas) as consulta:
+            filas = ventas_agregadas(self.desde, self.hoy, "dia", list(dims))
+        return filas, [(c.args[0], c.args[1]) for c in consulta.call_args_list]
+
+    def _sin_particiones(self, dims=("metodo_pago",)):
+        with override_settings(REPORTING_PARTICIONES=False):
+            return ventas_agregadas(self.desde, self.hoy, "dia", list(dims))
+
+    def test_reutiliza_los_dias_cerrados(self):
+        filas, rangos = self._consultar()
+        self.assertEqual(rangos, [(self.desde, self.hoy)])
+        self.assertEqual(ParticionReporte.objects.count(), 5)  # días cerrados, con y sin ventas
+        self.assertEqual(filas, self._sin_particiones())
+
+        filas, rangos = self._consultar()
+        self.assertEqual(rangos, [(self.hoy, self.hoy)])  # sólo hoy
+        self.assertEqual(filas, self._sin_particiones())
+
+    def test_cambio_sin_senales_invalida_por_marca(self):
+        self._consultar()
+        # QuerySet.update no emite señales: lo detecta la marca de agua del día
+        Venta.objects.filter(pk=self.ventas[2].pk).update(estado_venta="cancelada")
+        filas, rangos = self._consultar()
+        dia = self.hoy - timedelta(days=2)
+        self.assertEqual(rangos, [(dia, dia), (self.hoy, self.hoy)])
+        self.assertEqual(filas, self._sin_particiones())
+
+        # Venta movida a un día que estaba vacío
+        Venta.objects.filter(pk=self.ventas[0].pk).update(fecha_venta=timezone.now() - timedelta(days=4))
+        filas, rangos = self._consultar()
+        self.assertEqual(
+            rangos, [(self.hoy - timedelta(days=4), self.hoy - timedelta(days=3)), (self.hoy, self.hoy)]
+        )
+        self.assertEqual(filas, self._sin_particiones())
+
+    def test_cambio_con_senales_borra_la_particion(self):
+        self._consultar(["categoria"])
+        self.api.post(f"/api/sales/ventas/{self.ventas[1].pk}/cancelar/")
+        self.ventas[2].delete()
+        self.assertFalse(ParticionReporte.objects.filter(fecha=self.hoy - timedelta(days=2)).exists())
+        filas, rangos = self._consultar(["categoria"])
+        self.assertEqual(rangos, [(self.hoy - timedelta(days=3), self.hoy - timedelta(days=2)), (self.hoy, self.hoy)])
+        self.assertEqual(_ordenadas(filas), _ordenadas(self._sin_particiones(["categoria"])))
+
+    @override_settings(REPORTING_PARTICIONES_RETENCION=30)
+    def test_podar_las_que_no_se_usan(self):
+        self._consultar()
+        self._consultar(["categoria"])
+        ParticionReporte.objects.filter(clave=particiones.clave_ventas(["categoria"])).update(
+            usado_en=timezone.now() - timedelta(days=31)
+        )
+        self.assertEqual(particiones.podar(), 5)
+        self.assertEqual(set(ParticionReporte.objects.values_list("clave", flat=True)), {"ventas:metodo_pago"})
+
+
+class AbcReporteTests(DatosVentasMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        p = self.productos
+        self.extra = Producto.objects.create(categoria=self.categorias[0], nombre="Sin ventas", precio=5, stock=1)
+        self.vender(self.clientes[0], [(p[0], 5), (p[1], 1)])
+        self.vender(self.clientes[1], [(p[2], 2), (p[3], 3)], "efectivo")
+        self.vender(self.clientes[0], [(p[1], 2)])
+        cancelada = self.vender(self.clientes[1], [(p[3], 9)])
+        self.api.post(f"/api/sales/ventas/{cancelada.pk}/cancelar/")
+
+    def _referencia(self, umbral_a=Decimal("0.8"), umbral_b=Decimal("0.95")):
+        """ABC calculado en Python sobre DetalleVenta, para comparar."""
+        ingresos = {p.pk: Decimal("0") for p in Producto.objects.all()}
+        for producto, total in DetalleVenta.objects.exclude(venta__estado_venta="cancelada").values_list(
+            "producto", "total"
+        ):
+            ingresos[producto] += total
+        total = sum(ingresos.values())
+        categoria = dict(Producto.objects.values_list("id", "categoria"))
+        acumulado, por_categoria, filas = Decimal("0"), {}, []
+        for producto in sorted(ingresos, key=lambda k: (-ingresos[k], k)):
+            previo, acumulado = acumulado, acumulado + ingresos[producto]
+            por_categoria[categoria[producto]] = por_categoria.get(categoria[producto], 0) + 1
+            if ingresos[producto] > 0 and previo < total * umbral_a:
+                clase = "A"
+            elif ingresos[producto] > 0 and previo < total * umbral_b:
+                clase = "B"
+            else:
+                clase = "C"
+            filas.append((len(filas) + 1, por_categoria[categoria[producto]], producto, ingresos[producto], clase))
+        return filas
+
+    def _calculado(self, params):
+        return [
+            (r["posicion"], r["posicion_categoria"], r["producto"], r["ingresos"], r["clase"])
+            for r in get_builder("abc").rows(params)
+        ]
+
+    def test_igual_a_la_referencia(self):
+        for usar_resumen in (True, False):
+            with self.subTest(usar_resumen=usar_resumen), override_settings(REPORTING_USAR_RESUMEN=usar_resumen):
+                self.assertEqual(self._calculado({}), self._referencia())
+                self.assertEqual(
+                    self._calculado({"umbral_a": "0.5", "umbral_b": "0.7"}),
+                    self._referencia(Decimal("0.5"), Decimal("0.7")),
+                )
+
+    def test_top_y_categoria(self):
+        referencia = self._referencia()
+        self.assertEqual(self._calculado({"top": 1}), [f for f in referencia if f[1] <= 1])
+        categoria = self.categorias[0].pk
+        filas = self._calculado({"categoria": categoria})
+        self.assertEqual({f[2] for f in filas}, set(Producto.objects.filter(categoria=categoria).values_list("id", flat=True)))
+        self.assertEqual([f[1] for f in filas], list(range(1, len(filas) + 1)))
+
+    def test_parametros_invalidos(self):
+        for params in ({"top": "-1"}, {"categoria": "x"}, {"umbral_a": "0.9", "umbral_b": "0.5"}):
+            with self.subTest(params=params), self.assertRaises(ValueError):
+                get_builder("abc").validar(params)
+
+
+class MarcaDeAguaTests(DatosVentasMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        p = self.productos
+        self.venta = self.vender(self.clientes[0], [(p[0], 2), (p[1], 1)])
+        self.vender(self.clientes[1], [(p[2], 1)], "efectivo")
+        self.detalle = self.venta.detalles.order_by("id").first()
+
+    def assertCambiaLaMarca(self, tipo, editar, params=None):
+        antes = services.marca_de_agua(tipo, params)
+        self.assertEqual(services.marca_de_agua(tipo, params), antes)
+        editar()
+        self.assertNotEqual(services.marca_de_agua(tipo, params), antes)
+
+    def test_ediciones_que_no_cambian_totales_de_venta(self):
+        p = self.productos
+        ediciones = {
+            "cantidad del detalle": lambda: DetalleVenta.objects.filter(pk=self.detalle.pk).update(cantidad=7),
+            "producto del detalle": lambda: DetalleVenta.objects.filter(pk=self.detalle.pk).update(producto=p[3]),
+            "metodo_pago": lambda: Venta.objects.filter(pk=self.venta.pk).update(metodo_pago="efectivo"),
+            "nombre de producto": lambda: Producto.objects.filter(pk=p[0].pk).update(nombre="Renombrado"),
+            "categoría de producto": lambda: Producto.objects.filter(pk=p[0].pk).update(categoria=self.categorias[1]),
+            "nombre de categoría": lambda: Categoria.objects.filter(pk=self.categorias[0].pk).update(nombre="Otra"),
+        }
+        for tipo in ("ventas", "productos", "abc"):
+            for nombre, editar in ediciones.items():
+                with self.subTest(tipo=tipo, edicion=nombre), transaction.atomic():
+                    self.assertCambiaLaMarca(tipo, editar)
+                    transaction.set_rollback(True)
+
+    def test_ciudad_del_cliente(self):
+        editar = lambda: Cliente.objects.filter(pk=self.clientes[0].pk).update(ciudad="Sucre")  # noqa: E731
+        for tipo, params in (("clientes", {}), ("ventas", {"agrupar_por": ["ciudad"]})):
+            with self.subTest(tipo=tipo), transaction.atomic():
+                self.assertCambiaLaMarca(tipo, editar, params)
+                transaction.set_rollback(True)
+
+
+class QuintilRfmTests(SimpleTestCase):
+    def test_empates_con_el_mismo_puntaje_sin_importar_el_orden(self):
+        import numpy as np
+
+        valores = np.array([1, 1, 1, 1, 2, 2, 3, 5, 8, 13], dtype=np.int64)
+        esperado = {1: 1, 2: 3, 3: 4, 5: 4, 8: 5, 13: 5}
+        rnd = np.random.default_rng(0)
+        for _ in range(5):
+            mezcla = rnd.permutation(valores)
+            self.assertEqual(dict(zip(mezcla.tolist(), rfm.quintil(mezcla).tolist())), esperado)
+
+    def test_menor_es_mejor(self):
+        import numpy as np
+
+        dias = np.array([0, 10, 10, 40, 90], dtype=np.int64)
+        self.assertEqual(rfm.quintil(dias, mayor_es_mejor=False).tolist(), [5, 3, 3, 2, 1])
+        self.assertEqual(rfm.quintil(np.arange(10)).tolist(), [1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+
+
+class ParametrosPrediccionTests(SimpleTestCase):
+    HOY = date(2024, 5, 10)
+
+    def test_normaliza_filtros(self):
+        parametros = predicciones.parametros_prediccion(
+            {"productos": [3, "5", 3], "categoria": "2"}, hoy=self.HOY
+        )
+        self.assertEqual(parametros["productos"], [3, 5])
+        self.assertEqual(parametros["categoria"], 2)
+        vacios = predicciones.parametros_prediccion({"productos": [], "categoria": ""}, hoy=self.HOY)
+        self.assertIsNone(vacios["productos"])
+        self.assertIsNone(vacios["categoria"])
+
+    def test_filtros_invalidos(self):
+        for data in (
+            {"productos": 5}, {"productos": "1,2"}, {"productos": ["x"]}, {"productos": [1.5]},
+            {"productos": [True]}, {"productos": [{"id": 1}]}, {"productos": [0]}, {"categoria": "x"},
+            {"categoria": [1]},
+        ):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                predicciones.parametros_prediccion(data, hoy=self.HOY)
+
+
+class UpsertTests(DatosVentasMixin, TestCase):
+    def _segmentos(self):
+        return list(SegmentoCliente.objects.order_by("cliente_id").values(
+            "id", "cliente_id", "recencia_dias", "frecuencia", "monto", "r_score", "f_score", "m_score", "segmento",
+        ))
+
+    def test_recalcular_es_idempotente(self):
+        self.vender(self.clientes[0], [(self.productos[0], 2)])
+        self.vender(self.clientes[1], [(self.productos[1], 1)])
+        rfm.calcular()
+        antes = self._segmentos()
+        self.assertEqual(len(antes), 2)
+        rfm.calcular()
+        self.assertEqual(self._segmentos(), antes)
+
+    def test_fallo_al_borrar_no_deja_segmentos_mezclados(self):
+        self.vender(self.clientes[0], [(self.productos[0], 2)])
+        rfm.calcular()
+        antes = self._segmentos()
+        self.vender(self.clientes[0], [(self.productos[1], 5)])
+        self.vender(self.clientes[1], [(self.productos[1], 1)])
+        with mock.patch.object(rfm.SegmentoCliente.objects, "filter", side_effect=RuntimeError("BD caída")):
+            with self.assertRaises(RuntimeError):
+                rfm.calcular()
+        self.assertEqual(self._segmentos(), antes)
+
+    def test_actualiza_en_lugar_de_duplicar(self):
+        ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+        fila = [self.clientes[0].pk, 3, 1, Decimal("10.00"), 1, 1, 1, "perdidos", ahora]
+        bulk.upsert(SegmentoCliente, rfm.CAMPOS, ["cliente_id"], [fila])
+        bulk.upsert(SegmentoCliente, rfm.CAMPOS, ["cliente_id"], [fila])
+        pk = SegmentoCliente.objects.get().pk
+        fila[1:4] = [0, 4, Decimal("99.50")]
+        bulk.upsert(SegmentoCliente, rfm.CAMPOS, ["cliente_id"], [fila])
+        segmento = SegmentoCliente.objects.get()
+        self.assertEqual((segmento.pk, segmento.recencia_dias, segmento.frecuencia, segmento.monto), (pk, 0, 4, Decimal("99.50")))
+
+    def test_una_sentencia_por_lote(self):
+        ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+        a, b = (c.pk for c in self.clientes)
+        filas = [
+            (a, 3, 1, Decimal("10.00"), 1, 1, 1, "perdidos", ahora),
+            (b, 2, 1, Decimal("5.00"), 1, 1, 1, "perdidos", ahora),
+            (a, 1, 2, Decimal("20.00"), 2, 2, 2, "leales", ahora),  # misma clave en el lote: gana la última
+        ]
+        with self.assertNumQueries(2):
+            self.assertEqual(bulk.upsert(SegmentoCliente, rfm.CAMPOS, ["cliente_id"], filas, batch_size=2), 3)
+        self.assertEqual(
+            dict(SegmentoCliente.objects.values_list("cliente_id", "frecuencia")), {a: 2, b: 1}
+        )
+        with self.assertNumQueries(1):
+            bulk.upsert(SegmentoCliente, rfm.CAMPOS, ["cliente_id"], filas)
+        self.assertEqual(SegmentoCliente.objects.get(cliente_id=a).segmento, "leales")
+
+
+class DatasetMensualTests(DatosVentasMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ajuste = override_settings(REPORTING_MODELOS_DIR=directorio, REPORTING_PARTICIONES=False)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+        hoy = timezone.localdate()
+        self.mes_actual = hoy.year * 12 + hoy.month
+        anterior = (hoy.replace(day=1) - timedelta(days=40)).replace(day=15)
+        self.mes_anterior = anterior.year * 12 + anterior.month
+        vieja = self.vender(self.clientes[0], [(self.productos[0], 2)])
+        self.vender(self.clientes[1], [(self.productos[1], 1)])
+        nueva_fecha = vieja.fecha_venta.replace(year=anterior.year, month=anterior.month, day=anterior.day)
+        Venta.objects.filter(pk=vieja.pk).update(fecha_venta=nueva_fecha)
+        rollup.recalcular_dias(vieja.fecha_venta, nueva_fecha)
+
+    def _meses(self, X):
+        return set((X[:, 0] * 12 + X[:, 1]).tolist())
+
+    def test_excluye_el_mes_en_curso(self):
+        for resumen in (True, False):
+            with self.subTest(resumen=resumen), override_settings(REPORTING_USAR_RESUMEN=resumen):
+                X, y, _ = dataset_mensual()
+                self.assertEqual(self._meses(X), {self.mes_anterior})
+                self.assertEqual(y.sum(), float(Venta.objects.order_by("fecha_venta").first().total))
+
+                # El incremental tampoco incorpora el mes abierto
+                X, _, _ = dataset_mensual(desde=timezone.localdate())
+                self.assertEqual(self._meses(X), {self.mes_anterior})
+
+    def test_hasta_explicito(self):
+        proximo = timezone.localdate().replace(day=28) + timedelta(days=5)
+        X, _, _ = dataset_mensual(hasta=proximo)
+        self.assertEqual(self._meses(X), set(range(self.mes_anterior, self.mes_actual + 1)))
+
+    def test_backtest_no_usa_el_mes_en_curso(self):
+        from sklearn.dummy import DummyRegressor
+
+        from . import backtesting
+
+        venta = self.vender(self.clientes[1], [(self.productos[2], 1)])
+        mes = self.mes_actual - 1  # mes anterior, 1..12 en base 12
+        fecha = venta.fecha_venta.replace(year=(mes - 1) // 12, month=(mes - 1) % 12 + 1, day=2)
+        Venta.objects.filter(pk=venta.pk).update(fecha_venta=fecha)
+        rollup.recalcular_dias(venta.fecha_venta, fecha)
+
+        with mock.patch.object(backtesting.registro_modelos, "obtener", return_value=DummyRegressor()):
+            resultado, _ = backtesting.backtest(mock.Mock(pk=1), origenes=3, guardar=False)
+        self.assertEqual([o["origen"] for o in resultado["origenes"]], [f"{fecha:%Y-%m}"])
@@ -1,10 +1,18 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import ReporteViewSet, ConsultaReporteViewSet
-from .views import PrediccionViewSet
+from .views import ReporteViewSet, ConsultaReporteViewSet, TrabajoReporteViewSet
+from .views import PrediccionViewSet, DashboardView, SegmentoClienteViewSet
+from .views import EjecucionPrediccionViewSet, EvaluacionModeloViewSet
 
 router = DefaultRouter()
 router.register(r'reportes', ReporteViewSet, basename='reporte')
 router.register(r'consultas', ConsultaReporteViewSet, basename='consulta-reporte')
+router.register(r'trabajos', TrabajoReporteViewSet, basename='trabajo-reporte')
+router.register(r'segmentos', SegmentoClienteViewSet, basename='segmento-cliente')
+router.register(r'ejecuciones-prediccion', EjecucionPrediccionViewSet, basename='ejecucion-prediccion')
+router.register(r'evaluaciones-modelo', EvaluacionModeloViewSet, basename='evaluacion-modelo')
 router.register(r'predicciones', PrediccionViewSet, basename='prediccion')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+] + router.urls
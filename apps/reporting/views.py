@@ -1,32 +1,48 @@
-# --- Imports de Python ---
-import joblib
+import hashlib
+from datetime import date
 
-# --- Imports de Third-Party (Django, DRF, Pandas) ---
-import pandas as pd
+# --- Imports de Third-Party (Django, DRF) ---
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
-from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, filters
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
-from apps.catalog.models import Producto
 from .models import (
     Reporte, 
     ConsultaReporte, 
     ModeloEntrenado, 
-    PrediccionVenta
+    PrediccionVenta,
+    TrabajoReporte,
+    SegmentoCliente,
+    EjecucionPrediccion,
+    EvaluacionModelo,
 )
 from .serializers import (
     ReporteSerializer, 
     ConsultaReporteSerializer, 
     ModeloEntrenadoSerializer, 
-    PrediccionVentaSerializer
+    PrediccionVentaSerializer,
+    TrabajoReporteSerializer,
+    SegmentoClienteSerializer,
+    EjecucionPrediccionSerializer,
+    EvaluacionModeloSerializer,
 )
-from .services import generar_reporte
+from .services import crear_reporte
+from .predicciones import parametros_prediccion, productos_a_predecir, pronosticar, version_predicciones
+from .predicciones import matriz as matriz_predicciones
+from .reportes import REGISTRO, get_builder
+from .descargas import servir_archivo
+from .dashboard import PERIODOS, obtener_kpis
+from . import jobs, registro_modelos
 
 class ReporteViewSet(ModelViewSet):
     queryset = Reporte.objects.all().order_by("-fecha_generacion")
@@ -34,7 +50,7 @@ class ReporteViewSet(ModelViewSet):
     permission_classes = [IsAuthenticated] 
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy", "generar"]:
+        if self.action in ["create", "update", "partial_update", "destroy", "generar", "abc"]:
             return [IsAdminUser()]  # solo admin genera/crea/edita/elimina
         return super().get_permissions()
 
@@ -44,9 +60,15 @@ class ReporteViewSet(ModelViewSet):
         body:
         {
           "tipo_reporte": "ventas",
-          "formato": "CSV",     // o "JSON"
-          "parametros": { "date_from": "2025-10-01", "date_to": "2025-10-31" },
-          "prompt_texto": "Ventas de octubre"
+          "formato": "CSV",     // JSON, NDJSON, CSV_GZ, CSV_ZST, NDJSON_GZ, NDJSON_ZST, PARQUET, FEATHER
+          "parametros": {
+            "date_from": "2025-10-01", "date_to": "2025-10-31",
+            "granularidad": "dia",          // dia | semana | mes
+            "agrupar_por": ["metodo_pago"], // metodo_pago, estado_venta, categoria, ciudad
+            "sin_cache": false              // true: no reutilizar un reporte idéntico
+          },
+          "prompt_texto": "Ventas de octubre",
+          "async": false        // true: responde 202 con el trabajo en cola
         }
         """
         tipo = request.data.get("tipo_reporte")
@@ -54,28 +76,197 @@ class ReporteViewSet(ModelViewSet):
         parametros = request.data.get("parametros") or {}
         prompt = request.data.get("prompt_texto", "")
 
+        if request.data.get("async"):
+            # Modo trabajo: responde 202 y el reporte se genera en el pool de workers
+            if tipo not in REGISTRO:
+                return Response({"detail": "Tipo de reporte no soportado"}, status=400)
+            if formato not in dict(Reporte.FORMATOS):
+                return Response({"detail": "Formato no soportado"}, status=400)
+            # Mismas validaciones que el modo sincrónico, antes de encolar
+            try:
+                if not isinstance(parametros, dict):
+                    raise ValueError("parametros debe ser un objeto")
+                REGISTRO[tipo].validar(parametros)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=400)
+            try:
+                trabajo = jobs.encolar(
+                    tipo, formato=formato, parametros=parametros, prompt=prompt, user=request.user
+                )
+            except jobs.ColaLlena as e:
+                return Response({"detail": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return Response(
+                TrabajoReporteSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED
+            )
+
         try:
-            ruta_rel, descripcion = generar_reporte(
-                tipo, formato=formato, params=parametros
+            rep, consulta = crear_reporte(
+                tipo, formato=formato, parametros=parametros, prompt=prompt
             )
         except Exception as e:
             return Response({"detail": str(e)}, status=400)
 
-        rep = Reporte.objects.create(
-            tipo_reporte=tipo,
-            formato=formato,
-            descripcion=descripcion,
-            ruta_archivo=ruta_rel,
-        )
-        consulta = ConsultaReporte.objects.create(
-            reporte=rep, prompt_texto=prompt, parametros=parametros
-        )
         data = {
             "reporte": ReporteSerializer(rep).data,
             "consulta": ConsultaReporteSerializer(consulta).data,
         }
         return Response(data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=["get"], url_path="descargar")
+    def descargar(self, request, pk=None):
+        """
+        Descarga el archivo del reporte. Soporta Range (descargas reanudables)
+        y GET condicional con ETag / Last-Modified.
+        """
+        return servir_archivo(request, self.get_object().ruta_archivo)
+
+    @action(detail=False, methods=["get"], url_path="abc")
+    def abc(self, request):
+        """
+        Clasificación ABC / Pareto de productos en JSON, sin generar archivo.
+        GET /reportes/abc/?date_from=2025-01-01&date_to=2025-12-31&top=10&categoria=3
+        """
+        builder = get_builder("abc")
+        params = request.query_params.dict()
+        try:
+            builder.validar(params)
+            resultados = list(builder.rows(params))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+        return Response({"descripcion": builder.descripcion(params), "resultados": resultados})
+
+    @action(detail=False, methods=["get"], url_path="tipos")
+    def tipos(self, request):
+        """Tipos de reporte registrados y sus parámetros."""
+        return Response(
+            [{"tipo": tipo, "parametros": b.parametros} for tipo, b in REGISTRO.items()]
+        )
+
+
+class TrabajoReporteViewSet(ReadOnlyModelViewSet):
+    """
+    Estado de los reportes generados en segundo plano.
+    GET /trabajos/{id}/ para consultar (polling) hasta estado 'completado'.
+    """
+
+    queryset = TrabajoReporte.objects.select_related("reporte").all()
+    serializer_class = TrabajoReporteSerializer
+    permission_classes = [IsAdminUser]
+    filterset_fields = ["estado", "tipo_reporte"]
+
+    @action(detail=False, methods=["get"], url_path="cola")
+    def cola(self, request):
+        """Profundidad de la cola, workers y duración de los trabajos."""
+        return Response(jobs.estadisticas())
+
+
+class EjecucionPrediccionViewSet(ReadOnlyModelViewSet):
+    """
+    Estado y progreso de las predicciones ejecutadas en segundo plano
+    (ejecutar-prediccion con "async": true).
+    GET /ejecuciones-prediccion/{id}/ -> productos_procesados / productos_total
+    """
+
+    queryset = EjecucionPrediccion.objects.all()
+    serializer_class = EjecucionPrediccionSerializer
+    permission_classes = [IsAdminUser]
+    filterset_fields = ["estado", "modelo"]
+
+
+class EvaluacionModeloViewSet(ReadOnlyModelViewSet):
+    """
+    Precisión (MAE/MAPE) y tiempos de los modelos de predicción.
+    Se generan con `manage.py evaluar_modelos` (ver apps/reporting/backtesting.py).
+    GET /evaluaciones-modelo/?modelo=3&tipo=backtest
+    """
+
+    queryset = EvaluacionModelo.objects.select_related("modelo")
+    serializer_class = EvaluacionModeloSerializer
+    permission_classes = [IsAdminUser]
+    filterset_fields = ["modelo", "tipo"]
+
+    @action(detail=False, methods=["get"], url_path="comparativa")
+    def comparativa(self, request):
+        """
+        Última evaluación de cada modelo (por tipo), de menor a mayor MAPE y,
+        a igual MAPE, de menor tiempo de inferencia por cada 1000 filas.
+        GET /evaluaciones-modelo/comparativa/?tipo=seguimiento
+        """
+        tipo = request.query_params.get("tipo", "seguimiento")
+        ultimas = (
+            EvaluacionModelo.objects.filter(tipo=tipo)
+            .order_by("modelo_id", "-evaluado_en")
+            .values(
+                "modelo_id", "modelo__nombre_modelo", "modelo__version", "mae", "mape", "filas",
+                "segundos_entrenamiento", "segundos_inferencia", "filas_inferencia", "evaluado_en",
+            )
+        )
+        vistas, filas = set(), []
+        for e in ultimas:
+            if e["modelo_id"] in vistas:
+                continue
+            vistas.add(e["modelo_id"])
+            e["ms_por_mil_filas"] = (
+                round(e["segundos_inferencia"] * 1e6 / e["filas_inferencia"], 3)
+                if e["segundos_inferencia"] and e["filas_inferencia"] else None
+            )
+            filas.append(e)
+        filas.sort(key=lambda e: (
+            e["mape"] if e["mape"] is not None else float("inf"),
+            e["ms_por_mil_filas"] if e["ms_por_mil_filas"] is not None else float("inf"),
+        ))
+        return Response({"tipo": tipo, "modelos": filas})
+
+
+class SegmentoClienteViewSet(ReadOnlyModelViewSet):
+    """
+    Segmentación RFM de clientes para campañas de marketing.
+    Se recalcula con `manage.py segmentar_clientes`.
+    GET /segmentos/?segmento=en_riesgo
+    """
+
+    queryset = SegmentoCliente.objects.select_related("cliente__user").order_by("-m_score", "cliente_id")
+    serializer_class = SegmentoClienteSerializer
+    permission_classes = [IsAdminUser]
+    filterset_fields = ["segmento", "r_score", "f_score", "m_score"]
+
+    @action(detail=False, methods=["get"], url_path="resumen")
+    def resumen(self, request):
+        """Clientes, monto y ticket por segmento."""
+        filas = (
+            SegmentoCliente.objects.values("segmento")
+            .annotate(
+                clientes=models.Count("id"),
+                monto=models.Sum("monto"),
+                frecuencia=models.Sum("frecuencia"),
+                recencia_promedio=models.Avg("recencia_dias"),
+            )
+            .order_by("-monto")
+        )
+        return Response(list(filas))
+
+
+class DashboardView(APIView):
+    """
+    KPIs del dashboard de administración (ingresos, pedidos, ticket promedio,
+    top productos, stock bajo y carritos activos) servidos desde caché.
+    GET /dashboard/?dias=30   (1, 7, 30, 90 o 365)
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            dias = int(request.query_params.get("dias", 30))
+        except ValueError:
+            dias = None
+        if dias not in PERIODOS:
+            return Response(
+                {"detail": f"dias debe ser uno de {list(PERIODOS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(obtener_kpis(dias))
+
 
 class ConsultaReporteViewSet(ReadOnlyModelViewSet):
     queryset = (
@@ -104,6 +295,48 @@ class PrediccionViewSet(ReadOnlyModelViewSet):
         modelos = ModeloEntrenado.objects.all().order_by("-fecha_entrenamiento")
         return Response(ModeloEntrenadoSerializer(modelos, many=True).data)
 
+    @action(detail=False, methods=["get"], url_path="matriz")
+    def matriz(self, request):
+        """
+        Predicciones de un modelo como matriz producto x mes (arreglos, no filas).
+        GET /predicciones/matriz/?modelo=3&desde=2026-01-01&hasta=2026-12-01&categoria=2
+        Sin `modelo` se usa el último entrenado. Responde con ETag: si las
+        predicciones no cambiaron, If-None-Match devuelve 304.
+        """
+        params = request.query_params
+        try:
+            modelo_id = int(params["modelo"]) if params.get("modelo") else (
+                ModeloEntrenado.objects.latest("fecha_entrenamiento").pk
+            )
+            desde = date.fromisoformat(params["desde"]) if params.get("desde") else None
+            hasta = date.fromisoformat(params["hasta"]) if params.get("hasta") else None
+            categoria = int(params["categoria"]) if params.get("categoria") else None
+        except ModeloEntrenado.DoesNotExist:
+            return Response({"detail": "No hay modelos entrenados."}, status=404)
+        except ValueError:
+            return Response({"detail": "Parámetros inválidos (modelo, desde, hasta, categoria)."}, status=400)
+
+        version = version_predicciones(modelo_id)
+        clave = hashlib.sha256(f"{version}|{desde}|{hasta}|{categoria}".encode()).hexdigest()[:32]
+        etag = quote_etag(clave)
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return no_modificado
+
+        datos = cache.get(f"reporting:matriz:{clave}")
+        if datos is None:
+            datos = matriz_predicciones(modelo_id, desde, hasta, categoria)
+            cache.set(f"reporting:matriz:{clave}", datos, settings.REPORTING_MATRIZ_TTL)
+        response = Response(datos)
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"  # revalidar siempre con If-None-Match
+        return response
+
+    @action(detail=False, methods=["get"], url_path="registro-modelos")
+    def registro(self, request):
+        """Modelos cargados en memoria en este proceso, hits/misses y tiempos de carga."""
+        return Response(registro_modelos.estadisticas())
+
     @action(detail=False, methods=["post"], url_path="ejecutar-prediccion")
     def ejecutar_prediccion(self, request):
         """
@@ -115,10 +348,19 @@ class PrediccionViewSet(ReadOnlyModelViewSet):
             "anio": 2025,
             "mes": 12
         }
+
+        Pronóstico de varios meses (responde un resumen, no las filas):
+        {
+            "anio": 2026, "mes": 1,
+            "horizonte": 12,          // meses desde anio/mes (1..36)
+            "productos": [1, 2, 3],   // opcional
+            "categoria": 4,           // opcional
+            "async": true             // opcional: 202 con la ejecución en cola
+        }
         """
         try:
             modelo_entrenado = ModeloEntrenado.objects.latest("fecha_entrenamiento")
-            model = joblib.load(modelo_entrenado.ruta_archivo)
+            model = registro_modelos.obtener(modelo_entrenado)
         except (ModeloEntrenado.DoesNotExist, FileNotFoundError):
             return Response(
                 {
@@ -127,44 +369,39 @@ class PrediccionViewSet(ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # 1. Crear datos de entrada
-        anio = request.data.get("anio", timezone.now().year)
-        mes = request.data.get("mes", timezone.now().month)
+        # 1. Parámetros: mes inicial, horizonte y filtro de productos
+        try:
+            parametros = parametros_prediccion(request.data)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
 
-        productos = Producto.objects.filter(estado="activo")
-        if not productos.exists():
+        if request.data.get("async"):
+            # Corre en el pool de workers; el progreso se consulta en ejecuciones-prediccion/{id}/
+            try:
+                ejecucion = jobs.encolar_prediccion(modelo_entrenado, parametros, user=request.user)
+            except jobs.ColaLlena as e:
+                return Response({"detail": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            return Response(
+                EjecucionPrediccionSerializer(ejecucion).data, status=status.HTTP_202_ACCEPTED
+            )
+
+        productos = productos_a_predecir(parametros)
+        producto_ids = list(productos)
+        if not producto_ids:
             return Response(
                 {"detail": "No hay productos activos para predecir."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        X_pred = pd.DataFrame(
-            {
-                "anio": [anio] * len(productos),
-                "mes": [mes] * len(productos),
-                "producto_id": [p.id for p in productos],
-            }
-        )
-
-        # 2. Ejecutar Predicción
-        predicciones = model.predict(X_pred)
-
-        # 3. Guardar resultados en la BD
-        resultados_guardados = []
-        fecha_pred = f"{anio}-{mes:02d}-01"
-
-        # Borrar predicciones viejas para este mismo mes/año para no duplicar
-        PrediccionVenta.objects.filter(fecha_prediccion=fecha_pred).delete()
-
-        for prod, pred_val in zip(productos, predicciones):
-            pred = PrediccionVenta.objects.create(
-                modelo=modelo_entrenado,
-                producto=prod,
-                fecha_prediccion=fecha_pred,
-                ventas_estimadas=pred_val if pred_val > 0 else 0,
-                periodo="Mensual",
-            )
-            resultados_guardados.append(pred)
+        # 2. Un solo predict() sobre la matriz (meses x productos) y upsert por lotes
+        anio, mes = parametros["anio"], parametros["mes"]
+        resumen = pronosticar(modelo_entrenado, model, producto_ids, anio, mes, parametros["horizonte"])
+        if "horizonte" in request.data:
+            # Modo pronóstico: las filas se consultan luego (pueden ser cientos de miles)
+            return Response(resumen, status=status.HTTP_201_CREATED)
 
+        resultados_guardados = PrediccionVenta.objects.filter(
+            modelo=modelo_entrenado, fecha_prediccion=date(anio, mes, 1), producto_id__in=productos
+        ).select_related("producto").order_by("producto_id")
         serializer = PrediccionVentaSerializer(resultados_guardados, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -1,8 +1,10 @@
 from decimal import Decimal, InvalidOperation
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.response import Response
@@ -10,6 +12,7 @@ from rest_framework import serializers as drf_serializers
 
 from .models import Venta, DetalleVenta, Factura, Pago
 from apps.catalog.models import Producto
+from apps.reporting.rollup import aplicar_venta, gestion_manual
 
 # Intentar importar serializers desde apps/sales/serializers.py, si no existen creamos fallbacks seguros
 try:
@@ -45,12 +48,18 @@ class VentaViewSet(ModelViewSet):
     - crea la Venta y los DetalleVenta
     - actualiza stock (select_for_update)
     - crea factura asociada (simple)
+    - actualiza el resumen diario de reportes (VentaDiaria)
+
+    create() y cancelar() suman/restan la venta en VentaDiaria ellas mismas;
+    update, partial_update y destroy lo dejan a las señales de
+    apps/reporting/signals.py, que recalculan los días afectados.
     """
     queryset = Venta.objects.all().order_by('-fecha_venta')
     serializer_class = VentaSerializer
     permission_classes = [IsAuthenticated]
 
     @transaction.atomic
+    @gestion_manual()
     def create(self, request, *args, **kwargs):
         data = request.data
         items = data.get('items') or []
@@ -134,9 +143,34 @@ class VentaViewSet(ModelViewSet):
             estado='emitida'
         )
 
+        aplicar_venta(venta)
+
         serializer = VentaSerializer(venta, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'], url_path='cancelar')
+    @transaction.atomic
+    @gestion_manual()
+    def cancelar(self, request, pk=None):
+        """
+        Cancela la venta: devuelve el stock, anula la factura y descuenta
+        la venta del resumen diario de reportes.
+        """
+        venta = Venta.objects.select_for_update().get(pk=self.get_object().pk)
+        if venta.estado_venta == 'cancelada':
+            return Response({"detail": "La venta ya está cancelada."}, status=status.HTTP_400_BAD_REQUEST)
+
+        for producto_id, cantidad in venta.detalles.values_list('producto_id', 'cantidad'):
+            Producto.objects.filter(pk=producto_id).update(stock=F('stock') + cantidad)
+
+        venta.estado_venta = 'cancelada'
+        venta.save(update_fields=['estado_venta'])
+        Factura.objects.filter(venta=venta).update(estado='anulada')
+        aplicar_venta(venta, signo=-1)
+
+        serializer = VentaSerializer(venta, context={'request': request})
+        return Response(serializer.data)
+
 
 class FacturaViewSet(ModelViewSet):
     """